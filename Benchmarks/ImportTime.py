@@ -0,0 +1,128 @@
+"""What loading the addon costs on anki startup.
+
+Imports LingqAnkiSync in a fresh interpreter the way anki does: after anki and aqt
+are loaded and with a main window whose Tools menu the addon registers itself in.
+Records the wall time of the import and the modules it pulled in beyond what anki
+had already loaded, taking the fastest of a few runs.
+
+With --compare REV the same is measured for the addon as of a git revision, so the
+cost before and after a change can be compared.
+
+Usage: python -m Benchmarks.ImportTime [--compare HEAD~1] [--repeats 5] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict
+
+_repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_measureScript = """
+import json, os, sys, time
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Loaded by anki before any addon
+import anki.collection
+import aqt
+from aqt.qt import QApplication, QMainWindow, QMenu
+
+app = QApplication([])
+
+
+class _MainWindow(QMainWindow):
+    class _Form:
+        pass
+
+    def __init__(self):
+        super().__init__()
+        self.form = self._Form()
+        self.form.menuTools = QMenu(self)
+
+
+aqt.mw = _MainWindow()
+modulesBefore = set(sys.modules)
+startTime = time.perf_counter()
+import LingqAnkiSync
+seconds = time.perf_counter() - startTime
+
+print(json.dumps({
+    "seconds": seconds,
+    "modules": sorted(set(sys.modules) - modulesBefore),
+    "menuActions": [action.text() for action in aqt.mw.form.menuTools.actions()],
+}))
+"""
+
+
+def Measure(sourceDir: str, repeats: int) -> Dict:
+    """Import the addon found in sourceDir in repeats fresh interpreters"""
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", _measureScript],
+            cwd=sourceDir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    fastest = min(runs, key=lambda run: run["seconds"])
+    addonModules = [name for name in fastest["modules"] if name.startswith("LingqAnkiSync")]
+    return {
+        "milliseconds": round(fastest["seconds"] * 1000, 1),
+        "moduleCount": len(fastest["modules"]),
+        "addonModules": addonModules,
+        "otherPackages": sorted(
+            {name.split(".")[0] for name in fastest["modules"]} - {"LingqAnkiSync"}
+        ),
+        "menuActions": fastest["menuActions"],
+    }
+
+
+def _ExportRevision(revision: str, directory: str):
+    archive = subprocess.run(
+        ["git", "archive", revision, "LingqAnkiSync"],
+        cwd=_repoDir,
+        capture_output=True,
+        check=True,
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+
+
+def _Print(name: str, result: Dict):
+    print(
+        f"{name}: {result['milliseconds']}ms, {result['moduleCount']} new modules,"
+        f" {len(result['addonModules'])} of them from the addon"
+    )
+    print(f"  packages loaded: {', '.join(result['otherPackages']) or '-'}")
+    print(f"  menu entries: {', '.join(result['menuActions']) or '-'}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--compare", metavar="REV", help="Also measure the addon at this git revision")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    if args.compare:
+        with tempfile.TemporaryDirectory() as directory:
+            _ExportRevision(args.compare, directory)
+            results[args.compare] = Measure(directory, args.repeats)
+    results["working tree"] = Measure(_repoDir, args.repeats)
+
+    for name, result in results.items():
+        _Print(name, result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
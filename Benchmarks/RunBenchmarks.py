@@ -0,0 +1,262 @@
+"""End-to-end benchmarks of import, sync and deck reads over a real anki collection.
+
+Each size gets a throwaway collection in a temp dir and a local LingQ API stand-in
+(Tests/FakeLingqServer.py) holding that many cards. The scenarios run in order
+against the same collection, so the import seeds the deck for the others:
+
+    import          ImportLingqsToAnki into an empty deck
+    read_deck       GetAllCardsInDeck over the imported deck
+    export_snapshot ExportSnapshot of every card to a gzip file
+    import_snapshot ImportLingqsToAnki replaying that snapshot into a second, empty deck
+    sync_to_lingq   SyncLingqStatusToLingq after some cards were "reviewed" to a longer interval
+    sync_from_lingq SyncLingqStatusFromLingq after some lingqs changed level on LingQ
+
+Every scenario records wall time, HTTP requests, collection backend (DB) calls and
+peak RSS. Results are compared against baseline.json and the run fails when a
+scenario got slower or chattier than the baseline allows.
+
+Usage: python -m Benchmarks.RunBenchmarks [--sizes 1000 10000 50000] [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import psutil
+from anki.collection import Collection
+
+from LingqAnkiSync import AnkiHandler, UserFiles
+from LingqAnkiSync.UIActionHandler import ActionHandler
+from Tests.FakeLingqServer import FakeLingqServer
+
+_baselinePath = os.path.join(os.path.dirname(__file__), "baseline.json")
+_deckName = "LingQ Benchmark"
+_snapshotDeckName = "LingQ Benchmark Snapshot"
+_languageCode = "es"
+# Share of the deck that gets reviewed or changed on LingQ before the sync scenarios
+_changedFraction = 0.05
+# A scenario regresses when it is this much slower than its baseline...
+_timeTolerance = 0.25
+# ...ignoring differences smaller than this, which are noise at small sizes
+_timeSlackSeconds = 0.5
+# Imported cards get random intervals within their level, and rescheduling makes a
+# call per distinct interval, so the DB call count varies a little between runs
+_dbCallsTolerance = 0.02
+
+
+class _AddonManager:
+    """Stands in for anki's addon manager so Config can read and write its values"""
+
+    def __init__(self, config: Dict):
+        self.config = config
+
+    def getConfig(self, name):
+        return self.config
+
+    def writeConfig(self, name, config):
+        self.config = config
+
+
+class _CountingBackend:
+    """Counts the calls made into the collection's rust backend"""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self._backend, name)
+        if not callable(attribute):
+            return attribute
+
+        def Counted(*args, **kwargs):
+            self.calls += 1
+            return attribute(*args, **kwargs)
+
+        return Counted
+
+
+class _PeakRssSampler:
+    def __init__(self, intervalSeconds: float = 0.05):
+        self._process = psutil.Process()
+        self._intervalSeconds = intervalSeconds
+        self._stop = threading.Event()
+        self.peakRss = 0
+
+    def __enter__(self):
+        self.peakRss = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._Sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peakRss = max(self.peakRss, self._process.memory_info().rss)
+
+    def _Sample(self):
+        while not self._stop.wait(self._intervalSeconds):
+            self.peakRss = max(self.peakRss, self._process.memory_info().rss)
+
+
+class _Benchmark:
+    def __init__(self, size: int, directory: str):
+        self.size = size
+        self.directory = directory
+        self.server = FakeLingqServer(cardCount=size).Start()
+        self.collection = Collection(os.path.join(directory, f"benchmark_{size}.anki2"))
+        self.backend = _CountingBackend(self.collection._backend)
+        self.collection._backend = self.backend
+        self.collection.db._backend = self.backend
+        AnkiHandler.UseCollection(self.collection)
+        # Keep the benchmark's run reports out of the addon folder
+        UserFiles._userFilesDir = os.path.join(directory, "user_files")
+        self.actionHandler = ActionHandler(
+            _AddonManager(
+                {
+                    "apiKey": self.server.apiKey,
+                    "languageCode": _languageCode,
+                    "apiBaseUrl": self.server.baseUrl,
+                }
+            )
+        )
+        self.results = {}
+
+    def Close(self):
+        AnkiHandler.UseCollection(None)
+        self.collection.close()
+        self.server.Stop()
+
+    @contextmanager
+    def Measure(self, scenario: str):
+        self.server.ResetCounts()
+        dbCallsBefore = self.backend.calls
+        startTime = time.perf_counter()
+        with _PeakRssSampler() as sampler:
+            yield
+        self.results[scenario] = {
+            "seconds": round(time.perf_counter() - startTime, 3),
+            "requests": sum(self.server.requestCounts.values()),
+            "dbCalls": self.backend.calls - dbCallsBefore,
+            "peakRssMb": round(sampler.peakRss / 2**20, 1),
+        }
+
+    def Run(self) -> Dict:
+        with self.Measure("import"):
+            self.actionHandler.ImportLingqsToAnki(_deckName, importKnowns=True)
+
+        with self.Measure("read_deck"):
+            AnkiHandler.GetAllCardsInDeck(_deckName)
+
+        snapshotPath = os.path.join(self.directory, f"snapshot_{self.size}.ndjson.gz")
+        with self.Measure("export_snapshot"):
+            self.actionHandler.ExportSnapshot(snapshotPath)
+        with self.Measure("import_snapshot"):
+            self.actionHandler.ImportLingqsToAnki(
+                _snapshotDeckName, importKnowns=True, snapshotPath=snapshotPath
+            )
+
+        self._ReviewSomeCards()
+        with self.Measure("sync_to_lingq"):
+            self.actionHandler.SyncLingqStatusToLingq(_deckName)
+
+        self._ChangeSomeLingqs()
+        with self.Measure("sync_from_lingq"):
+            self.actionHandler.SyncLingqStatusFromLingq(_deckName)
+
+        return self.results
+
+    def _ReviewSomeCards(self):
+        """Push an evenly spread share of the cards past their next level's interval"""
+        cardIds = self.collection.find_cards(f'deck:"{_deckName}" -LingqLevel:known')
+        step = max(int(1 / _changedFraction), 1)
+        self.collection.sched.set_due_date(cardIds[::step], "200!")
+
+    def _ChangeSomeLingqs(self):
+        step = max(int(1 / _changedFraction), 1)
+        for pk in range(3, self.size + 1, step):
+            self.server._statusOverrides[(_languageCode, pk)] = (3, 3)
+
+
+def _CompareToBaseline(results: Dict, baseline: Dict) -> list:
+    regressions = []
+    for size, scenarios in results.items():
+        for scenario, measured in scenarios.items():
+            expected = baseline.get(size, {}).get(scenario)
+            if expected is None:
+                continue
+
+            allowedSeconds = expected["seconds"] * (1 + _timeTolerance) + _timeSlackSeconds
+            if measured["seconds"] > allowedSeconds:
+                regressions.append(
+                    f"{size} {scenario}: {measured['seconds']}s, baseline {expected['seconds']}s"
+                )
+            allowed = {
+                "requests": expected["requests"],
+                "dbCalls": expected["dbCalls"] * (1 + _dbCallsTolerance),
+            }
+            for counter in ("requests", "dbCalls"):
+                if measured[counter] > allowed[counter]:
+                    regressions.append(
+                        f"{size} {scenario}: {measured[counter]} {counter}, baseline {expected[counter]}"
+                    )
+    return regressions
+
+
+def _PrintResults(results: Dict):
+    print(f"{'size':>8} {'scenario':<16} {'seconds':>9} {'requests':>9} {'dbCalls':>9} {'peakRssMb':>10}")
+    for size, scenarios in results.items():
+        for scenario, measured in scenarios.items():
+            print(
+                f"{size:>8} {scenario:<16} {measured['seconds']:>9} {measured['requests']:>9}"
+                f" {measured['dbCalls']:>9} {measured['peakRssMb']:>10}"
+            )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            benchmark = _Benchmark(size, directory)
+            try:
+                results[str(size)] = benchmark.Run()
+            finally:
+                benchmark.Close()
+
+    _PrintResults(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(_baselinePath):
+        with open(_baselinePath) as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(_baselinePath, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline updated in {_baselinePath}")
+        return 0
+
+    regressions = _CompareToBaseline(results, baseline)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,44 @@
+import hashlib
 import os
+import re
 import time
-from aqt import mw
+from anki.collection import AddNoteRequest
 from anki.notes import Note
+from anki.utils import ids2str
 from anki.cards import Card
-from typing import List
+from anki.consts import QUEUE_TYPE_SUSPENDED
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from .Models.AnkiCard import AnkiCard
+from .Models.Lingq import Lingq
+from . import Converter
 
+try:
+    from aqt import mw
+except ImportError:
+    # Running without the anki GUI, e.g. in benchmarks. Use UseCollection instead
+    mw = None
+
+# Collection to work on instead of the one open in the anki GUI
+_collection = None
+
+# Marks notes whose lingq was deleted on LingQ, they are left out of syncs
+ORPHAN_TAG = "LingqOrphan"
+ORPHAN_ACTIONS = ("tag", "suspend", "delete")
+
+# What imports do with a lingq whose term already has a note under another LingqPK
+DUPLICATE_TERM_ACTIONS = ("skip", "merge", "keep")
+
+# Collection config listing the languages whose existing notes got their lingq guid
+_guidsAssignedConfigKey = "lingqAnkiSyncGuidsAssigned"
+
+# Collection config listing the card ids ReconcileOrphans suspended
+_orphanSuspendedConfigKey = "lingqAnkiSyncOrphanSuspended"
+
+# Orders RepositionNewCards can put new cards in, the first key sorts first
+NEW_CARD_ORDERS = ("frequency", "importance")
+
+# Cards read between the checkpoints of a deck read
+_checkpointEvery = 200
 
 _contextReverseLinks = {
     "ar": "https://context.reverso.net/translation/arabic-english/{{Front}}",
@@ -36,51 +69,234 @@ _noteFields = [
     "LingqImportance",
     "FrontAudio",
     "SentenceAudio",
+    "LingqHash",
 ]
 
 
+def UseCollection(collection):
+    """Point every operation at the given collection, or back at the GUI's with None"""
+    global _collection
+    _collection = collection
+
+
+def _Col():
+    return _collection if _collection is not None else mw.col
+
+
 def _GetModelName(languageCode: str) -> str:
     return f"lingqAnkiSync_{languageCode}"
 
 
+def LingqGuid(languageCode: str, primaryKey: int) -> str:
+    """The guid of a lingq's note. The same lingq gets the same guid in every
+    collection, so anki's imports and exports match its notes up
+    """
+    return f"lingq-{languageCode}-{primaryKey}"
+
+
+def FindNotesByPrimaryKey(languageCode: str, primaryKeys) -> Dict[int, int]:
+    """:returns the id of the note with the lingq guid of each of the given LingqPKs
+    that has one, in any deck
+    """
+    model = _Col().models.by_name(_GetModelName(languageCode))
+    if model is None:
+        return {}
+    return _FindNotesByPrimaryKey(model, languageCode, primaryKeys)
+
+
+def GetPrimaryKeysWithGuid(languageCode: str) -> Set[int]:
+    """:returns the LingqPKs whose lingq guid a note has, in any deck"""
+    model = _Col().models.by_name(_GetModelName(languageCode))
+    if model is None:
+        return set()
+
+    prefix = LingqGuid(languageCode, 0)[:-1]
+    primaryKeys = set()
+    for guid in _Col().db.list("select guid from notes where mid = ?", model["id"]):
+        if guid.startswith(prefix) and guid[len(prefix) :].isdigit():
+            primaryKeys.add(int(guid[len(prefix) :]))
+    return primaryKeys
+
+
+def _FindNotesByPrimaryKey(model, languageCode: str, primaryKeys) -> Dict[int, int]:
+    guidToPk = {LingqGuid(languageCode, primaryKey): primaryKey for primaryKey in primaryKeys}
+    if not guidToPk:
+        return {}
+    # guid has no index, but the note type does, so only the language's notes are read
+    return {
+        guidToPk[guid]: noteId
+        for guid, noteId in _Col().db.all("select guid, id from notes where mid = ?", model["id"])
+        if guid in guidToPk
+    }
+
+
+def EnsureLingqGuids(languageCode: str) -> int:
+    """Give the notes imported before notes got lingq guids theirs, once per collection
+    and language
+
+    :returns the number of notes that got a new guid
+    """
+    assignedLanguages = _Col().get_config(_guidsAssignedConfigKey, [])
+    if languageCode in assignedLanguages:
+        return 0
+
+    assignedCount = AssignLingqGuids(languageCode)
+    _Col().set_config(_guidsAssignedConfigKey, assignedLanguages + [languageCode])
+    return assignedCount
+
+
+def AssignLingqGuids(languageCode: str) -> int:
+    """Set the guid of the language's notes to their LingqGuid, in a single note update.
+    When a lingq has notes in several decks only one of them can have its guid
+
+    :returns the number of notes that got a new guid
+    """
+    model = _Col().models.by_name(_GetModelName(languageCode))
+    if model is None:
+        return 0
+
+    primaryKeyIndex = [field["name"] for field in model["flds"]].index("LingqPK")
+    rows = _Col().db.all("select id, guid, flds from notes where mid = ?", model["id"])
+    takenGuids = {guid for _, guid, _ in rows}
+
+    newGuids = {}
+    for noteId, guid, fields in rows:
+        primaryKey = fields.split("\x1f")[primaryKeyIndex]
+        if not primaryKey.isdigit():
+            continue
+        lingqGuid = LingqGuid(languageCode, int(primaryKey))
+        if lingqGuid not in takenGuids:
+            takenGuids.add(lingqGuid)
+            newGuids[noteId] = lingqGuid
+
+    notes = []
+    for noteId, guid in newGuids.items():
+        note = _Col().get_note(noteId)
+        note.guid = guid
+        notes.append(note)
+    if notes:
+        _Col().update_notes(notes)
+    return len(notes)
+
+
 def CreateNotesFromCards(
-    cards: List[AnkiCard], deckName: str, languageCode: str
+    cards: List[AnkiCard],
+    deckName: str,
+    languageCode: str,
+    progressCallback=None,
+    checkForDuplicates: bool = True,
+    keepNewCards: bool = False,
+    guidPks: Optional[Set[int]] = None,
 ) -> int:
-    return sum(CreateNote(card, deckName, languageCode) == True for card in cards)
+    """Add the cards to the deck in a single add_notes call, then reschedule them with
+    one set_due_date call per interval
+
+    checkForDuplicates=False skips reading the deck's LingqPKs, for callers that
+    already left out the cards whose LingqPK is in the deck. keepNewCards leaves the
+    cards of new lingqs as anki new cards instead of due today, see RepositionNewCards.
+    guidPks saves reading the note type's guids for callers that add several batches:
+    pass GetPrimaryKeysWithGuid, the LingqPKs of the added notes are added to it
+    """
+    CreateNoteTypeIfNotExist(languageCode)
+    model = _Col().models.by_name(_GetModelName(languageCode))
+    deckId = _Col().decks.id(deckName)
+    seenPks = set(GetLingqLevelsInDeck(deckName)) if checkForDuplicates else set()
+    # Lingqs with a note in another deck already, their guid is taken
+    if guidPks is None:
+        guidPks = set(
+            _FindNotesByPrimaryKey(model, languageCode, [card.primaryKey for card in cards])
+        )
+
+    notesToAdd = []
+    for i, card in enumerate(cards):
+        if card.primaryKey not in seenPks:
+            seenPks.add(card.primaryKey)
+            note = _NewNote(card, model)
+            if card.primaryKey not in guidPks:
+                guidPks.add(card.primaryKey)
+                note.guid = LingqGuid(languageCode, card.primaryKey)
+            notesToAdd.append((note, card.interval))
+        if progressCallback:
+            progressCallback(i + 1, len(cards), card.word, phase="Importing")
+
+    if not notesToAdd:
+        return 0
+
+    _Col().add_notes([AddNoteRequest(note, deckId) for note, _ in notesToAdd])
+
+    cardIdsByInterval = {}
+    for note, interval in notesToAdd:
+        if keepNewCards and note["LingqLevel"] == Lingq.LEVEL_1:
+            continue
+        cardIdsByInterval.setdefault(interval, []).extend(note.card_ids())
+    for interval, cardIds in cardIdsByInterval.items():
+        _Col().sched.set_due_date(cardIds, str(interval))
+
+    return len(notesToAdd)
+
+
+def CreateNote(
+    card: AnkiCard, deckName: str, languageCode: str, checkForDuplicates: bool = True
+) -> bool:
+    if checkForDuplicates and DoesDuplicateCardExistInDeck(card.primaryKey, deckName):
+        return False
 
+    CreateNoteTypeIfNotExist(languageCode)
+    model = _Col().models.by_name(_GetModelName(languageCode))
+    note = _NewNote(card, model)
+    if not _FindNotesByPrimaryKey(model, languageCode, [card.primaryKey]):
+        note.guid = LingqGuid(languageCode, card.primaryKey)
 
-def CreateNote(card: AnkiCard, deckName: str, languageCode: str) -> bool:
-    if DoesDuplicateCardExistInDeck(card.primaryKey, deckName):
-        return False
+    deck_id = _Col().decks.id(deckName)
+    note.note_type()["did"] = deck_id
+    _Col().add_note(note, deck_id)
+    _Col().sched.set_due_date(note.card_ids(), str(card.interval))
+    return True
 
-    # Use the Basic (and reverse card) note type
-    model = mw.col.models.byName("Basic (and reverse card)")
-    note = Note(mw.col, model)
 
-    # Set the front and back fields
+def _NewNote(card: AnkiCard, model) -> Note:
+    note = Note(_Col(), model)
     note["Front"] = card.word
-    note["Back"] = "<br>".join(
-        [f"{i+1}. {item}" for i, item in enumerate(card.translations)] +
-        ["", "Context:", "", card.sentence]
-    )
+    note["Back"] = _FormatTranslations(card.translations)
+    note["LingqPK"] = str(card.primaryKey)
+    note["LingqLevel"] = card.level
+    note["Sentence"] = card.sentence
+    note["LingqImportance"] = str(card.importance)
+    # Note types created before LingqHash get it on their first refresh
+    if "LingqHash" in note:
+        note["LingqHash"] = ContentHash(card)
+    note.tags = card.tags
+    return note
+
+
+def ContentHash(card: AnkiCard) -> str:
+    """The hash of what a lingq puts on its note, see RefreshNotes"""
+    return _FieldsHash(card.word, _FormatTranslations(card.translations), card.sentence)
+
+
+def _FieldsHash(front: str, back: str, sentence: str) -> str:
+    return hashlib.sha1("\x1f".join((front, back, sentence)).encode("utf-8")).hexdigest()
 
-    deck_id = mw.col.decks.id(deckName)
-    note.note_type()["did"] = deck_id
-    mw.col.add_note(note, deck_id)
-    return True
+
+def _FormatTranslations(translations: List[str]) -> str:
+    return "<br>".join(f"{i+1}. {item}" for i, item in enumerate(translations))
+
+
+def _ParseTranslations(back: str) -> List[str]:
+    return [re.sub(r"^\d+\. ", "", line) for line in back.split("<br>") if line]
 
 
 def DoesDuplicateCardExistInDeck(lingqPk, deckName):
-    return len(mw.col.find_cards(f'deck:"{deckName}" LingqPK:"{lingqPk}"')) > 0
+    return len(_Col().find_cards(f'deck:"{deckName}" LingqPK:"{lingqPk}"')) > 0
 
 
 def CreateNoteType(languageCode: str):
-    model = mw.col.models.new(_GetModelName(languageCode))
+    model = _Col().models.new(_GetModelName(languageCode))
 
     for field in _noteFields:
-        mw.col.models.addField(model, mw.col.models.newField(field))
+        _Col().models.addField(model, _Col().models.newField(field))
 
-    template = mw.col.models.newTemplate(_GetModelName(languageCode))
+    template = _Col().models.newTemplate(_GetModelName(languageCode))
     resourceFolder = os.path.join(os.path.dirname(__file__), "resources")
 
     with open(os.path.join(resourceFolder, "style.css"), "r") as f:
@@ -103,44 +319,365 @@ def CreateNoteType(languageCode: str):
         else:
             template["afmt"] = html
 
-    mw.col.models.addTemplate(model, template)
-    mw.col.models.add(model)
-    mw.col.models.setCurrent(model)
-    mw.col.models.save(model)
+    _Col().models.addTemplate(model, template)
+    _Col().models.add(model)
+    _Col().models.setCurrent(model)
+    _Col().models.save(model)
     return model
 
 
 def CreateNoteTypeIfNotExist(languageCode: str):
-    if not mw.col.models.byName(_GetModelName(languageCode)):
+    if not _Col().models.by_name(_GetModelName(languageCode)):
         CreateNoteType(languageCode)
 
 
 def UpdateCardLevel(deckName: str, lingqPk: int, level: str):
-    cardId = mw.col.find_cards(f'deck:"{deckName}" LingqPK:"{lingqPk}"')[0]
-    card = mw.col.get_card(cardId)
+    cardId = _Col().find_cards(f'deck:"{deckName}" LingqPK:"{lingqPk}"')[0]
+    card = _Col().get_card(cardId)
     card.note()["LingqLevel"] = level
-    mw.col.update_note(card.note())
+    _Col().update_note(card.note())
 
     # Anki seems to miss a few of them if the updates aren't spaced out. This isn't a perfect solution
     time.sleep(0.1)
 
 
-def GetAllCardsInDeck(deckName: str) -> List[AnkiCard]:
+def GetAllCardsInDeck(
+    deckName: str, checkpoint: Optional[Callable[[], None]] = None
+) -> List[AnkiCard]:
+    """:param checkpoint: Called every few hundred cards, it may raise to stop reading"""
     cards = []
-    cardIds = mw.col.find_cards(f'deck:"{deckName}"')
-    for cardId in cardIds:
-        card = mw.col.get_card(cardId)
+    cardIds = _Col().find_cards(f'deck:"{deckName}" -tag:{ORPHAN_TAG}')
+    for i, cardId in enumerate(cardIds):
+        if checkpoint is not None and i % _checkpointEvery == 0:
+            checkpoint()
+        card = _Col().get_card(cardId)
         card = _CreateAnkiCardObject(card, cardId)
         cards.append(card)
     return cards
 
 
+def GetCardsInDeck(
+    deckName: str, primaryKeys: List[int], languageCode: Optional[str] = None
+) -> List[AnkiCard]:
+    """Like GetAllCardsInDeck, for only the cards of the given LingqPKs. With the
+    languageCode the notes are found by their lingq guid, and only the LingqPKs
+    without one in the deck are searched for in the notes' fields
+    """
+    if not primaryKeys:
+        return []
+
+    deckSearch = f'deck:"{deckName}" -tag:{ORPHAN_TAG}'
+    cards = []
+    if languageCode is not None:
+        noteIds = FindNotesByPrimaryKey(languageCode, primaryKeys).values()
+        if noteIds:
+            cards = _CardsFound(f"{deckSearch} nid:{','.join(map(str, noteIds))}")
+        foundPks = {card.primaryKey for card in cards}
+        primaryKeys = [pk for pk in primaryKeys if pk not in foundPks]
+
+    if primaryKeys:
+        terms = " OR ".join(f'LingqPK:"{pk}"' for pk in primaryKeys)
+        cards += _CardsFound(f"{deckSearch} ({terms})")
+    return cards
+
+
+def _CardsFound(search: str) -> List[AnkiCard]:
+    return [
+        _CreateAnkiCardObject(_Col().get_card(cardId), cardId)
+        for cardId in _Col().find_cards(search)
+    ]
+
+
+def GetLingqCard(card: Card) -> Optional[Tuple[AnkiCard, str]]:
+    """:returns the card and the name of its home deck, or None when its note isn't a lingq"""
+    note = card.note()
+    if "LingqPK" not in note or "LingqLevel" not in note or note.has_tag(ORPHAN_TAG):
+        return None
+    # Cards in a filtered deck still belong to their original deck
+    deckName = _Col().decks.name(card.odid or card.did)
+    return _CreateAnkiCardObject(card, card.id), deckName
+
+
+def GetLingqLevelsInDeck(deckName: str) -> Dict[int, str]:
+    return {
+        int(primaryKey): level
+        for _, (primaryKey, level) in _ReadFieldsInDeck(deckName, ["LingqPK", "LingqLevel"])
+    }
+
+
+def GetLingqTermsInDeck(deckName: str) -> Dict[int, str]:
+    """:returns the Front of each lingq note in the deck by LingqPK"""
+    return {
+        int(primaryKey): front
+        for _, (primaryKey, front) in _ReadFieldsInDeck(deckName, ["LingqPK", "Front"])
+    }
+
+
+def MergeTranslations(deckName: str, pkToTranslations: Dict[int, List[str]]) -> int:
+    """Append the translations that the notes of the given LingqPKs don't have yet to
+    their Back, in a single note update
+
+    :returns the number of notes that got new translations
+    """
+    noteIds = [
+        noteId
+        for noteId, (primaryKey,) in _ReadFieldsInDeck(deckName, ["LingqPK"])
+        if int(primaryKey) in pkToTranslations
+    ]
+
+    notesToUpdate = []
+    for noteId in noteIds:
+        note = _Col().get_note(noteId)
+        translations = _ParseTranslations(note["Back"])
+        knownTranslations = {Converter.NormalizeTerm(translation) for translation in translations}
+        for translation in pkToTranslations[int(note["LingqPK"])]:
+            if Converter.NormalizeTerm(translation) not in knownTranslations:
+                knownTranslations.add(Converter.NormalizeTerm(translation))
+                translations.append(translation)
+        newBack = _FormatTranslations(translations)
+        if newBack != note["Back"]:
+            note["Back"] = newBack
+            notesToUpdate.append(note)
+
+    if notesToUpdate:
+        _Col().update_notes(notesToUpdate)
+    return len(notesToUpdate)
+
+
+def RefreshNotes(deckName: str, languageCode: str, cards: List[AnkiCard]) -> int:
+    """Rewrite the Front, Back and Sentence of the deck's notes whose lingq changed
+    since it was imported or last refreshed, in a single note update. Each note keeps
+    the ContentHash of its lingq in LingqHash, so edits made in anki stay until the
+    lingq itself changes. Notes without a LingqHash yet are compared on their fields
+
+    :returns the number of notes rewritten
+    """
+    _AddHashField(languageCode)
+    cardsByPk = {card.primaryKey: card for card in cards}
+
+    changedNotes = {}
+    for noteId, (primaryKey, front, back, sentence, storedHash) in _ReadFieldsInDeck(
+        deckName, ["LingqPK", "Front", "Back", "Sentence", "LingqHash"]
+    ):
+        card = cardsByPk.get(int(primaryKey))
+        if card is None:
+            continue
+        contentHash = ContentHash(card)
+        if contentHash != (storedHash or _FieldsHash(front, back, sentence)):
+            changedNotes[noteId] = (card, contentHash)
+
+    notesToUpdate = []
+    for noteId, (card, contentHash) in changedNotes.items():
+        note = _Col().get_note(noteId)
+        note["Front"] = card.word
+        note["Back"] = _FormatTranslations(card.translations)
+        note["Sentence"] = card.sentence
+        note["LingqHash"] = contentHash
+        notesToUpdate.append(note)
+
+    if notesToUpdate:
+        _Col().update_notes(notesToUpdate)
+    return len(notesToUpdate)
+
+
+def _AddHashField(languageCode: str):
+    """Add LingqHash to a note type created without it. This changes the collection's
+    schema, so the next sync with AnkiWeb has to be a full one
+    """
+    model = _Col().models.by_name(_GetModelName(languageCode))
+    if model is None or "LingqHash" in [field["name"] for field in model["flds"]]:
+        return
+    _Col().models.addField(model, _Col().models.newField("LingqHash"))
+    _Col().models.save(model)
+
+
+def UpdateLevels(deckName: str, pkToLevel: Dict[int, str]) -> int:
+    """Write new LingqLevels in a single note update, leaving the cards' schedule alone"""
+    return len(_UpdateLevels(deckName, pkToLevel))
+
+
+def UpdateLevelsAndReschedule(
+    deckName: str, pkToLevel: Dict[int, str], levelToInterval: Dict[str, int]
+) -> int:
+    """Write new LingqLevels in a single note update, then reschedule the
+    affected cards with one set_due_date call per level rather than per card
+    """
+    notesAndLevels = _UpdateLevels(deckName, pkToLevel)
+
+    cardIdsByLevel = {}
+    for note, level in notesAndLevels:
+        cardIdsByLevel.setdefault(level, []).extend(note.card_ids())
+
+    for level, cardIds in cardIdsByLevel.items():
+        low, high = Converter.LevelToIntervalRange(level, levelToInterval)
+        days = "0" if level == Lingq.LEVEL_1 else f"{low}-{high}!"
+        _Col().sched.set_due_date(cardIds, days)
+
+    return len(notesAndLevels)
+
+
+def ReconcileOrphans(
+    deckName: str, languageCode: str, livePrimaryKeys, action: str = "tag"
+) -> Tuple[int, int]:
+    """Tag the deck's notes of the language whose LingqPK isn't among livePrimaryKeys
+    with ORPHAN_TAG, and suspend or delete them too depending on action, each in one
+    bulk operation. Orphans whose lingq is back are untagged, and the cards a
+    reconciliation suspended are unsuspended, the ones suspended by the user stay so
+
+    :returns the number of orphaned notes and of restored ones
+    """
+    if action not in ORPHAN_ACTIONS:
+        raise ValueError(f'No such orphan action "{action}". Should be one of {ORPHAN_ACTIONS}')
+
+    orphanIds = [
+        noteId
+        for noteId, (primaryKey,) in _ReadFieldsInDeck(deckName, ["LingqPK"], languageCode)
+        if int(primaryKey) not in livePrimaryKeys
+    ]
+    taggedIds = set(
+        _Col().find_notes(
+            f'deck:"{deckName}" note:"{_GetModelName(languageCode)}" tag:{ORPHAN_TAG}'
+        )
+    )
+    restoredIds = list(taggedIds.difference(orphanIds))
+    suspendedIds = set(_Col().get_config(_orphanSuspendedConfigKey, []))
+
+    if restoredIds:
+        _Col().tags.bulk_remove(restoredIds, ORPHAN_TAG)
+        unsuspendIds = suspendedIds.intersection(_CardIdsOfNotes(restoredIds))
+        _Col().sched.unsuspend_cards(list(unsuspendIds))
+        suspendedIds.difference_update(unsuspendIds)
+        _Col().set_config(_orphanSuspendedConfigKey, sorted(suspendedIds))
+    if not orphanIds:
+        return 0, len(restoredIds)
+
+    if action == "delete":
+        suspendedIds.difference_update(_CardIdsOfNotes(orphanIds))
+        _Col().remove_notes(orphanIds)
+        _Col().set_config(_orphanSuspendedConfigKey, sorted(suspendedIds))
+        return len(orphanIds), len(restoredIds)
+
+    _Col().tags.bulk_add([noteId for noteId in orphanIds if noteId not in taggedIds], ORPHAN_TAG)
+    if action == "suspend":
+        # Only the cards not suspended yet, so that restoring leaves the user's ones alone
+        suspendIds = _Col().db.list(
+            f"select id from cards where nid in {ids2str(orphanIds)} and queue != {QUEUE_TYPE_SUSPENDED}"
+        )
+        _Col().sched.suspend_cards(suspendIds)
+        _Col().set_config(_orphanSuspendedConfigKey, sorted(suspendedIds.union(suspendIds)))
+    return len(orphanIds), len(restoredIds)
+
+
+def RepositionNewCards(deckName: str, pkToPopularity: Dict[int, int], order: str) -> int:
+    """Put the new cards of the lingqs in pkToPopularity in the order of
+    NEW_CARD_ORDERS' order, in one card update: by popularity then importance for
+    frequency, the other way round for importance, most first. They swap the
+    positions they already held, so the deck's other new cards keep theirs
+
+    :returns the number of new cards put in order
+    """
+    if order not in NEW_CARD_ORDERS:
+        raise ValueError(f'No such new card order "{order}". Should be one of {NEW_CARD_ORDERS}')
+
+    sortKeys = {}
+    for noteId, (primaryKey, importance) in _ReadFieldsInDeck(
+        deckName, ["LingqPK", "LingqImportance"]
+    ):
+        if int(primaryKey) not in pkToPopularity:
+            continue
+        popularity = pkToPopularity[int(primaryKey)]
+        importance = int(importance) if importance.isdigit() else 0
+        sortKeys[noteId] = (
+            (popularity, importance) if order == "frequency" else (importance, popularity)
+        )
+    if not sortKeys:
+        return 0
+
+    newCards = _Col().db.all(
+        f"select id, nid, due from cards where type = 0 and nid in {ids2str(sortKeys)} order by due"
+    )
+    if not newCards:
+        return 0
+
+    positions = [due for _, _, due in newCards]
+    # sorted is stable in reverse too, so ties stay in due order
+    newCards.sort(key=lambda row: sortKeys[row[1]], reverse=True)
+    movedCards = []
+    for (cardId, _, due), position in zip(newCards, positions):
+        if due != position:
+            card = _Col().get_card(cardId)
+            card.due = position
+            movedCards.append(card)
+    if movedCards:
+        _Col().update_cards(movedCards)
+    return len(newCards)
+
+
+def _CardIdsOfNotes(noteIds: List[int]) -> List[int]:
+    return _Col().db.list(f"select id from cards where nid in {ids2str(noteIds)}")
+
+
+def _UpdateLevels(deckName: str, pkToLevel: Dict[int, str]) -> List[Tuple[Note, str]]:
+    # Only the notes that change are loaded, the others are matched on their raw fields
+    noteIds = [
+        noteId
+        for noteId, (primaryKey,) in _ReadFieldsInDeck(deckName, ["LingqPK"])
+        if int(primaryKey) in pkToLevel
+    ]
+
+    notesAndLevels = []
+    for noteId in noteIds:
+        note = _Col().get_note(noteId)
+        level = pkToLevel[int(note["LingqPK"])]
+        note["LingqLevel"] = level
+        notesAndLevels.append((note, level))
+
+    if notesAndLevels:
+        _Col().update_notes([note for note, _ in notesAndLevels])
+    return notesAndLevels
+
+
+def _ReadFieldsInDeck(
+    deckName: str, fieldNames: List[str], languageCode: Optional[str] = None
+) -> List[Tuple[int, List[str]]]:
+    """Reads the given fields of the deck's lingq notes with one query, rather than
+    loading every note through the backend. With a languageCode only the notes of
+    that language's note type are read
+
+    :returns (note id, field values) for each note with a LingqPK
+    """
+    search = f'deck:"{deckName}" LingqPK:_*'
+    if languageCode is not None:
+        search += f' note:"{_GetModelName(languageCode)}"'
+    noteIds = _Col().find_notes(search)
+    if not noteIds:
+        return []
+
+    fieldIndexes = {}
+    rows = []
+    for noteId, modelId, fields in _Col().db.all(
+        f"select id, mid, flds from notes where id in {ids2str(noteIds)}"
+    ):
+        if modelId not in fieldIndexes:
+            modelFields = [field["name"] for field in _Col().models.get(modelId)["flds"]]
+            fieldIndexes[modelId] = (
+                [modelFields.index(name) for name in fieldNames]
+                if all(name in modelFields for name in fieldNames)
+                else None
+            )
+        if fieldIndexes[modelId] is None:
+            continue
+        values = fields.split("\x1f")
+        rows.append((noteId, [values[index] for index in fieldIndexes[modelId]]))
+    return rows
+
+
 def GetAllDeckNames() -> List[str]:
-    return [x.name for x in mw.col.decks.all_names_and_ids()]
+    return [x.name for x in _Col().decks.all_names_and_ids()]
 
 
 def GetIntervalFromCard(cardId: int) -> int:
-    interval = mw.col.db.scalar("select ivl from cards where id = ?", cardId)
+    interval = _Col().db.scalar("select ivl from cards where id = ?", cardId)
     return 0 if interval is None else interval
 
 
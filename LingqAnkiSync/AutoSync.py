@@ -0,0 +1,155 @@
+import threading
+from typing import Callable, Dict, Hashable, Set
+
+
+class AutoSyncQueue:
+    """Collects the lingqs whose level changed while reviewing and flushes them in batches.
+
+    Every Add restarts the debounce timer, so a batch is only flushed once reviewing
+    pauses for debounceSeconds. Flushes never overlap: lingqs added while one runs
+    wait for the next. A failed batch is put back and retried with the next one.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Dict[Hashable, Set[int]]], None],
+        debounceSeconds: float,
+        timerFactory=threading.Timer,
+    ):
+        """
+        Args:
+            flush: Called on the timer's thread with the pending primary keys per
+                target, returns once they are pushed
+            timerFactory: Creates the debounce timer, threading.Timer's signature
+        """
+        self._flush = flush
+        self.debounceSeconds = debounceSeconds
+        self._timerFactory = timerFactory
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, Set[int]] = {}
+        self._timer = None
+        self._flushing = False
+
+    @property
+    def pendingCount(self) -> int:
+        with self._lock:
+            return sum(len(primaryKeys) for primaryKeys in self._pending.values())
+
+    def Add(self, target: Hashable, primaryKey: int):
+        with self._lock:
+            self._pending.setdefault(target, set()).add(primaryKey)
+            self._RestartTimer()
+
+    def Cancel(self):
+        """Stop the timer, e.g. when the profile closes. The pending levels aren't lost,
+        they were never written to anki so the next sync to LingQ picks them up
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = {}
+
+    def Flush(self):
+        with self._lock:
+            self._timer = None
+            if self._flushing or not self._pending:
+                # The running flush rearms the timer for whatever is left when it ends
+                return
+            batch, self._pending = self._pending, {}
+            self._flushing = True
+
+        failed = False
+        try:
+            self._flush(batch)
+        except Exception:
+            # e.g. offline, don't keep retrying on a timer until there is a new review
+            failed = True
+            with self._lock:
+                for target, primaryKeys in batch.items():
+                    self._pending.setdefault(target, set()).update(primaryKeys)
+        finally:
+            with self._lock:
+                self._flushing = False
+                if not failed and self._pending and self._timer is None:
+                    self._RestartTimer()
+
+    def _RestartTimer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._timerFactory(self.debounceSeconds, self.Flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+class AutoSync:
+    """Pushes reviewed lingqs to LingQ shortly after their interval crossed a level,
+    a few requests per review session instead of scanning the whole deck
+    """
+
+    def __init__(self, actionHandler, runOnCollection=None, timerFactory=threading.Timer):
+        """
+        Args:
+            runOnCollection: Runs a piece of a flush's collection work and returns its
+                result once it's done. Defaults to running it right away on the timer's
+                thread. The requests to LingQ are sent from the timer's thread between
+                these pieces, not through runOnCollection
+        """
+        self.actionHandler = actionHandler
+        self._runOnCollection = runOnCollection or (lambda work: work())
+        self.queue = AutoSyncQueue(
+            self._Flush, actionHandler.config.GetAutoSyncDebounceSeconds(), timerFactory
+        )
+
+    def OnCardAnswered(self, card):
+        target = self.actionHandler.GetAutoSyncTarget(card)
+        if target is not None:
+            languageCode, deckName, primaryKey = target
+            self.queue.Add((languageCode, deckName), primaryKey)
+
+    def _Flush(self, batch: Dict[Hashable, Set[int]]):
+        downgrade = self.actionHandler.config.GetAutoSyncDowngrade()
+        for (languageCode, deckName), primaryKeys in batch.items():
+            self.actionHandler.SyncNotesToLingq(
+                languageCode, deckName, sorted(primaryKeys), downgrade, self._runOnCollection
+            )
+
+
+def CreateForAnki() -> AutoSync:
+    from aqt import mw
+    from .UIActionHandler import ActionHandler
+
+    return AutoSync(ActionHandler(mw.addonManager), _RunInAnki)
+
+
+def _RunInAnki(work):
+    """Run work as a background operation of anki, which serializes collection access
+    with the reviewer, and wait for it to finish. Work must be short, the reviewer's
+    answers wait behind it
+
+    :returns the result of work
+    """
+    from aqt import mw
+    from aqt.operations import QueryOp
+
+    finished = threading.Event()
+    result = []
+    failure = []
+
+    def OnSuccess(value):
+        result.append(value)
+        finished.set()
+
+    def OnFailure(exception):
+        failure.append(exception)
+        finished.set()
+
+    def Start():
+        op = QueryOp(parent=mw, op=lambda col: work(), success=OnSuccess)
+        op.failure(OnFailure).run_in_background()
+
+    mw.taskman.run_on_main(Start)
+    finished.wait()
+    if failure:
+        raise failure[0]
+    return result[0]
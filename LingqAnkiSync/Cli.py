@@ -0,0 +1,216 @@
+"""Run imports and syncs on anki collection files without the anki GUI.
+
+Each job names a collection file, the addon config to use for it (a JSON file
+with the same values as the addon config in anki) and the operations to run, in
+order. Jobs on different collections run in parallel worker processes; jobs on
+the same collection run one after the other in the same worker.
+
+    python -m LingqAnkiSync.Cli --collection learner.anki2 --config learner.json pull sync
+    python -m LingqAnkiSync.Cli --jobs nightly.json --workers 4
+
+A jobs file is a JSON list of jobs:
+
+    [{"collection": "alice/collection.anki2", "config": "alice.json",
+      "operations": ["pull", "sync"], "decks": {"es": "Spanish", "de": "German"}}]
+
+"decks" maps the language codes to run to their deck, and defaults to the
+config's languageDecks. Anki must not have the collection open.
+
+With "snapshotDir" the "export" operation writes each language's cards to
+<snapshotDir>/<language code>.ndjson.gz, and "import" and "refresh" read them
+from there instead of from LingQ. "importFilter" narrows down imports, with the fields of
+Models.ImportFilter, and defaults to the config's.
+"""
+
+import argparse
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from anki.collection import Collection
+
+from . import AnkiHandler
+from .Config import Config, JsonConfigStore
+from .Models.ImportFilter import ImportFilter
+from .UIActionHandler import ActionHandler
+
+OPERATIONS = ("import", "sync", "pull", "export", "reconcile", "refresh")
+
+# Config values of jobs that differ from the addon's, unless a job's config sets them.
+# Jobs run in parallel processes, so they pace their requests to LingQ together
+_jobDefaults = {"sharedRateLimit": True}
+
+
+@dataclass
+class CliJob:
+    collection: str
+    config: str
+    operations: List[str]
+    decks: Dict[str, str] = field(default_factory=dict)
+    importKnowns: bool = False
+    downgrade: bool = False
+    snapshotDir: Optional[str] = None
+    importFilter: Dict = field(default_factory=dict)  # ImportFilter fields, or the config's
+
+
+def RunJobs(jobs: List[CliJob], workers: int = 1) -> List[Dict]:
+    """:returns a result per job and language, in the order of the jobs"""
+    jobsByCollection: Dict[str, List[CliJob]] = {}
+    for job in jobs:
+        jobsByCollection.setdefault(job.collection, []).append(job)
+
+    groups = list(jobsByCollection.values())
+    if workers <= 1 or len(groups) == 1:
+        groupResults = [_RunCollectionJobs(group) for group in groups]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            groupResults = list(executor.map(_RunCollectionJobs, groups))
+
+    resultsByJob = {}
+    for group, results in zip(groups, groupResults):
+        for job, jobResults in zip(group, results):
+            resultsByJob[id(job)] = jobResults
+    return [result for job in jobs for result in resultsByJob[id(job)]]
+
+
+def _RunCollectionJobs(jobs: List[CliJob]) -> List[List[Dict]]:
+    collection = Collection(jobs[0].collection)
+    AnkiHandler.UseCollection(collection)
+    try:
+        return [RunJob(job) for job in jobs]
+    finally:
+        AnkiHandler.UseCollection(None)
+        collection.close()
+
+
+def RunJob(job: CliJob) -> List[Dict]:
+    """Run a job's operations for each of its languages on the collection in use"""
+    decks = job.decks or _DefaultDecks(job.config)
+    if not decks:
+        return [
+            {
+                "collection": job.collection,
+                "languageCode": None,
+                "deckName": None,
+                "reports": [],
+                "error": "No languages to run, give the job decks or set languageDecks "
+                "or languageCode in its config",
+            }
+        ]
+    results = []
+    for languageCode, deckName in decks.items():
+        result = {
+            "collection": job.collection,
+            "languageCode": languageCode,
+            "deckName": deckName,
+            "reports": [],
+            "error": None,
+        }
+        actionHandler = ActionHandler(
+            JsonConfigStore(
+                job.config, {"languageCode": languageCode, "deckName": deckName}, _jobDefaults
+            )
+        )
+        try:
+            for operation in job.operations:
+                report = _RunOperation(actionHandler, operation, deckName, job)
+                result["reports"].append(json.loads(report.ToJson()))
+        except Exception:
+            result["error"] = traceback.format_exc()
+        finally:
+            actionHandler.Close()
+        results.append(result)
+    return results
+
+
+def _RunOperation(actionHandler: ActionHandler, operation: str, deckName: str, job: CliJob):
+    snapshotPath = None
+    if job.snapshotDir:
+        snapshotPath = os.path.join(job.snapshotDir, f"{actionHandler.GetLanguageCode()}.ndjson.gz")
+
+    if operation == "import":
+        return actionHandler.ImportLingqsToAnki(
+            deckName,
+            job.importKnowns,
+            snapshotPath=snapshotPath,
+            importFilter=ImportFilter(**job.importFilter) if job.importFilter else None,
+        )
+    if operation == "refresh":
+        return actionHandler.RefreshLingqsInAnki(deckName, snapshotPath=snapshotPath)
+    if operation == "reconcile":
+        return actionHandler.ReconcileOrphans(deckName)
+    if operation == "export":
+        if snapshotPath is None:
+            raise ValueError("The export operation needs a snapshotDir to write to")
+        return actionHandler.ExportSnapshot(snapshotPath)
+    if operation == "sync":
+        return actionHandler.SyncLingqStatusToLingq(deckName, job.downgrade)
+    if operation == "pull":
+        return actionHandler.SyncLingqStatusFromLingq(deckName, job.downgrade)
+    raise ValueError(f'Unknown operation "{operation}", use one of {", ".join(OPERATIONS)}')
+
+
+def _DefaultDecks(configPath: str) -> Dict[str, str]:
+    return Config(JsonConfigStore(configPath)).GetLanguageDecks()
+
+
+def _ReadJobs(path: str) -> List[CliJob]:
+    with open(path) as f:
+        return [CliJob(**job) for job in json.load(f)]
+
+
+def _PrintResult(result: Dict):
+    name = f"{result['collection']} [{result['languageCode']}] {result['deckName']}"
+    for report in result["reports"]:
+        print(f"{name}: {report['operation']} {report['counts']}")
+    if result["error"]:
+        print(f"{name}: FAILED\n{result['error']}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("operations", nargs="*", metavar="operation", help=", ".join(OPERATIONS))
+    parser.add_argument("--collection", help="Collection file to run the operations on")
+    parser.add_argument("--config", help="Addon config JSON file for the collection")
+    parser.add_argument("--jobs", help="JSON file with a list of jobs, instead of the above")
+    parser.add_argument("--workers", type=int, default=1, help="Collections to work on at once")
+    parser.add_argument("--import-knowns", action="store_true")
+    parser.add_argument("--downgrade", action="store_true")
+    parser.add_argument("--snapshot-dir", help="Folder export writes snapshots to and import reads from")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    unknownOperations = set(args.operations) - set(OPERATIONS)
+    if unknownOperations:
+        parser.error(f"unknown operations {', '.join(sorted(unknownOperations))}")
+    if args.jobs:
+        jobs = _ReadJobs(args.jobs)
+    elif args.collection and args.config and args.operations:
+        jobs = [
+            CliJob(
+                args.collection,
+                args.config,
+                args.operations,
+                importKnowns=args.import_knowns,
+                downgrade=args.downgrade,
+                snapshotDir=args.snapshot_dir,
+            )
+        ]
+    else:
+        parser.error("give either --jobs, or --collection, --config and the operations to run")
+
+    results = RunJobs(jobs, args.workers)
+    for result in results:
+        _PrintResult(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(result["error"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
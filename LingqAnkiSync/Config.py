@@ -1,5 +1,12 @@
+import json
+import os
 from .Models.Lingq import Lingq
-from typing import Dict
+from .LingqApi import DEFAULT_BASE_URL
+from .Models.ImportFilter import ImportFilter
+from .Models.PageSizeModel import PageSizeModel
+from .Models.RateLimitModel import RateLimitModel
+from dataclasses import asdict
+from typing import Dict, Optional
 
 # fmt: off
 lingqLangcodes = [
@@ -9,6 +16,63 @@ lingqLangcodes = [
 ]
 # fmt: on
 
+_defaultAutoSyncDebounceSeconds = 30
+_defaultPrefetchMaxAgeMinutes = 30
+
+_defaultConfigPath = os.path.join(os.path.dirname(__file__), "config.json")
+
+
+class JsonConfigStore:
+    """Stands in for anki's addon manager outside of anki, keeping the addon config
+    in a JSON file. Like anki, missing values fall back to the addon's config.json
+
+    :param overrides: values that are used but never written back to the file
+    :param defaults: values used instead of the addon's when the file has none, they
+        aren't written to the file either until changed
+    """
+
+    def __init__(
+        self, path: str, overrides: Optional[Dict] = None, defaults: Optional[Dict] = None
+    ):
+        self.path = path
+        self.overrides = overrides or {}
+        self.defaults = defaults or {}
+
+    def getConfig(self, name) -> Dict:
+        with open(_defaultConfigPath) as f:
+            config = json.load(f)
+        config.update(self.defaults)
+        config.update(self._ReadFile())
+        config.update(self.overrides)
+        return config
+
+    def writeConfig(self, name, config: Dict):
+        previous = self._ReadFile()
+        stored = {
+            key: value
+            for key, value in config.items()
+            if key not in self.overrides
+            and not (key in self.defaults and key not in previous and value == self.defaults[key])
+        }
+        stored.update({key: previous[key] for key in self.overrides if key in previous})
+
+        # Jobs in other processes may read the file meanwhile, so it's only replaced
+        # once complete. Each process writes its own partial file
+        partialPath = f"{self.path}.{os.getpid()}.partial"
+        try:
+            with open(partialPath, "w") as f:
+                json.dump(stored, f, indent=2)
+            os.replace(partialPath, self.path)
+        finally:
+            if os.path.exists(partialPath):
+                os.remove(partialPath)
+
+    def _ReadFile(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
 
 class Config:
     def __init__(self, addonManager):
@@ -19,6 +83,10 @@ class Config:
         value = self.config[fieldName]
         return "" if value is None or value == "" else str(value)
 
+    def _GetIntConfig(self, fieldName: str) -> int:
+        value = self.config.get(fieldName)
+        return 0 if value is None or value == "" else int(value)
+
     def _SetConfig(self, fieldName: str, set_to: str):
         self.config[fieldName] = set_to
         self.addonManager.writeConfig(__name__, self.config)
@@ -35,6 +103,123 @@ class Config:
     def SetLanguageCode(self, set_to: str):
         self._SetConfig("languageCode", set_to)
 
+    def GetApiBaseUrl(self) -> str:
+        """Where the LingQ API lives, can point at a local stand-in for testing"""
+        return self.config.get("apiBaseUrl") or DEFAULT_BASE_URL
+
+    def GetDeckName(self):
+        """The deck that was used last"""
+        return "" if self.config.get("deckName") is None else str(self.config["deckName"])
+
+    def SetDeckName(self, set_to: str):
+        self._SetConfig("deckName", set_to)
+
+    def GetLanguageDecks(self) -> Dict[str, str]:
+        """The deck of each language code to run when running every language. Defaults
+        to the single languageCode and deckName
+        """
+        languageDecks = self.config.get("languageDecks") or {}
+        if not languageDecks and self.GetLanguageCode():
+            return {self.GetLanguageCode(): self.GetDeckName()}
+        return dict(languageDecks)
+
+    def SetLanguageDecks(self, set_to: Dict[str, str]):
+        self._SetConfig("languageDecks", set_to)
+
+    def GetSyncTimeBudgetMinutes(self) -> int:
+        """0 means no time limit"""
+        return self._GetIntConfig("syncTimeBudgetMinutes")
+
+    def SetSyncTimeBudgetMinutes(self, set_to: int):
+        self._SetConfig("syncTimeBudgetMinutes", set_to)
+
+    def GetSyncRequestBudget(self) -> int:
+        """0 means no request limit"""
+        return self._GetIntConfig("syncRequestBudget")
+
+    def SetSyncRequestBudget(self, set_to: int):
+        self._SetConfig("syncRequestBudget", set_to)
+
+    def GetAutoSync(self) -> bool:
+        """Push a lingq's level shortly after a review moved it past a level, see AutoSync"""
+        return bool(self.config.get("autoSync"))
+
+    def GetAutoSyncDebounceSeconds(self) -> int:
+        """How long reviewing has to pause before the queued levels are pushed"""
+        return self._GetIntConfig("autoSyncDebounceSeconds") or _defaultAutoSyncDebounceSeconds
+
+    def GetAutoSyncDowngrade(self) -> bool:
+        return bool(self.config.get("autoSyncDowngrade"))
+
+    def GetSharedRateLimit(self) -> bool:
+        """Pace the requests of every anki profile and command line job using the same
+        LingQ account together, see RateLimiter.SharedRateLimiter. Off in anki, where
+        runs seldom overlap, and on for command line jobs, see Cli
+        """
+        return bool(self.config.get("sharedRateLimit"))
+
+    def GetPrefetch(self) -> bool:
+        """Keep a copy of the LingQ cards warm in the background while anki is open,
+        see Prefetch
+        """
+        return bool(self.config.get("prefetch"))
+
+    def GetPrefetchMaxAgeMinutes(self) -> int:
+        """How old the prefetched copy may be for imports and syncs to use it"""
+        return self._GetIntConfig("prefetchMaxAgeMinutes") or _defaultPrefetchMaxAgeMinutes
+
+    def GetProfiling(self) -> bool:
+        """Profile every import and sync, see Profiler"""
+        return bool(self.config.get("profiling"))
+
+    def GetOrphanAction(self) -> str:
+        """What Sync from Lingq does with notes whose lingq was deleted: tag, suspend or delete"""
+        return self.config.get("orphanAction") or "tag"
+
+    def SetOrphanAction(self, set_to: str):
+        self._SetConfig("orphanAction", set_to)
+
+    def GetDuplicateTerms(self) -> str:
+        """What imports do with a lingq whose term, ignoring case and unicode form, already
+        has a note: skip it, merge its translations into that note, or keep it as a note
+        of its own
+        """
+        return self.config.get("duplicateTerms") or "skip"
+
+    def SetDuplicateTerms(self, set_to: str):
+        self._SetConfig("duplicateTerms", set_to)
+
+    def GetNewCardOrder(self) -> str:
+        """How imports order the new cards of the deck: frequency, importance, or "" to
+        leave new lingqs due today in the order they were added
+        """
+        return self.config.get("newCardOrder") or ""
+
+    def SetNewCardOrder(self, set_to: str):
+        self._SetConfig("newCardOrder", set_to)
+
+    def GetImportFilter(self) -> ImportFilter:
+        """Which lingqs imports bring in, everything by default"""
+        return ImportFilter(**(self.config.get("importFilter") or {}))
+
+    def SetImportFilter(self, set_to: ImportFilter):
+        self._SetConfig("importFilter", None if set_to.IsEmpty() else asdict(set_to))
+
+    def GetRateLimitModel(self) -> RateLimitModel:
+        return RateLimitModel(**(self.config.get("rateLimitModel") or {}))
+
+    def SetRateLimitModel(self, set_to: RateLimitModel):
+        self._SetConfig("rateLimitModel", asdict(set_to))
+
+    def GetPageSizeModel(self, languageCode: str) -> PageSizeModel:
+        """The page size list requests of the language settled on last time"""
+        return PageSizeModel(**(self.config.get("pageSizeModels") or {}).get(languageCode, {}))
+
+    def SetPageSizeModel(self, languageCode: str, set_to: PageSizeModel):
+        pageSizeModels = dict(self.config.get("pageSizeModels") or {})
+        pageSizeModels[languageCode] = asdict(set_to)
+        self._SetConfig("pageSizeModels", pageSizeModels)
+
     def GetLevelToInterval(self) -> Dict[str, int]:
         # Using a default anki ease factor of 2.5, this should make it so
         # that you need to complete two reviews of a card before it updates in
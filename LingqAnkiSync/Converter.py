@@ -1,5 +1,6 @@
 import random
-from typing import List, Dict, Tuple
+import unicodedata
+from typing import List, Dict, Optional, Tuple
 from .Models.Lingq import Lingq
 from .Models.AnkiCard import AnkiCard
 
@@ -26,6 +27,34 @@ def AnkiCardsToLingqs(
     return lingqs
 
 
+def ApiCardToLingq(card: Dict) -> Optional[Lingq]:
+    """:returns the lingq of a card from the LingQ API, or None when it has no
+    translations to put on the back of a note
+    """
+    translations = [hint["text"] for hint in card["hints"]]
+    if not translations:
+        return None
+
+    return Lingq(
+        int(card["pk"]),
+        card["term"],
+        translations,
+        card["status"],
+        card["extended_status"],
+        card["tags"],
+        card["fragment"],
+        card["importance"],
+        max((hint["popularity"] for hint in card["hints"]), default=0),
+    )
+
+
+def NormalizeTerm(term: str) -> str:
+    """The form two terms share when they are the same word, whatever their case or
+    unicode composition
+    """
+    return unicodedata.normalize("NFC", term.strip()).casefold()
+
+
 def LingqsToAnkiCards(lingqs: List[Lingq], levelToInterval: Dict[str, int]) -> List[AnkiCard]:
     ankiCards = []
     for lingq in lingqs:
@@ -55,6 +84,11 @@ def _LingqStatusToInterval(
     status: int, extendedStatus: int, levelToInterval: Dict[str, int]
 ) -> int:
     level = LingqStatusToLevel(status, extendedStatus)
+    intervalRange = LevelToIntervalRange(level, levelToInterval)
+    return random.randint(intervalRange[0], intervalRange[1]) # nosec
+
+
+def LevelToIntervalRange(level: str, levelToInterval: Dict[str, int]) -> Tuple[int, int]:
     intervalRange = (0, 0)
 
     if level == Lingq.LEVEL_1:
@@ -69,7 +103,7 @@ def _LingqStatusToInterval(
         # If a card is known, how long should the range be? Double?
         intervalRange = (levelToInterval[level], levelToInterval[level] * 2)
 
-    return random.randint(intervalRange[0], intervalRange[1]) # nosec
+    return intervalRange
 
 
 def _IntervalToLingqStatus(interval: int, levelToInterval: Dict[str, int]) -> Tuple[int, int]:
@@ -1,33 +1,183 @@
 import requests
 import time
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 from .Models.Lingq import Lingq
+from .Models.HttpStats import HttpStats
+from .Models.ImportFilter import ImportFilter
+from .Models.PageSizeModel import PageSizeModel
+from .RateLimiter import RateLimiter
 from . import Converter
 
 
+class SyncInterrupted(Exception):
+    """Raised inside a rate limit wait, or between pages of a status scan, when the
+    running sync has been told to stop"""
+
+
+DEFAULT_BASE_URL = "https://www.lingq.com"
+
+# A page larger than this is cut down for the next ones, it risks timing out
+_maxPageBytes = 4 * 2**20
+
+
 class LingqApi:
-    def __init__(self, apiKey: str, languageCode: str):
+    def __init__(
+        self,
+        apiKey: str,
+        languageCode: str,
+        baseUrl: str = DEFAULT_BASE_URL,
+        session: Optional[requests.Session] = None,
+        rateLimiter: Optional[RateLimiter] = None,
+        pageSizeModel: Optional[PageSizeModel] = None,
+    ):
+        """
+        Args:
+            session: Pooled connections to reuse, e.g. shared by the LingqApis of several
+                languages. Without one every request opens its own connection
+            rateLimiter: Paces requests together with the other LingqApis sharing it
+            pageSizeModel: The page size learned for the language by earlier runs, it is
+                adapted as the pages come in
+        """
         self.apiKey = apiKey
         self.languageCode = languageCode
-        self._baseUrl = f"https://www.lingq.com/api/v3/{languageCode}/cards"
+        self._baseUrl = f"{baseUrl.rstrip('/')}/api/v3/{languageCode}/cards"
+        # Seconds to wait on a connection before giving up, so a hung request can't stall a run
+        self.timeout = 60
         self.unformattedLingqs = []
         self.lingqs = []
         self.rateLimitCallback = None
+        self.shouldStop = None
+        self.httpStats = HttpStats()
+        self.syncedLingqs = []
+        self.session = session
+        self.rateLimiter = rateLimiter
+        self.pageSizeModel = pageSizeModel or PageSizeModel()
+
+    @property
+    def _http(self):
+        return self.session if self.session is not None else requests
 
-    def GetLingqs(self, includeKnowns: bool) -> List[Lingq]:
-        nextUrl = f"{self._baseUrl}?page=1&page_size=200"
-        if not includeKnowns:
-            nextUrl += "&status=0&status=1&status=2&status=3"
+    @property
+    def requestCount(self) -> int:
+        return self.httpStats.requestCount
 
-        while nextUrl is not None:
-            wordsResponse = self._GetSinglePage(nextUrl)
-            words = wordsResponse.json()["results"]
-            self.unformattedLingqs.extend(words)
-            nextUrl = wordsResponse.json()["next"]
+    def GetLingqs(
+        self, includeKnowns: bool, progressCallback=None, importFilter: Optional[ImportFilter] = None
+    ) -> List[Lingq]:
+        for cards in self.GetCardPages(includeKnowns, progressCallback, importFilter):
+            self.unformattedLingqs.extend(cards)
 
         self._ConvertApiToLingqs()
         return self.lingqs
 
+    def GetCardPages(
+        self, includeKnowns: bool, progressCallback=None, importFilter: Optional[ImportFilter] = None
+    ) -> Iterator[List[Dict]]:
+        """Stream the cards of the language as the API returns them, a page at a time.
+        Cards the importFilter rejects are left out of the pages, and so are known
+        cards unless includeKnowns, even when the importFilter's levels ask for them
+        """
+        if importFilter and not includeKnowns:
+            importFilter = importFilter.WithoutKnowns()
+            if importFilter is None:
+                return
+
+        query = ""
+        filterParams = importFilter.QueryParams() if importFilter else []
+        if filterParams:
+            query = "".join(f"&{key}={value}" for key, value in filterParams)
+        elif not includeKnowns:
+            query = "&status=0&status=1&status=2&status=3"
+
+        fetchedCount = 0
+        if progressCallback:
+            self.rateLimitCallback = lambda secondsRemaining: progressCallback(
+                fetchedCount, 0, "", secondsRemaining, phase="Fetching"
+            )
+        try:
+            for page in self._GetAllPages(query):
+                fetchedCount += len(page["results"])
+                if progressCallback:
+                    progressCallback(fetchedCount, page["count"], phase="Fetching")
+                if importFilter:
+                    yield [card for card in page["results"] if importFilter.Matches(card)]
+                else:
+                    yield page["results"]
+        finally:
+            self.rateLimitCallback = None
+
+    def GetLingqStatuses(self, shouldStop=None) -> Dict[int, Tuple[int, int]]:
+        """Fetch the status of every lingq in the language in one paginated scan,
+        raising SyncInterrupted before the next page once shouldStop() is true
+
+        :returns a mapping of lingq primary key to (status, extended_status)
+        """
+        statuses = {}
+        for page in self._GetAllPages():
+            for word in page["results"]:
+                statuses[int(word["pk"])] = (word["status"], word["extended_status"] or 0)
+            if page["next"] is not None and shouldStop and shouldStop():
+                raise SyncInterrupted()
+        return statuses
+
+    def GetCardCount(self) -> int:
+        """Ask for a single card, a cheap check that the API key and language code work
+
+        :returns the number of lingqs in the language
+        """
+        return self._GetSinglePage(f"{self._baseUrl}?page=1&page_size=1").json()["count"]
+
+    def _GetAllPages(self, query: str = ""):
+        """Yield every page of the card list, adapting pageSizeModel as they come in:
+        quick full pages grow the pages, timeouts, server errors and oversized
+        responses shrink them, and the API's own limit is learned when it cuts a page
+        short
+
+        :param query: Extra query parameters, starting with &
+        """
+        model = self.pageSizeModel
+        cardsRead = 0
+        # The size of the last full page, a size known to line up with cardsRead
+        acceptedSize = model.pageSize
+        # Sizes at or above this failed in this scan, they aren't tried again
+        ceiling = None
+        while True:
+            pageSize = model.pageSize
+            url = f"{self._baseUrl}?page={cardsRead // pageSize + 1}&page_size={pageSize}{query}"
+            startTime = time.monotonic()
+            try:
+                response = self._GetSinglePage(url)
+            except requests.RequestException as e:
+                if not _IsPageSizeError(e) or not model.Shrink():
+                    raise
+                ceiling = pageSize
+                continue
+            seconds = time.monotonic() - startTime
+            page = response.json()
+            results = page["results"]
+
+            if page["next"] is not None and len(results) < pageSize:
+                # The API cut the page down to its limit and numbers its pages by it
+                model.maxPageSize = len(results)
+                if cardsRead > 0:
+                    # This page didn't start at cardsRead, ask again in sizes that line up
+                    model.pageSize = (
+                        len(results) if cardsRead % len(results) == 0 else acceptedSize
+                    )
+                    continue
+                model.pageSize = len(results)
+
+            yield page
+            cardsRead += len(results)
+            if page["next"] is None:
+                return
+
+            acceptedSize = model.pageSize
+            if len(response.content) > _maxPageBytes:
+                model.Shrink()
+            elif seconds < self.timeout / 4:
+                model.Grow(cardsRead, ceiling)
+
     def WithRetry(self, requestsFunc, **kwargs):
         """
         Execute a request with retry logic for 429 responses
@@ -38,76 +188,119 @@ class LingqApi:
         """
         try:
             response = None
-            response = requestsFunc(**kwargs)
+            response = self._TimedRequest(requestsFunc, **kwargs)
             response.raise_for_status()
         except Exception as e:
             if response is not None and response.status_code == 429:
+                self.httpStats.rateLimited += 1
                 sleepTime = int(response.headers["Retry-After"]) + 3  # A little buffer
+                if self.rateLimiter:
+                    self.rateLimiter.BackOff(sleepTime)
 
-                if self.rateLimitCallback:
+                if self.rateLimitCallback or self.shouldStop:
                     for secondsRemaining in range(sleepTime, 0, -1):
-                        self.rateLimitCallback(secondsRemaining)
+                        if self.shouldStop and self.shouldStop(self.requestCount):
+                            raise SyncInterrupted()
+                        if self.rateLimitCallback:
+                            self.rateLimitCallback(secondsRemaining)
                         time.sleep(1)
+                        self.httpStats.sleepSeconds += 1
                 else:
                     time.sleep(sleepTime)
+                    self.httpStats.sleepSeconds += sleepTime
 
                 # Retry the request
-                response = requestsFunc(**kwargs)
+                self.httpStats.retries += 1
+                response = self._TimedRequest(requestsFunc, **kwargs)
                 response.raise_for_status()
             else:
                 raise e
 
         return response
 
+    def _TimedRequest(self, requestsFunc, **kwargs):
+        if self.rateLimiter:
+            self.httpStats.sleepSeconds += self.rateLimiter.Acquire()
+
+        startTime = time.monotonic()
+        response = None
+        try:
+            response = requestsFunc(**kwargs)
+            return response
+        finally:
+            self.httpStats.AddRequest(
+                _Verb(requestsFunc),
+                time.monotonic() - startTime,
+                len(response.content) if response is not None else 0,
+            )
+
     def _GetSinglePage(self, url):
         headers = {"Authorization": f"Token {self.apiKey}"}
-        wordsResponse = self.WithRetry(requests.get, url=url, headers=headers)
+        wordsResponse = self.WithRetry(
+            self._http.get, url=url, headers=headers, timeout=self.timeout
+        )
 
         return wordsResponse
 
     def _ConvertApiToLingqs(self) -> None:
         for lingq in self.unformattedLingqs:
-            translations = [hint["text"] for hint in lingq["hints"]]
-            popularity = max((hint["popularity"] for hint in lingq["hints"]), default=0)
-            if len(translations) > 0:
-                self.lingqs.append(
-                    Lingq(
-                        int(lingq["pk"]),
-                        lingq["term"],
-                        translations,
-                        lingq["status"],
-                        lingq["extended_status"],
-                        lingq["tags"],
-                        lingq["fragment"],
-                        lingq["importance"],
-                        popularity,
-                    )
-                )
+            converted = Converter.ApiCardToLingq(lingq)
+            if converted is not None:
+                self.lingqs.append(converted)
 
-    def SyncStatusesToLingq(self, lingqs: List[Lingq], progressCallback=None) -> int:
+    def SyncStatusesToLingq(
+        self,
+        lingqs: List[Lingq],
+        progressCallback=None,
+        shouldStop=None,
+        remoteStatuses: Optional[Dict[int, Tuple[int, int]]] = None,
+    ) -> int:
+        """Push statuses to lingq in order until done or shouldStop(requestCount) is true.
+        remoteStatuses, from GetLingqStatuses, saves asking for the current level of
+        each lingq before patching it
+
+        The lingqs that were processed before stopping are kept in self.syncedLingqs
+        """
         successfulUpdates = 0
         totalLingqs = len(lingqs)
+        self.shouldStop = shouldStop
+        self.syncedLingqs = []
 
         for i, lingq in enumerate(lingqs):
-            # Create a wrapper callback for WithRetry to pass to the rate limiting info
-            self.rateLimitCallback = lambda secondsRemaining: (
-                progressCallback(i, totalLingqs, lingq.word, secondsRemaining)
+            if shouldStop and shouldStop(self.requestCount):
+                break
+
+            # Create a wrapper callback for WithRetry to pass to the rate limiting info.
+            # Bind the loop variables now, the callback may outlive this iteration
+            self.rateLimitCallback = lambda secondsRemaining, i=i, word=lingq.word: (
+                progressCallback(i, totalLingqs, word, secondsRemaining)
                 if progressCallback
                 else None
             )
 
-            if self._ShouldUpdate(lingq):
-                headers = {"Authorization": f"Token {self.apiKey}"}
-                url = f"{self._baseUrl}/{lingq.primaryKey}/"
-                data = {"status": lingq.status, "extended_status": lingq.extendedStatus}
+            try:
+                if self._ShouldUpdate(lingq, remoteStatuses):
+                    headers = {"Authorization": f"Token {self.apiKey}"}
+                    url = f"{self._baseUrl}/{lingq.primaryKey}/"
+                    data = {"status": lingq.status, "extended_status": lingq.extendedStatus}
 
-                self.WithRetry(requests.patch, url=url, headers=headers, data=data)
-                successfulUpdates += 1
+                    self.WithRetry(
+                        self._http.patch,
+                        url=url,
+                        headers=headers,
+                        data=data,
+                        timeout=self.timeout,
+                    )
+                    successfulUpdates += 1
+            except SyncInterrupted:
+                break
 
+            self.syncedLingqs.append(lingq)
             if progressCallback:
                 progressCallback(i + 1, totalLingqs, lingq.word)
 
         self.rateLimitCallback = None
+        self.shouldStop = None
         return successfulUpdates
 
     def _GetLevel(self, lingqPk):
@@ -118,9 +311,27 @@ class LingqApi:
 
         return Converter.LingqStatusToLevel(status, extendedStatus)
 
-    def _ShouldUpdate(self, lingq) -> bool:
+    def _ShouldUpdate(self, lingq, remoteStatuses=None) -> bool:
         currentLevel = Converter.LingqStatusToLevel(
             lingq.status, lingq.extendedStatus
         )
-        lingqApiLevel = self._GetLevel(lingq.primaryKey)
+        if remoteStatuses is not None and lingq.primaryKey in remoteStatuses:
+            lingqApiLevel = Converter.LingqStatusToLevel(*remoteStatuses[lingq.primaryKey])
+        else:
+            lingqApiLevel = self._GetLevel(lingq.primaryKey)
         return lingqApiLevel != currentLevel
+
+
+def _IsPageSizeError(exception: requests.RequestException) -> bool:
+    """Whether a smaller page might succeed where this request failed"""
+    if isinstance(exception, requests.Timeout):
+        return True
+    response = exception.response
+    return response is not None and (response.status_code >= 500 or response.status_code == 413)
+
+
+def _Verb(requestsFunc) -> str:
+    for verb in ("get", "patch", "post"):
+        if requestsFunc is getattr(requests, verb):
+            return verb.upper()
+    return getattr(requestsFunc, "__name__", "request").upper()
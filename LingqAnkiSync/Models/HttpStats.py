@@ -0,0 +1,59 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class HttpStats:
+    requestsByVerb: Dict[str, int] = field(default_factory=dict)
+    rateLimited: int = 0  # 429 responses
+    retries: int = 0
+    requestSeconds: float = 0.0
+    sleepSeconds: float = 0.0  # Spent waiting out rate limits
+    bytesReceived: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    @property
+    def requestCount(self) -> int:
+        return sum(self.requestsByVerb.values())
+
+    def AddRequest(self, verb: str, seconds: float, bytesReceived: int):
+        self.requestsByVerb[verb] = self.requestsByVerb.get(verb, 0) + 1
+        self.requestSeconds += seconds
+        self.bytesReceived += bytesReceived
+        self.latencies.append(seconds)
+
+    def Add(self, other: "HttpStats"):
+        """Count the requests of other, e.g. another LingqApi of the same run, as well"""
+        for verb, count in other.requestsByVerb.items():
+            self.requestsByVerb[verb] = self.requestsByVerb.get(verb, 0) + count
+        self.rateLimited += other.rateLimited
+        self.retries += other.retries
+        self.requestSeconds += other.requestSeconds
+        self.sleepSeconds += other.sleepSeconds
+        self.bytesReceived += other.bytesReceived
+        self.latencies.extend(other.latencies)
+
+    def LatencyPercentiles(self) -> Dict[str, float]:
+        if not self.latencies:
+            return {}
+
+        ordered = sorted(self.latencies)
+        percentiles = {
+            f"p{percentile}": ordered[min(len(ordered) * percentile // 100, len(ordered) - 1)]
+            for percentile in (50, 90, 99)
+        }
+        percentiles["max"] = ordered[-1]
+        return percentiles
+
+    def ToDict(self) -> Dict:
+        return {
+            "requestsByVerb": self.requestsByVerb,
+            "rateLimited": self.rateLimited,
+            "retries": self.retries,
+            "requestSeconds": round(self.requestSeconds, 3),
+            "sleepSeconds": round(self.sleepSeconds, 3),
+            "bytesReceived": self.bytesReceived,
+            "latencySeconds": {
+                name: round(seconds, 4) for name, seconds in self.LatencyPercentiles().items()
+            },
+        }
@@ -0,0 +1,68 @@
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from .Lingq import Lingq
+from ..Converter import LevelToLingqStatus, LingqStatusToLevel
+
+
+@dataclass
+class ImportFilter:
+    """Which lingqs an import brings in. Empty lists and None values don't filter.
+
+    The levels are sent to LingQ as status query parameters, so only cards of those
+    statuses are downloaded. The API has no parameters for the rest, which is checked
+    on each card as the pages stream in, before it is converted.
+    """
+
+    minImportance: int = 0
+    includeTags: List[str] = field(default_factory=list)  # Cards with any of these tags
+    excludeTags: List[str] = field(default_factory=list)
+    levels: List[str] = field(default_factory=list)
+    minPrimaryKey: Optional[int] = None
+    maxPrimaryKey: Optional[int] = None
+
+    def __post_init__(self):
+        unknownLevels = [level for level in self.levels if level not in Lingq.LEVELS]
+        if unknownLevels:
+            raise ValueError(
+                f"No such levels {', '.join(unknownLevels)}. Should be some of {Lingq.LEVELS}"
+            )
+
+    def IsEmpty(self) -> bool:
+        return self == ImportFilter()
+
+    def WithoutKnowns(self) -> Optional["ImportFilter"]:
+        """The filter for an import that leaves out known lingqs, whatever its levels
+
+        :returns None when known was its only level, so it can't match anything
+        """
+        if not self.levels:
+            return self
+        levels = [level for level in self.levels if level != Lingq.LEVEL_KNOWN]
+        return replace(self, levels=levels) if levels else None
+
+    def QueryParams(self) -> List[Tuple[str, str]]:
+        statuses = sorted({LevelToLingqStatus(level)[0] for level in self.levels})
+        return [("status", str(status)) for status in statuses]
+
+    def Matches(self, card: Dict) -> bool:
+        """:param card: A card as returned by the LingQ API"""
+        if (card.get("importance") or 0) < self.minImportance:
+            return False
+        if self.minPrimaryKey is not None and card["pk"] < self.minPrimaryKey:
+            return False
+        if self.maxPrimaryKey is not None and card["pk"] > self.maxPrimaryKey:
+            return False
+
+        tags = card.get("tags") or []
+        if self.includeTags and not any(tag in tags for tag in self.includeTags):
+            return False
+        if any(tag in tags for tag in self.excludeTags):
+            return False
+
+        # Learned and known share status 3, the query can't tell them apart
+        level = LingqStatusToLevel(card["status"], card["extended_status"])
+        if self.levels and level not in self.levels:
+            return False
+        return True
+
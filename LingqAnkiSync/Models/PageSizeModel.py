@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class PageSizeModel:
+    """How many cards a language's list requests ask LingQ for per page, learned from
+    past requests. Fewer, larger pages use less of the rate limit for the same cards.
+
+    Pages are requested by number, so a new size only takes effect where the cards
+    read so far fill whole pages of it.
+    """
+
+    MIN_PAGE_SIZE = 25
+    MAX_PAGE_SIZE = 1000
+
+    pageSize: int = 200
+    maxPageSize: Optional[int] = None  # The most cards the API returns in a page, once seen
+
+    def Grow(self, cardsRead: int, ceiling: Optional[int] = None):
+        """Double the page size after a full page that came back quickly, up to what the
+        API allows and below ceiling
+        """
+        larger = min(self.pageSize * 2, self.maxPageSize or self.MAX_PAGE_SIZE)
+        if ceiling is not None:
+            larger = min(larger, ceiling - 1)
+        if larger > self.pageSize and cardsRead % larger == 0:
+            self.pageSize = larger
+
+    def Shrink(self) -> bool:
+        """Divide the page size by its smallest factor, so pages of the old size still
+        line up with the new one
+
+        :returns False when the pages are as small as they get
+        """
+        for factor in range(2, self.pageSize + 1):
+            if self.pageSize % factor == 0:
+                if self.pageSize // factor < self.MIN_PAGE_SIZE:
+                    return False
+                self.pageSize //= factor
+                return True
+        return False
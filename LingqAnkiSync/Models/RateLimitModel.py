@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class RateLimitModel:
+    """What a LingQ request has cost on average in past runs, including rate limit waits"""
+
+    # Weight of the newest run when blending it into the averages
+    SMOOTHING = 0.3
+
+    secondsPerRequest: float = 0.5
+    throttleSecondsPerRequest: float = 0.0
+    observedRequests: int = 0
+
+    def Observe(self, requestCount: int, requestSeconds: float, throttleSeconds: float):
+        if requestCount <= 0:
+            return
+
+        weight = 1.0 if self.observedRequests == 0 else self.SMOOTHING
+        self.secondsPerRequest += weight * (requestSeconds / requestCount - self.secondsPerRequest)
+        self.throttleSecondsPerRequest += weight * (
+            throttleSeconds / requestCount - self.throttleSecondsPerRequest
+        )
+        self.observedRequests += requestCount
+
+    def EstimateSeconds(self, requestCount: int) -> float:
+        return requestCount * (self.secondsPerRequest + self.throttleSecondsPerRequest)
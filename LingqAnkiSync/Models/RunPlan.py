@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class RunPlan:
+    """What an import or sync would do, built without writing anything"""
+
+    notesToCreate: int = 0
+    upgrades: int = 0
+    downgrades: int = 0
+    ignored: int = 0
+    getRequests: int = 0
+    patchRequests: int = 0  # Upper bound, lingqs already at the right level are skipped
+    estimatedSeconds: float = 0.0
@@ -0,0 +1,59 @@
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict
+from .HttpStats import HttpStats
+
+
+@dataclass
+class RunReport:
+    """Where an import or sync spent its time, what it did and how it talked to LingQ"""
+
+    operation: str
+    languageCode: str
+    deckName: str
+    startedAt: float = field(default_factory=time.time)
+    counts: Dict[str, int] = field(default_factory=dict)
+    phaseSeconds: Dict[str, float] = field(default_factory=dict)
+    http: HttpStats = field(default_factory=HttpStats)
+
+    @contextmanager
+    def Phase(self, name: str):
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phaseSeconds[name] = (
+                self.phaseSeconds.get(name, 0.0) + time.perf_counter() - startTime
+            )
+
+    def ToJson(self) -> str:
+        return json.dumps(
+            {
+                "operation": self.operation,
+                "languageCode": self.languageCode,
+                "deckName": self.deckName,
+                "startedAt": self.startedAt,
+                "counts": self.counts,
+                "phaseSeconds": {name: round(s, 3) for name, s in self.phaseSeconds.items()},
+                "http": self.http.ToDict(),
+            }
+        )
+
+    def Summary(self) -> str:
+        lines = ["Time spent:"]
+        lines += [f"  {name}: {seconds:.1f}s" for name, seconds in self.phaseSeconds.items()]
+
+        if self.http.requestCount:
+            verbs = ", ".join(f"{count} {verb}" for verb, count in self.http.requestsByVerb.items())
+            lines.append(f"LingQ requests: {verbs}")
+            percentiles = self.http.LatencyPercentiles()
+            lines.append(
+                f"  latency p50 {percentiles['p50'] * 1000:.0f}ms, p90 {percentiles['p90'] * 1000:.0f}ms"
+            )
+            if self.http.rateLimited:
+                lines.append(
+                    f"  rate limited {self.http.rateLimited} times, waited {self.http.sleepSeconds:.0f}s"
+                )
+        return "\n".join(lines)
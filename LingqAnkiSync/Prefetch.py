@@ -0,0 +1,111 @@
+import threading
+from contextlib import contextmanager
+
+# Leave anki's own startup work, like syncing with AnkiWeb, to finish first
+_startDelaySeconds = 60
+
+
+class PrefetchCancelled(Exception):
+    """Raised between pages when the prefetch has been told to stop"""
+
+
+class IdleGate:
+    """Counts the runs the user started that are in progress. Background work waits
+    for them to finish before its next request
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._running = 0
+
+    @contextmanager
+    def UserAction(self):
+        with self._condition:
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._condition.notify_all()
+
+    def WaitForIdle(self, stopEvent: threading.Event):
+        with self._condition:
+            while self._running and not stopEvent.is_set():
+                self._condition.wait(timeout=1)
+
+
+# Shared by the dialog's runs and the prefetch
+userActions = IdleGate()
+
+
+class Prefetcher:
+    """Keeps a warm copy of every configured language's LingQ cards while anki is open,
+    see ActionHandler.PrefetchLingqs.
+
+    The first prefetch starts a while after the profile opened and then again every
+    intervalSeconds, on a timer thread. It never touches the collection, paces its
+    requests with the rest of the account's, and holds off while the user runs an
+    import or sync.
+    """
+
+    def __init__(
+        self,
+        actionHandler,
+        intervalSeconds: float,
+        idleGate: IdleGate = userActions,
+        timerFactory=threading.Timer,
+        startDelaySeconds: float = _startDelaySeconds,
+    ):
+        self.actionHandler = actionHandler
+        self.intervalSeconds = intervalSeconds
+        self.startDelaySeconds = startDelaySeconds
+        self._idleGate = idleGate
+        self._timerFactory = timerFactory
+        self._stop = threading.Event()
+        self._timer = None
+
+    def Start(self):
+        self._Schedule(self.startDelaySeconds)
+
+    def Cancel(self):
+        """Stop, e.g. when the profile closes. A prefetch in progress stops before its
+        next request and leaves the previous copy in place
+        """
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def Run(self):
+        for languageCode in self.actionHandler.config.GetLanguageDecks():
+            if self._stop.is_set():
+                return
+            try:
+                self.actionHandler.PrefetchLingqs(languageCode, self._WaitForIdle)
+            except PrefetchCancelled:
+                return
+            except Exception:
+                # e.g. offline, imports and syncs then fetch from LingQ as usual
+                continue
+        if not self._stop.is_set():
+            self._Schedule(self.intervalSeconds)
+
+    def _WaitForIdle(self):
+        self._idleGate.WaitForIdle(self._stop)
+        if self._stop.is_set():
+            raise PrefetchCancelled()
+
+    def _Schedule(self, seconds: float):
+        self._timer = self._timerFactory(seconds, self.Run)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+def CreateForAnki() -> Prefetcher:
+    from aqt import mw
+    from .UIActionHandler import ActionHandler
+
+    actionHandler = ActionHandler(mw.addonManager)
+    # Refreshed well before the copy gets too old to be used
+    return Prefetcher(actionHandler, actionHandler.config.GetPrefetchMaxAgeMinutes() * 60 / 2)
@@ -0,0 +1,119 @@
+import cProfile
+import functools
+import itertools
+import os
+import threading
+import time
+import tracemalloc
+from . import UserFiles
+
+# Set to 1 to profile every run, whatever the "profiling" config value says
+PROFILING_ENV_VAR = "LINGQ_ANKI_SYNC_PROFILE"
+
+_profilesFolder = "profiles"
+_topAllocations = 25
+
+# Runs can overlap, e.g. a prefetch or an auto sync during a run of the dialog. The
+# first of them starts tracemalloc and the last one to finish stops it
+_tracingLock = threading.Lock()
+_tracingRuns = 0
+_startedTracing = False
+# Tells apart the files of runs started in the same second
+_runNumbers = itertools.count(1)
+
+
+def IsEnabled(config) -> bool:
+    return os.environ.get(PROFILING_ENV_VAR, "") not in ("", "0") or config.GetProfiling()
+
+
+def Profiled(func):
+    """Profile an ActionHandler entry point when profiling is enabled.
+
+    Each run writes a cProfile .prof file, viewable with snakeviz or pstats, and a
+    text file of the lines that allocated the most memory, to user_files/profiles.
+    With profiling off the method is called as is.
+
+    Only the thread that called the entry point is in the .prof file, not the worker
+    threads it starts, e.g. for fetching. The allocations and the peak memory are of
+    the whole process, including other runs at the same time. Profiling never fails
+    the run, a profile that can't be taken or written is left out.
+    """
+
+    @functools.wraps(func)
+    def Wrapper(self, *args, **kwargs):
+        if not IsEnabled(self.config):
+            return func(self, *args, **kwargs)
+
+        with RunProfiler(func.__name__):
+            return func(self, *args, **kwargs)
+
+    return Wrapper
+
+
+class RunProfiler:
+    def __init__(self, name: str):
+        self.name = name
+        self.profile = cProfile.Profile()
+        self._profiling = False
+        self._tracing = False
+
+    def __enter__(self):
+        try:
+            _StartTracing()
+            self._tracing = True
+            self.profile.enable()
+            self._profiling = True
+        except Exception:
+            # e.g. another profiler is active, the run goes ahead without
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._WriteProfile()
+        except Exception:
+            pass
+        return False
+
+    def _WriteProfile(self):
+        if self._profiling:
+            self.profile.disable()
+        if not self._tracing:
+            return
+        snapshot, peakBytes = _StopTracing()
+
+        fileStem = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{next(_runNumbers)}_{self.name}"
+        )
+        if self._profiling:
+            self.profile.dump_stats(UserFiles.GetPath(_profilesFolder, f"{fileStem}.prof"))
+        with open(
+            UserFiles.GetPath(_profilesFolder, f"{fileStem}_allocations.txt"), "w", encoding="utf-8"
+        ) as f:
+            f.write(f"Peak traced memory: {peakBytes / 2**20:.1f} MiB\n")
+            f.write(f"Top {_topAllocations} allocations by line:\n")
+            for stat in snapshot.statistics("lineno")[:_topAllocations]:
+                f.write(f"{stat}\n")
+
+
+def _StartTracing():
+    global _tracingRuns, _startedTracing
+    with _tracingLock:
+        # tracemalloc may already be running, e.g. under pytest -X tracemalloc
+        if _tracingRuns == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _startedTracing = True
+        _tracingRuns += 1
+
+
+def _StopTracing():
+    """:returns the allocations so far and the peak traced bytes"""
+    global _tracingRuns, _startedTracing
+    with _tracingLock:
+        try:
+            return tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1]
+        finally:
+            _tracingRuns -= 1
+            if _tracingRuns == 0 and _startedTracing:
+                tracemalloc.stop()
+                _startedTracing = False
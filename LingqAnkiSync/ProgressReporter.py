@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+
+class ProgressReporter:
+    """Progress callback for background operations that only records the latest state.
+
+    The background thread can call it as often as it likes; the main thread samples
+    it at a fixed rate with GetLabel/GetValues, so the Qt event queue never receives
+    more than one label rebuild per tick.
+    """
+
+    def __init__(self, phase: str, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._phase = phase
+        self._phaseStartedAt = clock()
+        self._current = 0
+        self._total = 0
+        self._word = ""
+        self._rateLimitedUntil = None
+
+    def __call__(
+        self,
+        current: int,
+        total: int,
+        word: str = "",
+        rateLimitSeconds: Optional[int] = None,
+        phase: Optional[str] = None,
+    ):
+        """Same signature as the progressCallback used by LingqApi and AnkiHandler"""
+        with self._lock:
+            if phase is not None and phase != self._phase:
+                self._phase = phase
+                self._phaseStartedAt = self._clock()
+
+            self._current = current
+            self._total = total
+            self._word = word
+            if rateLimitSeconds:
+                self._rateLimitedUntil = self._clock() + rateLimitSeconds
+            else:
+                self._rateLimitedUntil = None
+
+    def GetValues(self) -> Tuple[int, int]:
+        with self._lock:
+            return self._current, self._total
+
+    def GetLabel(self) -> str:
+        with self._lock:
+            now = self._clock()
+            label = f"{self._phase} {self._current}"
+            if self._total:
+                label += f"/{self._total}"
+            if self._word:
+                label += f' - "{self._word}"'
+
+            elapsed = now - self._phaseStartedAt
+            if self._current > 0 and self._total and elapsed > 0:
+                throughput = self._current / elapsed
+                remaining = max(self._total - self._current, 0) / throughput
+                label += f"<br>{throughput:.1f}/s, about {_FormatDuration(remaining)} remaining"
+
+            if self._rateLimitedUntil is not None and self._rateLimitedUntil > now:
+                secondsRemaining = int(self._rateLimitedUntil - now + 0.5)
+                label += (
+                    '<br><span style="font-weight: bold;">'
+                    f"⚠️ LingQ API rate limit - waiting {secondsRemaining} seconds</span>"
+                )
+
+            return label
+
+
+def _FormatDuration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {seconds}s"
+    return f"{seconds}s"
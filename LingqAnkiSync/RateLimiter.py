@@ -0,0 +1,164 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RateLimiter:
+    """Paces the requests of every LingqApi that shares it, across threads.
+
+    Requests are spaced at least minIntervalSeconds apart, and once any of them is
+    rate limited all of them hold off until its Retry-After has passed, instead of
+    each one running into the limit on its own.
+    """
+
+    def __init__(self, minIntervalSeconds: float = 0.0, clock=time.monotonic, sleep=time.sleep):
+        self.minIntervalSeconds = minIntervalSeconds
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._nextRequestAt = 0.0
+        self._pausedUntil = 0.0
+
+    def Acquire(self) -> float:
+        """Wait for this request's turn
+
+        :returns the seconds waited
+        """
+        with self._lock:
+            now = self._clock()
+            requestAt = max(now, self._nextRequestAt, self._pausedUntil)
+            self._nextRequestAt = requestAt + self.minIntervalSeconds
+
+        waitSeconds = requestAt - now
+        if waitSeconds > 0:
+            self._sleep(waitSeconds)
+        return waitSeconds
+
+    def BackOff(self, seconds: float):
+        """Hold off every request for the given seconds from now"""
+        with self._lock:
+            self._pausedUntil = max(self._pausedUntil, self._clock() + seconds)
+
+
+class SharedRateLimiter:
+    """A RateLimiter whose pacing is kept in a SQLite file, so every LingqApi of the same
+    LingQ account shares it, across threads, anki profiles and command line processes.
+
+    The spacing between requests is learned: each rate limited request doubles it and
+    every request granted after that shrinks it by a percent, so the requests of all
+    processes together settle just under what LingQ allows.
+
+    When the file can't be used, e.g. it stays locked or the disk fails, requests are
+    paced within this process only until it can again.
+    """
+
+    # Bounds of the learned spacing between requests, below a tenth of the minimum
+    # it has worn off
+    MIN_LEARNED_INTERVAL = 0.25
+    MAX_LEARNED_INTERVAL = 5.0
+    # Share of the learned spacing given back with each granted request
+    INTERVAL_DECAY = 0.01
+
+    def __init__(
+        self,
+        path: str,
+        apiKey: str,
+        minIntervalSeconds: float = 0.0,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        """
+        Args:
+            path: SQLite file shared by the processes
+            apiKey: Identifies the account, only its hash is stored
+            clock: Wall clock time, which unlike time.monotonic means the same in
+                every process
+        """
+        self.minIntervalSeconds = minIntervalSeconds
+        self._account = hashlib.sha256(apiKey.encode("utf-8")).hexdigest()[:16]
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._fallback = RateLimiter(minIntervalSeconds, clock, sleep)
+        # Waits up to timeout seconds for another process's transaction to finish
+        self._connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        # Losing the pacing state in a crash does no harm, so don't wait on the disk
+        self._connection.execute("pragma synchronous = off")
+        self._connection.execute(
+            "create table if not exists accounts (account text primary key, "
+            "nextRequestAt real not null, pausedUntil real not null, "
+            "intervalSeconds real not null)"
+        )
+
+    def Acquire(self) -> float:
+        """Wait for this request's turn among every process of the account
+
+        :returns the seconds waited
+        """
+        try:
+            with self._Transaction() as (now, nextRequestAt, pausedUntil, intervalSeconds):
+                requestAt = max(now, nextRequestAt, pausedUntil)
+                interval = max(self.minIntervalSeconds, intervalSeconds)
+                learnedInterval = intervalSeconds * (1 - self.INTERVAL_DECAY)
+                if learnedInterval < self.MIN_LEARNED_INTERVAL / 10:
+                    learnedInterval = 0.0
+                self._Write(requestAt + interval, pausedUntil, learnedInterval)
+        except sqlite3.Error:
+            return self._fallback.Acquire()
+
+        waitSeconds = requestAt - now
+        if waitSeconds > 0:
+            self._sleep(waitSeconds)
+        return waitSeconds
+
+    def BackOff(self, seconds: float):
+        """Hold off every request of the account for the given seconds from now, and
+        space them further apart from then on
+        """
+        # Also kept in-process, so requests that fall back still hold off
+        self._fallback.BackOff(seconds)
+        try:
+            with self._Transaction() as (now, nextRequestAt, pausedUntil, intervalSeconds):
+                learnedInterval = min(
+                    max(intervalSeconds * 2, self.MIN_LEARNED_INTERVAL), self.MAX_LEARNED_INTERVAL
+                )
+                self._Write(nextRequestAt, max(pausedUntil, now + seconds), learnedInterval)
+        except sqlite3.Error:
+            pass
+
+    def Close(self):
+        """Close the file, requests are paced within this process from then on"""
+        with self._lock:
+            self._connection.close()
+
+    @contextmanager
+    def _Transaction(self):
+        """Yield the account's state, locking the file against other processes until
+        the block ends
+        """
+        with self._lock:
+            self._connection.execute("begin immediate")
+            try:
+                row = self._connection.execute(
+                    "select nextRequestAt, pausedUntil, intervalSeconds from accounts "
+                    "where account = ?",
+                    (self._account,),
+                ).fetchone()
+                yield (self._clock(), *(row or (0.0, 0.0, 0.0)))
+                self._connection.execute("commit")
+            except BaseException:
+                try:
+                    self._connection.execute("rollback")
+                except sqlite3.Error:
+                    pass
+                raise
+
+    def _Write(self, nextRequestAt: float, pausedUntil: float, intervalSeconds: float):
+        self._connection.execute(
+            "insert or replace into accounts values (?, ?, ?, ?)",
+            (self._account, nextRequestAt, pausedUntil, intervalSeconds),
+        )
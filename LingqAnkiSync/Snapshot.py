@@ -0,0 +1,117 @@
+"""Offline copies of a language's LingQ cards.
+
+A snapshot is a gzip compressed file with one JSON object per line: a header naming
+the language, then each card from the LingQ API cut down to the fields the addon
+uses. Imports, dry runs and benchmarks can replay a snapshot instead of downloading
+the vocabulary again, reading it a chunk at a time so memory doesn't grow with its size.
+"""
+
+import gzip
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .Converter import ApiCardToLingq
+from .Models.ImportFilter import ImportFilter
+from .Models.Lingq import Lingq
+
+SNAPSHOT_VERSION = 1
+
+_cardFields = ("pk", "term", "fragment", "importance", "status", "extended_status", "tags")
+# Statuses the API returns for an import that leaves out knowns
+_unknownStatuses = (0, 1, 2, 3)
+
+
+def ProjectCard(card: Dict) -> Dict:
+    projected = {field: card.get(field) for field in _cardFields}
+    projected["hints"] = [
+        {"text": hint["text"], "popularity": hint.get("popularity", 0)} for hint in card["hints"]
+    ]
+    return projected
+
+
+def WriteSnapshot(path: str, languageCode: str, pages: Iterable[List[Dict]]) -> int:
+    """Write the cards of pages, as returned by LingqApi.GetCardPages, to a snapshot.
+    The file only replaces an existing one once it is complete
+
+    :returns the number of cards written
+    """
+    header = {"version": SNAPSHOT_VERSION, "languageCode": languageCode, "createdAt": time.time()}
+    cardCount = 0
+    partialPath = path + ".partial"
+    try:
+        with gzip.open(partialPath, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for cards in pages:
+                for card in cards:
+                    f.write(json.dumps(ProjectCard(card), ensure_ascii=False) + "\n")
+                cardCount += len(cards)
+        os.replace(partialPath, path)
+    finally:
+        if os.path.exists(partialPath):
+            os.remove(partialPath)
+    return cardCount
+
+
+def ReadHeader(path: str) -> Dict:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return _ParseHeader(f.readline(), path)
+
+
+def ReadCards(path: str) -> Iterator[Dict]:
+    """Yield the cards of a snapshot one at a time"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        _ParseHeader(f.readline(), path)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def ReadLingqChunks(
+    path: str,
+    includeKnowns: bool,
+    chunkSize: int = 1000,
+    importFilter: Optional[ImportFilter] = None,
+) -> Iterator[List[Lingq]]:
+    """Yield the lingqs of a snapshot in lists of up to chunkSize, leaving out what an
+    import from the API would: cards without translations, knowns unless included and
+    cards the importFilter rejects
+    """
+    if importFilter and not includeKnowns:
+        importFilter = importFilter.WithoutKnowns()
+        if importFilter is None:
+            return
+
+    chunk = []
+    for card in ReadCards(path):
+        if not includeKnowns and card["status"] not in _unknownStatuses:
+            continue
+        if importFilter and not importFilter.Matches(card):
+            continue
+        lingq = ApiCardToLingq(card)
+        if lingq is None:
+            continue
+        chunk.append(lingq)
+        if len(chunk) >= chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ReadStatuses(path: str) -> Dict[int, Tuple[int, int]]:
+    """The status of every card of a snapshot, like LingqApi.GetLingqStatuses"""
+    return {
+        int(card["pk"]): (card["status"], card["extended_status"] or 0) for card in ReadCards(path)
+    }
+
+
+def _ParseHeader(line: str, path: str) -> Dict:
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is not a LingQ snapshot this addon can read")
+    return header
@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import List, Optional
+from .Models.AnkiCard import AnkiCard
+
+# A sync checks the current level on LingQ before patching it, unless it has the
+# statuses of a scan already
+_requestsPerUpdate = 2
+
+
+class SyncPlanner:
+    """Orders pending LingQ updates by value and decides when a sync run has to stop.
+
+    A run stops when it is cancelled or when its time or request budget runs out.
+    Whatever is left over is picked up by the next run, since only updates that
+    were actually synced are written back to anki.
+    """
+
+    def __init__(
+        self,
+        timeBudgetSeconds: float = 0,
+        requestBudget: int = 0,
+        cancelEvent: Optional[threading.Event] = None,
+        clock=time.monotonic,
+    ):
+        self.timeBudgetSeconds = timeBudgetSeconds
+        self.requestBudget = requestBudget
+        self.cancelEvent = cancelEvent
+        self._clock = clock
+        self._deadline = None
+
+    @staticmethod
+    def Prioritize(
+        cardsToIncrease: List[AnkiCard], cardsToDecrease: List[AnkiCard]
+    ) -> List[AnkiCard]:
+        """upgrades before downgrades, then the most important and popular words first"""
+        return sorted(cardsToIncrease, key=_CardValue) + sorted(cardsToDecrease, key=_CardValue)
+
+    def Start(self):
+        if self.timeBudgetSeconds > 0:
+            self._deadline = self._clock() + self.timeBudgetSeconds
+
+    def ShouldStop(self, requestCount: int, requestsPerUpdate: int = _requestsPerUpdate) -> bool:
+        """:param requestsPerUpdate: Requests the next update takes, it has to fit the budget"""
+        if self.cancelEvent is not None and self.cancelEvent.is_set():
+            return True
+        if self._deadline is not None and self._clock() >= self._deadline:
+            return True
+        if self.requestBudget > 0 and requestCount + requestsPerUpdate > self.requestBudget:
+            return True
+        return False
+
+
+def _CardValue(card: AnkiCard):
+    return (-_ToInt(card.importance), -_ToInt(card.popularity))
+
+
+def _ToInt(value) -> int:
+    # Values read back from anki notes are strings
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
@@ -1,49 +1,936 @@
-from .Converter import AnkiCardsToLingqs, LingqsToAnkiCards
-from .LingqApi import LingqApi
+import math
+import os
+import queue
+import requests
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .Converter import AnkiCardsToLingqs, ApiCardToLingq, LingqsToAnkiCards, LingqStatusToLevel, NormalizeTerm
+from .LingqApi import LingqApi, SyncInterrupted
 from .Config import Config, lingqLangcodes
 from .Models.Lingq import Lingq
 from .Models.AnkiCard import AnkiCard
-from typing import List, Dict, Tuple
-from . import AnkiHandler
+from .Models.ImportFilter import ImportFilter
+from .Models.RunPlan import RunPlan
+from .Models.RunReport import RunReport
+from .RateLimiter import RateLimiter, SharedRateLimiter
+from .SyncPlanner import SyncPlanner
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple, Union
+from . import AnkiHandler, Snapshot, UserFiles
+from .Profiler import Profiled
+
+# One JSON report per import or sync, in the addon's user_files
+_runLogFileName = "runs.jsonl"
+# Rate limit state shared by every process using the addon's user_files
+_rateLimitFileName = "rateLimit.sqlite"
+# Prefetched snapshots, one per language
+_prefetchFolder = "prefetch"
+# Pages each stage of an import may get ahead of the next one
+_pipelineDepth = 4
+# Lingqs the collection writer inserts at a time during an import
+_insertBatchSize = 1000
 
 
 class ActionHandler:
     def __init__(self, addonManager):
         self.config = Config(addonManager)
+        # The account's shared rate limiter, opened once and reused by every run
+        self._sharedRateLimiter: Optional[SharedRateLimiter] = None
+        self._sharedRateLimiterKey: Optional[str] = None
+        self._sharedRateLimiterLock = threading.Lock()
 
-    def ImportLingqsToAnki(self, deckName: str, importKnowns: bool) -> int:
-        apiKey = self.config.GetApiKey()
+    @Profiled
+    def ImportLingqsToAnki(
+        self,
+        deckName: str,
+        importKnowns: bool,
+        progressCallback=None,
+        dryRun: bool = False,
+        snapshotPath: Optional[str] = None,
+        importFilter: Optional[ImportFilter] = None,
+        cancelEvent: Optional[threading.Event] = None,
+    ) -> Union[RunReport, RunPlan]:
+        """:returns the run report of the import, counting the imported notes, or with
+        dryRun the plan of what an import would do. A dry run still reads the lingqs
+        but writes nothing to anki. With snapshotPath the lingqs are replayed from a
+        snapshot written by ExportSnapshot instead of fetched from LingQ, as they are
+        from a warm prefetch, see PrefetchLingqs. importFilter defaults to the
+        configured one.
+
+        Lingqs fetched from LingQ are imported as the pages come in: one thread fetches
+        pages, another converts them and this one inserts them in batches. Setting
+        cancelEvent stops all three, keeping what was inserted so far
+        """
         languageCode = self.config.GetLanguageCode()
-        levelToInterval = self.config.GetLevelToInterval()
+        self._CheckLanguageCode(languageCode)
+        if importFilter is None:
+            importFilter = self.config.GetImportFilter()
+
+        report = RunReport("import", languageCode, deckName)
+        snapshotPath = snapshotPath or self._WarmSnapshotPath(languageCode)
+        if snapshotPath:
+            return self._ImportSnapshot(
+                report, snapshotPath, importKnowns, importFilter, progressCallback, dryRun
+            )
+
+        lingqApi = self._CreateLingqApi(report)
+        if dryRun:
+            with report.Phase("fetch"):
+                lingqs = lingqApi.GetLingqs(importKnowns, progressCallback, importFilter)
+            self._RecordRequestTimings(lingqApi)
+            return self._EstimatePlan(
+                RunPlan(
+                    notesToCreate=self._CountNotesToCreate(report, [lingqs]),
+                    getRequests=lingqApi.requestCount,
+                )
+            )
+
+        if cancelEvent is not None:
+            # Also cuts short waiting out a rate limit
+            lingqApi.shouldStop = lambda requestCount: cancelEvent.is_set()
+        progress = _ImportProgress(progressCallback)
+        pages = _TimedChunks(
+            report, "fetch", lingqApi.GetCardPages(importKnowns, progress.Fetched, importFilter)
+        )
+        fetched = _InBackground(pages, _pipelineDepth, cancelEvent)
+        converted = _InBackground(_ParsedPages(report, fetched, progress), _pipelineDepth, cancelEvent)
+        try:
+            # The collection is only ever written from this thread
+            return self._ImportLingqChunks(
+                report, _Batched(converted, _insertBatchSize), progress
+            )
+        finally:
+            # Downstream first, closing a stage waits for its producer to stop
+            converted.close()
+            fetched.close()
+            lingqApi.shouldStop = None
+            self._RecordRequestTimings(lingqApi)
+
+    @Profiled
+    def ExportSnapshot(self, path: str, progressCallback=None) -> RunReport:
+        """Download every card of the language, knowns included, to a snapshot file
+
+        :returns the run report, counting the exported cards
+        """
+        languageCode = self.config.GetLanguageCode()
+        self._CheckLanguageCode(languageCode)
+
+        report = RunReport("export", languageCode, "")
+        lingqApi = self._CreateLingqApi(report)
+        with report.Phase("fetch"):
+            exportedCount = Snapshot.WriteSnapshot(
+                path, languageCode, lingqApi.GetCardPages(True, progressCallback)
+            )
+        self._RecordRequestTimings(lingqApi)
+
+        report.counts = {"exported": exportedCount}
+        self._LogReport(report)
+        return report
+
+    @Profiled
+    def PrefetchLingqs(
+        self, languageCode: str, beforeEachPage: Optional[Callable[[], None]] = None
+    ) -> RunReport:
+        """Download every card of the language to the prefetch folder. While the copy is
+        younger than prefetchMaxAgeMinutes, imports and syncs from LingQ read it instead
+        of fetching from LingQ, until a sync to LingQ changes levels there
+
+        :param beforeEachPage: Called before each page is requested, it may wait or
+            raise PrefetchCancelled to stop
+        :returns the run report, counting the prefetched cards
+        """
+        self._CheckLanguageCode(languageCode)
+
+        report = RunReport("prefetch", languageCode, "")
+        lingqApi = self._CreateLingqApi(report)
+        pages = lingqApi.GetCardPages(True)
+        if beforeEachPage is not None:
+            pages = _HeldBack(pages, beforeEachPage)
+        with report.Phase("fetch"):
+            prefetchedCount = Snapshot.WriteSnapshot(
+                self._PrefetchPath(languageCode), languageCode, pages
+            )
+        # Not _RecordRequestTimings, the config is only written by the user's runs
+
+        report.counts = {"prefetched": prefetchedCount}
+        self._LogReport(report)
+        return report
+
+    def _ImportSnapshot(
+        self,
+        report: RunReport,
+        path: str,
+        importKnowns: bool,
+        importFilter: ImportFilter,
+        progressCallback=None,
+        dryRun: bool = False,
+    ) -> Union[RunReport, RunPlan]:
+        self._CheckSnapshotLanguage(path, report.languageCode)
+        chunks = _TimedChunks(
+            report, "read", Snapshot.ReadLingqChunks(path, importKnowns, importFilter=importFilter)
+        )
+
+        if dryRun:
+            return self._EstimatePlan(
+                RunPlan(notesToCreate=self._CountNotesToCreate(report, chunks))
+            )
+
+        return self._ImportLingqChunks(report, chunks, _ImportProgress(progressCallback))
 
+    @Profiled
+    def RefreshLingqsInAnki(
+        self, deckName: str, progressCallback=None, snapshotPath: Optional[str] = None
+    ) -> RunReport:
+        """Bring the words, translations and sentences of the deck's notes up to date with
+        their lingqs, rewriting only the notes whose lingq changed. With snapshotPath the
+        lingqs are read from a snapshot instead of fetched from LingQ
+
+        :returns the run report, counting the refreshed notes and the unchanged ones
+        """
+        languageCode = self.config.GetLanguageCode()
         self._CheckLanguageCode(languageCode)
 
-        lingqs = LingqApi(apiKey, languageCode).GetLingqs(importKnowns)
-        cards = LingqsToAnkiCards(lingqs, levelToInterval)
-        return AnkiHandler.CreateNotesFromCards(cards, deckName, self.config.GetLanguageCode())
+        report = RunReport("refresh", languageCode, deckName)
+        if snapshotPath:
+            self._CheckSnapshotLanguage(snapshotPath, languageCode)
+            chunks = _TimedChunks(report, "read", Snapshot.ReadLingqChunks(snapshotPath, True))
+        else:
+            lingqApi = self._CreateLingqApi(report)
+            with report.Phase("fetch"):
+                chunks = [lingqApi.GetLingqs(True, progressCallback)]
+            self._RecordRequestTimings(lingqApi)
+
+        with report.Phase("read deck"):
+            primaryKeysInDeck = AnkiHandler.GetLingqLevelsInDeck(deckName).keys()
+        # Only the lingqs with a note are kept, a streamed snapshot isn't held whole
+        lingqsInDeck = [
+            lingq for lingqs in chunks for lingq in lingqs if lingq.primaryKey in primaryKeysInDeck
+        ]
+        with report.Phase("convert"):
+            cards = LingqsToAnkiCards(lingqsInDeck, self.config.GetLevelToInterval())
+        with report.Phase("refresh"):
+            refreshedCount = AnkiHandler.RefreshNotes(deckName, languageCode, cards)
+
+        report.counts = {"refreshed": refreshedCount, "unchanged": len(cards) - refreshedCount}
+        self._LogReport(report)
+        return report
+
+    @Profiled
+    def ImportAllLanguages(self, importKnowns: bool, progressCallback=None) -> List[RunReport]:
+        """Import every language of the languageDecks config into its deck. The lingqs of
+        all languages are fetched at once, then each language is added to anki in one go
+
+        :returns a run report per language
+        """
+        reports = self._CreateLanguageReports("import")
+        importFilter = self.config.GetImportFilter()
+        lingqApis = self._CreateSharedLingqApis(reports)
+        if progressCallback:
+            progressCallback(0, 0, phase=f"Fetching {len(reports)} languages")
+
+        lingqsPerLanguage = _RunConcurrently(
+            [
+                _PhaseOf(
+                    report,
+                    "fetch",
+                    lambda report=report, lingqApi=lingqApi: self._FetchLingqs(
+                        report, lingqApi, importKnowns, importFilter
+                    ),
+                )
+                for report, lingqApi in zip(reports, lingqApis)
+            ]
+        )
+        for lingqApi in lingqApis:
+            self._RecordRequestTimings(lingqApi)
+
+        return [
+            self._ImportFetchedLingqs(report, lingqs, progressCallback)
+            for report, lingqs in zip(reports, lingqsPerLanguage)
+        ]
+
+    def _ImportFetchedLingqs(
+        self, report: RunReport, lingqs: List[Lingq], progressCallback=None
+    ) -> RunReport:
+        progress = _ImportProgress(progressCallback)
+        progress.Fetched(len(lingqs), len(lingqs))
+        return self._ImportLingqChunks(report, [lingqs], progress)
+
+    def _CountNotesToCreate(self, report: RunReport, chunks: Iterable[List[Lingq]]) -> int:
+        """The notes an import of the chunks would create, leaving out the same lingqs
+        as _ImportLingqChunks but without writing anything
+        """
+        dedup = _ImportDedup(
+            AnkiHandler.GetLingqTermsInDeck(report.deckName), self._GetDuplicateTerms()
+        )
+        return sum(len(dedup.NewLingqs(lingqs)) for lingqs in chunks)
+
+    def _GetDuplicateTerms(self) -> str:
+        duplicateTerms = self.config.GetDuplicateTerms()
+        if duplicateTerms not in AnkiHandler.DUPLICATE_TERM_ACTIONS:
+            raise ValueError(
+                f'No such duplicateTerms "{duplicateTerms}". '
+                f"Should be one of {AnkiHandler.DUPLICATE_TERM_ACTIONS}"
+            )
+        return duplicateTerms
+
+    def _ImportLingqChunks(
+        self,
+        report: RunReport,
+        chunks: Iterable[List[Lingq]],
+        progress: Optional["_ImportProgress"] = None,
+    ) -> RunReport:
+        """Add the lingqs that aren't in the deck yet, a chunk at a time so a streamed
+        source is never held in memory whole
+        """
+        progress = progress or _ImportProgress(None)
+        duplicateTerms = self._GetDuplicateTerms()
+
+        # One query for the whole deck instead of a search per note while inserting
+        with report.Phase("dedup"):
+            AnkiHandler.EnsureLingqGuids(report.languageCode)
+            guidPks = AnkiHandler.GetPrimaryKeysWithGuid(report.languageCode)
+            dedup = _ImportDedup(
+                AnkiHandler.GetLingqTermsInDeck(report.deckName), duplicateTerms
+            )
+
+        newCardOrder = self.config.GetNewCardOrder()
+        pkToPopularity = {}
+        importedCount = 0
+        for lingqs in chunks:
+            with report.Phase("dedup"):
+                newLingqs = dedup.NewLingqs(lingqs)
+            with report.Phase("convert"):
+                cards = LingqsToAnkiCards(newLingqs, self.config.GetLevelToInterval())
+            # The lingqs left out count as processed before the inserted ones
+            progress.Skipped(len(lingqs) - len(newLingqs))
+            with report.Phase("insert"):
+                importedCount += AnkiHandler.CreateNotesFromCards(
+                    cards,
+                    report.deckName,
+                    report.languageCode,
+                    progress.Inserting,
+                    checkForDuplicates=False,
+                    keepNewCards=bool(newCardOrder),
+                    guidPks=guidPks,
+                )
+            progress.Inserted(len(newLingqs))
+            if newCardOrder:
+                pkToPopularity.update((lingq.primaryKey, lingq.popularity) for lingq in lingqs)
 
+        report.counts = {"imported": importedCount, "alreadyInDeck": dedup.alreadyInDeckCount}
+        if duplicateTerms != "keep":
+            report.counts["duplicateTerms"] = dedup.duplicateCount
+        if dedup.translationsToMerge:
+            # Also reaches the notes added by this import, they are all in the deck by now
+            progress.Stage("Merging translations")
+            with report.Phase("merge"):
+                report.counts["merged"] = AnkiHandler.MergeTranslations(
+                    report.deckName, dedup.translationsToMerge
+                )
+        if newCardOrder:
+            progress.Stage("Reordering new cards")
+            with report.Phase("reorder"):
+                report.counts["reordered"] = AnkiHandler.RepositionNewCards(
+                    report.deckName, pkToPopularity, newCardOrder
+                )
+        self._LogReport(report)
+        return report
+
+    @Profiled
     def SyncLingqStatusToLingq(
-        self, deckName: str, downgrade: bool = False, progressCallback=None
-    ) -> Tuple[int, int, int, int]:
-        apiKey = self.config.GetApiKey()
+        self,
+        deckName: str,
+        downgrade: bool = False,
+        progressCallback=None,
+        cancelEvent=None,
+        dryRun: bool = False,
+    ) -> Union[RunReport, RunPlan]:
+        """Push levels to lingq, most valuable updates first, within the configured budget.
+        LingQ is asked whether the API key works, and for the current statuses, while
+        the deck is read, see _PlanSyncToLingqWhileAskingLingq
+
+        :returns the run report, counting the cards to increase, decrease and ignore,
+        the successful lingq updates, and the updates left over for the next run.
+        With dryRun nothing is sent or written and the plan of the sync is returned instead
+        """
         languageCode = self.config.GetLanguageCode()
+        self._CheckLanguageCode(languageCode)
+
+        report = RunReport("syncToLingq", languageCode, deckName)
+        planner = self._CreateSyncPlanner(cancelEvent)
+        # The time budget covers the status scan as well as the push
+        planner.Start()
+        if dryRun or planner.ShouldStop(0):
+            lingqApi, remoteStatuses = None, None
+            cardsToIncrease, cardsToDecrease, cardsToIgnore = self._PlanSyncToLingq(
+                report, downgrade
+            )
+        else:
+            lingqApi = self._CreateLingqApi(report)
+            (cardsToIncrease, cardsToDecrease, cardsToIgnore), remoteStatuses = (
+                self._PlanSyncToLingqWhileAskingLingq(report, downgrade, lingqApi, planner)
+            )
+        cardsToUpdate = SyncPlanner.Prioritize(cardsToIncrease, cardsToDecrease)
+
+        if dryRun:
+            # The lingqs on LingQ are about the notes in the deck
+            cardCount = len(cardsToIncrease) + len(cardsToDecrease) + len(cardsToIgnore)
+            scanPages = _StatusScanPages(
+                cardCount, self.config.GetPageSizeModel(languageCode).pageSize
+            )
+            scanned = len(cardsToUpdate) >= scanPages and not planner.ShouldStop(
+                1 + scanPages, requestsPerUpdate=1
+            )
+            statusRequests = scanPages if scanned else len(cardsToUpdate)
+            return self._EstimatePlan(
+                RunPlan(
+                    upgrades=len(cardsToIncrease),
+                    downgrades=len(cardsToDecrease),
+                    ignored=len(cardsToIgnore),
+                    getRequests=1 + statusRequests,
+                    patchRequests=len(cardsToUpdate),
+                )
+            )
+
+        lingqApi = lingqApi or self._CreateLingqApi(report)
+        lingqs = AnkiCardsToLingqs(cardsToUpdate, self.config.GetLevelToInterval())
+        # The request budget covers the probe and the scan before the updates too
+        requestsPerUpdate = 2 if remoteStatuses is None else 1
+        with report.Phase("push"):
+            successfulUpdates = lingqApi.SyncStatusesToLingq(
+                lingqs,
+                progressCallback,
+                lambda requestCount: planner.ShouldStop(requestCount, requestsPerUpdate),
+                remoteStatuses,
+            )
+        self._RecordRequestTimings(lingqApi)
+
+        return self._WriteBackSyncToLingq(
+            report, lingqApi, cardsToIncrease, cardsToDecrease, cardsToIgnore, successfulUpdates
+        )
+
+    @Profiled
+    def SyncAllLanguagesToLingq(
+        self, downgrade: bool = False, progressCallback=None, cancelEvent=None
+    ) -> List[RunReport]:
+        """Push levels to lingq for every language of the languageDecks config at once.
+        The configured budget covers the requests of all languages together
+
+        :returns a run report per language
+        """
+        reports = self._CreateLanguageReports("syncToLingq")
+        plans = [self._PlanSyncToLingq(report, downgrade) for report in reports]
+        planner = self._CreateSyncPlanner(cancelEvent)
+        lingqApis = self._CreateSharedLingqApis(reports)
         levelToInterval = self.config.GetLevelToInterval()
+        if progressCallback:
+            progressCallback(0, 0, phase=f"Syncing {len(reports)} languages")
+
+        def ShouldStop(requestCount):
+            return planner.ShouldStop(sum(lingqApi.requestCount for lingqApi in lingqApis))
+
+        planner.Start()
+        successfulUpdates = _RunConcurrently(
+            [
+                _PhaseOf(
+                    report,
+                    "push",
+                    lambda lingqApi=lingqApi, plan=plan: lingqApi.SyncStatusesToLingq(
+                        AnkiCardsToLingqs(SyncPlanner.Prioritize(plan[0], plan[1]), levelToInterval),
+                        shouldStop=ShouldStop,
+                    ),
+                )
+                for report, lingqApi, plan in zip(reports, lingqApis, plans)
+            ]
+        )
+        for lingqApi in lingqApis:
+            self._RecordRequestTimings(lingqApi)
+
+        return [
+            self._WriteBackSyncToLingq(report, lingqApi, *plan, updates)
+            for report, lingqApi, plan, updates in zip(reports, lingqApis, plans, successfulUpdates)
+        ]
+
+    def _PlanSyncToLingq(
+        self,
+        report: RunReport,
+        downgrade: bool,
+        primaryKeys: Optional[List[int]] = None,
+        checkpoint: Optional[Callable[[], None]] = None,
+    ) -> Tuple[List[AnkiCard], List[AnkiCard], List[AnkiCard]]:
+        """:param primaryKeys: only read these cards instead of the whole deck
+        :param checkpoint: Called now and then while the whole deck is read, it may
+            raise to stop reading
+        """
+        with report.Phase("read deck"):
+            if primaryKeys is None:
+                cards = AnkiHandler.GetAllCardsInDeck(report.deckName, checkpoint)
+            else:
+                cards = AnkiHandler.GetCardsInDeck(
+                    report.deckName, primaryKeys, report.languageCode
+                )
+        with report.Phase("plan"):
+            return self._PrepCardsForUpdate(cards, self.config.GetLevelToInterval(), downgrade)
+
+    def _PlanSyncToLingqWhileAskingLingq(
+        self, report: RunReport, downgrade: bool, lingqApi: LingqApi, planner: SyncPlanner
+    ) -> Tuple[Tuple[List[AnkiCard], List[AnkiCard], List[AnkiCard]], Optional[Dict]]:
+        """Plan a sync while two workers talk to LingQ: one asks for a single card, to
+        find out about a bad API key or language before anything is pushed, the other
+        scans the status of every lingq.
+
+        A failed probe stops the deck read at its next checkpoint and is raised. The
+        scan is stopped once the plan shows that checking each card to update takes
+        fewer requests than the rest of it, or that it can't finish within the
+        planner's request budget with room for an update, and when the budget runs out.
+
+        :returns the plan, and the statuses of the scan if it completed
+        """
+        probeApi = self._CreateLingqApi(report, rateLimiter=lingqApi.rateLimiter)
+        report.http = lingqApi.httpStats
+        stopScan = threading.Event()
+        pageSize = lingqApi.pageSizeModel.pageSize
+        try:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                cardCount = executor.submit(probeApi.GetCardCount)
+                statuses = executor.submit(
+                    _PhaseOf(
+                        report,
+                        "fetch statuses",
+                        lambda: lingqApi.GetLingqStatuses(
+                            lambda: stopScan.is_set()
+                            or planner.ShouldStop(
+                                lingqApi.requestCount + probeApi.requestCount,
+                                requestsPerUpdate=1,
+                            )
+                        ),
+                    )
+                )
+
+                def RaiseIfProbeFailed():
+                    if cardCount.done():
+                        cardCount.result()
+
+                try:
+                    plan = self._PlanSyncToLingq(
+                        report, downgrade, checkpoint=RaiseIfProbeFailed
+                    )
+                    scanPages = _StatusScanPages(cardCount.result(), pageSize)
+                except BaseException:
+                    stopScan.set()
+                    raise
+                # The probe and the whole scan, then at least one update
+                scanFits = not planner.ShouldStop(1 + scanPages, requestsPerUpdate=1)
+                if not statuses.done() and (
+                    len(plan[0]) + len(plan[1]) < scanPages or not scanFits
+                ):
+                    stopScan.set()
+        finally:
+            # Both workers are done with their LingqApi by now
+            lingqApi.httpStats.Add(probeApi.httpStats)
+
+        try:
+            return plan, statuses.result()
+        except (SyncInterrupted, requests.RequestException):
+            # Each card's level is asked for before it is pushed instead
+            return plan, None
+
+    def GetAutoSyncTarget(self, card) -> Optional[Tuple[str, str, int]]:
+        """Called for every review when auto sync is on, so it only looks at the one card
+
+        :returns the language code, deck name and LingqPK to push when the reviewed card
+        crossed the interval of another level, None otherwise
+        """
+        lingqCard = AnkiHandler.GetLingqCard(card)
+        if lingqCard is None:
+            return None
+
+        ankiCard, deckName = lingqCard
+        languageCode = next(
+            (
+                languageCode
+                for languageCode, languageDeck in self.config.GetLanguageDecks().items()
+                if languageDeck == deckName
+            ),
+            None,
+        )
+        if languageCode is None:
+            return None
+
+        cardsToIncrease, cardsToDecrease, _ = self._PrepCardsForUpdate(
+            [ankiCard], self.config.GetLevelToInterval(), self.config.GetAutoSyncDowngrade()
+        )
+        if not cardsToIncrease and not cardsToDecrease:
+            return None
+        return languageCode, deckName, ankiCard.primaryKey
+
+    @Profiled
+    def SyncNotesToLingq(
+        self,
+        languageCode: str,
+        deckName: str,
+        primaryKeys: List[int],
+        downgrade: bool = False,
+        runOnCollection: Optional[Callable[[Callable], object]] = None,
+    ) -> RunReport:
+        """Push the levels of only the given lingqs, for auto sync
+
+        :param runOnCollection: Runs the reading of the cards and the writing back of
+            their levels, and returns the result, e.g. as short operations of anki.
+            The requests to LingQ are sent from the calling thread in between, so
+            they never hold up the reviewer. Defaults to running them right away
+        :returns the run report, counted like SyncLingqStatusToLingq
+        """
+        self._CheckLanguageCode(languageCode)
+        runOnCollection = runOnCollection or (lambda work: work())
+
+        report = RunReport("autoSync", languageCode, deckName)
+        cardsToIncrease, cardsToDecrease, cardsToIgnore = runOnCollection(
+            lambda: self._PlanSyncToLingq(report, downgrade, primaryKeys)
+        )
+        cardsToUpdate = SyncPlanner.Prioritize(cardsToIncrease, cardsToDecrease)
+
+        lingqApi = self._CreateLingqApi(report)
+        lingqs = AnkiCardsToLingqs(cardsToUpdate, self.config.GetLevelToInterval())
+        with report.Phase("push"):
+            successfulUpdates = lingqApi.SyncStatusesToLingq(lingqs)
+        self._RecordRequestTimings(lingqApi)
+
+        return runOnCollection(
+            lambda: self._WriteBackSyncToLingq(
+                report, lingqApi, cardsToIncrease, cardsToDecrease, cardsToIgnore, successfulUpdates
+            )
+        )
+
+    def _WriteBackSyncToLingq(
+        self,
+        report: RunReport,
+        lingqApi: LingqApi,
+        cardsToIncrease: List[AnkiCard],
+        cardsToDecrease: List[AnkiCard],
+        cardsToIgnore: List[AnkiCard],
+        successfulUpdates: int,
+    ) -> RunReport:
+        # Only write back what reached lingq, the rest stays pending for the next run
+        with report.Phase("write back"):
+            syncedPks = {lingq.primaryKey for lingq in lingqApi.syncedLingqs}
+            syncedLevels = {
+                card.primaryKey: card.level
+                for card in cardsToIncrease + cardsToDecrease
+                if card.primaryKey in syncedPks
+            }
+            AnkiHandler.UpdateLevels(report.deckName, syncedLevels)
+        if syncedLevels:
+            self._DiscardWarmSnapshot(report.languageCode)
+
+        report.counts = {
+            "increased": len(cardsToIncrease),
+            "decreased": len(cardsToDecrease),
+            "ignored": len(cardsToIgnore),
+            "updated": successfulUpdates,
+            "remaining": len(cardsToIncrease) + len(cardsToDecrease) - len(syncedLevels),
+        }
+        self._LogReport(report)
+        return report
+
+    @Profiled
+    def SyncLingqStatusFromLingq(self, deckName: str, downgrade: bool = False) -> RunReport:
+        """:returns the run report, counting the notes increased and decreased to match lingq"""
+        languageCode = self.config.GetLanguageCode()
+        self._CheckLanguageCode(languageCode)
+
+        report = RunReport("syncFromLingq", languageCode, deckName)
+        lingqApi = self._CreateLingqApi(report)
+        with report.Phase("fetch"):
+            lingqStatuses, isLive = self._FetchLingqStatuses(report, lingqApi)
+        self._RecordRequestTimings(lingqApi)
+
+        return self._ApplyLingqStatuses(report, lingqStatuses, downgrade, isLive)
+
+    @Profiled
+    def SyncAllLanguagesFromLingq(self, downgrade: bool = False) -> List[RunReport]:
+        """Pull the levels of every language of the languageDecks config, fetching the
+        statuses of all languages at once
+
+        :returns a run report per language
+        """
+        reports = self._CreateLanguageReports("syncFromLingq")
+        lingqApis = self._CreateSharedLingqApis(reports)
+
+        statusesPerLanguage = _RunConcurrently(
+            [
+                _PhaseOf(
+                    report,
+                    "fetch",
+                    lambda report=report, lingqApi=lingqApi: self._FetchLingqStatuses(
+                        report, lingqApi
+                    ),
+                )
+                for report, lingqApi in zip(reports, lingqApis)
+            ]
+        )
+        for lingqApi in lingqApis:
+            self._RecordRequestTimings(lingqApi)
+
+        return [
+            self._ApplyLingqStatuses(report, lingqStatuses, downgrade, isLive)
+            for report, (lingqStatuses, isLive) in zip(reports, statusesPerLanguage)
+        ]
+
+    def _ApplyLingqStatuses(
+        self,
+        report: RunReport,
+        lingqStatuses: Dict[int, Tuple[int, int]],
+        downgrade: bool,
+        isLive: bool = True,
+    ) -> RunReport:
+        """:param isLive: Whether lingqStatuses come straight from LingQ. Orphans are
+        only reconciled against those, a prefetched listing misses the lingqs created
+        since it was taken
+        """
+        with report.Phase("read deck"):
+            ankiLevels = AnkiHandler.GetLingqLevelsInDeck(report.deckName)
+        with report.Phase("plan"):
+            levelsToIncrease, levelsToDecrease = self._PrepLevelsFromLingq(
+                ankiLevels, lingqStatuses, downgrade
+            )
+        with report.Phase("write back"):
+            AnkiHandler.UpdateLevelsAndReschedule(
+                report.deckName,
+                {**levelsToIncrease, **levelsToDecrease},
+                self.config.GetLevelToInterval(),
+            )
+
+        orphanedCount = restoredCount = 0
+        if isLive:
+            orphanedCount, restoredCount = self._ReconcileOrphans(report, lingqStatuses.keys())
 
+        report.counts = {
+            "increased": len(levelsToIncrease),
+            "decreased": len(levelsToDecrease),
+            "orphaned": orphanedCount,
+            "restored": restoredCount,
+        }
+        self._LogReport(report)
+        return report
+
+    @Profiled
+    def ReconcileOrphans(self, deckName: str, action: Optional[str] = None) -> RunReport:
+        """Deal with the notes whose lingq was deleted on LingQ, as Sync from Lingq does,
+        without touching any levels. action defaults to the configured orphanAction
+
+        :returns the run report, counting the orphaned notes and the restored ones
+        """
+        languageCode = self.config.GetLanguageCode()
         self._CheckLanguageCode(languageCode)
 
-        cards = AnkiHandler.GetAllCardsInDeck(deckName)
-        cardsToIncrease, cardsToDecrease, cardsToIgnore = self._PrepCardsForUpdate(
-            cards, levelToInterval, downgrade
+        report = RunReport("reconcile", languageCode, deckName)
+        lingqApi = self._CreateLingqApi(report)
+        with report.Phase("fetch"):
+            livePrimaryKeys = lingqApi.GetLingqStatuses().keys()
+        self._RecordRequestTimings(lingqApi)
+
+        orphanedCount, restoredCount = self._ReconcileOrphans(report, livePrimaryKeys, action)
+        report.counts = {"orphaned": orphanedCount, "restored": restoredCount}
+        self._LogReport(report)
+        return report
+
+    def _ReconcileOrphans(
+        self, report: RunReport, livePrimaryKeys, action: Optional[str] = None
+    ) -> Tuple[int, int]:
+        # An empty listing is more likely a wrong account than every lingq deleted
+        if not livePrimaryKeys:
+            return 0, 0
+        with report.Phase("reconcile"):
+            return AnkiHandler.ReconcileOrphans(
+                report.deckName,
+                report.languageCode,
+                livePrimaryKeys,
+                action or self.config.GetOrphanAction(),
+            )
+
+    def _FetchLingqs(
+        self,
+        report: RunReport,
+        lingqApi: LingqApi,
+        importKnowns: bool,
+        importFilter: ImportFilter,
+    ) -> List[Lingq]:
+        snapshotPath = self._WarmSnapshotPath(report.languageCode)
+        if snapshotPath is None:
+            return lingqApi.GetLingqs(importKnowns, importFilter=importFilter)
+        return [
+            lingq
+            for lingqs in Snapshot.ReadLingqChunks(snapshotPath, importKnowns, importFilter=importFilter)
+            for lingq in lingqs
+        ]
+
+    def _FetchLingqStatuses(
+        self, report: RunReport, lingqApi: LingqApi
+    ) -> Tuple[Dict[int, Tuple[int, int]], bool]:
+        """:returns the statuses, and whether they were fetched from LingQ rather than
+        read from a warm prefetch
+        """
+        snapshotPath = self._WarmSnapshotPath(report.languageCode)
+        if snapshotPath is None:
+            return lingqApi.GetLingqStatuses(), True
+        return Snapshot.ReadStatuses(snapshotPath), False
+
+    def _PrefetchPath(self, languageCode: str) -> str:
+        return UserFiles.GetPath(_prefetchFolder, f"{languageCode}.ndjson.gz")
+
+    def _DiscardedPath(self, languageCode: str) -> str:
+        return UserFiles.GetPath(_prefetchFolder, f"{languageCode}.discarded")
+
+    def _WarmSnapshotPath(self, languageCode: str) -> Optional[str]:
+        """:returns the language's prefetched snapshot when prefetch is on and the
+        snapshot is recent enough to stand in for LingQ, None otherwise. A snapshot
+        started before the last discard is out of date, even if it was only written
+        after it
+        """
+        if not self.config.GetPrefetch():
+            return None
+        path = self._PrefetchPath(languageCode)
+        try:
+            createdAt = Snapshot.ReadHeader(path)["createdAt"]
+        except (OSError, EOFError, ValueError):
+            return None
+        if time.time() - createdAt > self.config.GetPrefetchMaxAgeMinutes() * 60:
+            return None
+        if createdAt <= self._DiscardedAt(languageCode):
+            return None
+        return path
+
+    def _DiscardWarmSnapshot(self, languageCode: str):
+        """Levels on LingQ changed, the prefetched statuses are out of date. The time is
+        kept so a prefetch running meanwhile doesn't bring them back
+        """
+        if not self.config.GetPrefetch():
+            return
+        try:
+            with open(self._DiscardedPath(languageCode), "w") as f:
+                f.write(str(time.time()))
+            os.remove(self._PrefetchPath(languageCode))
+        except OSError:
+            pass
+
+    def _DiscardedAt(self, languageCode: str) -> float:
+        try:
+            with open(self._DiscardedPath(languageCode)) as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return 0.0
+
+    def _CreateLingqApi(
+        self, report: RunReport, session=None, rateLimiter: Optional[RateLimiter] = None
+    ) -> LingqApi:
+        lingqApi = LingqApi(
+            self.config.GetApiKey(),
+            report.languageCode,
+            self.config.GetApiBaseUrl(),
+            session,
+            rateLimiter or self._CreateRateLimiter(),
+            self.config.GetPageSizeModel(report.languageCode),
+        )
+        report.http = lingqApi.httpStats
+        return lingqApi
+
+    def _CreateSharedLingqApis(self, reports: List[RunReport]) -> List[LingqApi]:
+        """LingqApis that share one connection pool and rate limiter"""
+        session = requests.Session()
+        session.mount(
+            "https://", requests.adapters.HTTPAdapter(pool_maxsize=max(len(reports), 1))
+        )
+        rateLimiter = self._CreateRateLimiter()
+        return [self._CreateLingqApi(report, session, rateLimiter) for report in reports]
+
+    def _CreateRateLimiter(self) -> Union[RateLimiter, SharedRateLimiter]:
+        """The account's shared rate limiter when configured, or one for this process
+        when its file can't be opened
+        """
+        if not self.config.GetSharedRateLimit():
+            return RateLimiter()
+
+        apiKey = self.config.GetApiKey()
+        with self._sharedRateLimiterLock:
+            if self._sharedRateLimiter is not None and self._sharedRateLimiterKey == apiKey:
+                return self._sharedRateLimiter
+            self._CloseSharedRateLimiter()
+            try:
+                self._sharedRateLimiter = SharedRateLimiter(
+                    UserFiles.GetPath(_rateLimitFileName), apiKey
+                )
+            except (OSError, sqlite3.Error):
+                return RateLimiter()
+            self._sharedRateLimiterKey = apiKey
+            return self._sharedRateLimiter
+
+    def Close(self):
+        """Close the shared rate limiter's file, the next run opens it again"""
+        with self._sharedRateLimiterLock:
+            self._CloseSharedRateLimiter()
+
+    def _CloseSharedRateLimiter(self):
+        if self._sharedRateLimiter is not None:
+            self._sharedRateLimiter.Close()
+        self._sharedRateLimiter = None
+        self._sharedRateLimiterKey = None
+
+    def _CreateLanguageReports(self, operation: str) -> List[RunReport]:
+        languageDecks = self.config.GetLanguageDecks()
+        if not languageDecks:
+            raise ValueError("No languages configured, set languageDecks in the addon config")
+        for languageCode in languageDecks:
+            self._CheckLanguageCode(languageCode)
+        return [
+            RunReport(operation, languageCode, deckName)
+            for languageCode, deckName in languageDecks.items()
+        ]
+
+    def _CreateSyncPlanner(self, cancelEvent) -> SyncPlanner:
+        return SyncPlanner(
+            self.config.GetSyncTimeBudgetMinutes() * 60,
+            self.config.GetSyncRequestBudget(),
+            cancelEvent,
+        )
+
+    def _RecordRequestTimings(self, lingqApi: LingqApi):
+        """Fold what this run's requests cost into the persisted rate limit model, and
+        keep the page size the language's list requests settled on
+        """
+        if lingqApi.requestCount == 0:
+            return
+        if lingqApi.pageSizeModel != self.config.GetPageSizeModel(lingqApi.languageCode):
+            self.config.SetPageSizeModel(lingqApi.languageCode, lingqApi.pageSizeModel)
+
+        rateLimitModel = self.config.GetRateLimitModel()
+        rateLimitModel.Observe(
+            lingqApi.requestCount,
+            lingqApi.httpStats.requestSeconds,
+            lingqApi.httpStats.sleepSeconds,
         )
-        cardsToUpdate = cardsToIncrease + cardsToDecrease
+        self.config.SetRateLimitModel(rateLimitModel)
+
+    def _LogReport(self, report: RunReport):
+        # The log is for diagnosing slow runs, failing to write it must not fail the run
+        try:
+            UserFiles.AppendJsonLine(_runLogFileName, report.ToJson())
+        except OSError:
+            pass
 
-        lingqs = AnkiCardsToLingqs(cardsToUpdate, levelToInterval)
-        successfulUpdates = LingqApi(apiKey, languageCode).SyncStatusesToLingq(
-            lingqs, progressCallback
+    def _EstimatePlan(self, plan: RunPlan) -> RunPlan:
+        plan.estimatedSeconds = self.config.GetRateLimitModel().EstimateSeconds(
+            plan.getRequests + plan.patchRequests
         )
-        self._UpdateNotesInAnki(deckName, cardsToUpdate)
+        return plan
 
-        return len(cardsToIncrease), len(cardsToDecrease), len(cardsToIgnore), successfulUpdates
+    def _CheckSnapshotLanguage(self, path: str, languageCode: str):
+        snapshotLanguage = Snapshot.ReadHeader(path)["languageCode"]
+        if snapshotLanguage != languageCode:
+            raise ValueError(
+                f'The snapshot is of language "{snapshotLanguage}", not "{languageCode}"'
+            )
 
     def _CheckLanguageCode(self, languageCode: str):
         if languageCode not in lingqLangcodes:
@@ -84,14 +971,52 @@ class ActionHandler:
 
         return cardsToIncrease, cardsToDecrease, cardsToIgnore
 
-    def _UpdateNotesInAnki(self, deckName: str, cards: List[AnkiCard]):
-        for card in cards:
-            AnkiHandler.UpdateCardLevel(deckName, card.primaryKey, card.level)
+    def _PrepLevelsFromLingq(
+        self,
+        ankiLevels: Dict[int, str],
+        lingqStatuses: Dict[int, Tuple[int, int]],
+        downgrade: bool,
+    ) -> Tuple[Dict[int, str], Dict[int, str]]:
+        """joins the anki deck against the lingq statuses on primary key
+
+        :returns two mappings of primary key to new level, for notes whose level should
+        increase or decrease to match lingq. Notes without a lingq are left alone
+        """
+        levelsToIncrease = {}
+        levelsToDecrease = {}
+
+        for primaryKey, ankiLevel in ankiLevels.items():
+            if primaryKey not in lingqStatuses or ankiLevel not in Lingq.LEVELS:
+                continue
+
+            lingqLevel = LingqStatusToLevel(*lingqStatuses[primaryKey])
+            if Lingq.LEVELS.index(lingqLevel) > Lingq.LEVELS.index(ankiLevel):
+                levelsToIncrease[primaryKey] = lingqLevel
+            elif downgrade and Lingq.LEVELS.index(lingqLevel) < Lingq.LEVELS.index(ankiLevel):
+                levelsToDecrease[primaryKey] = lingqLevel
+
+        return levelsToIncrease, levelsToDecrease
 
     def SetConfigs(self, apiKey, languageCode):
         self.config.SetApiKey(apiKey)
         self.config.SetLanguageCode(languageCode)
 
+    def SetSyncBudget(self, timeBudgetMinutes: int, requestBudget: int):
+        self.config.SetSyncTimeBudgetMinutes(timeBudgetMinutes)
+        self.config.SetSyncRequestBudget(requestBudget)
+
+    def GetSyncTimeBudgetMinutes(self) -> int:
+        return self.config.GetSyncTimeBudgetMinutes()
+
+    def GetSyncRequestBudget(self) -> int:
+        return self.config.GetSyncRequestBudget()
+
+    def SetDeckName(self, deckName: str):
+        self.config.SetDeckName(deckName)
+
+    def GetDeckName(self) -> str:
+        return self.config.GetDeckName()
+
     def GetDeckNames(self) -> List:
         return AnkiHandler.GetAllDeckNames()
 
@@ -100,3 +1025,223 @@ class ActionHandler:
 
     def GetLanguageCode(self) -> str:
         return self.config.GetLanguageCode()
+
+
+def _StatusScanPages(cardCount: int, pageSize: int) -> int:
+    """Requests a scan of the statuses of cardCount lingqs takes"""
+    return max(math.ceil(cardCount / pageSize), 1)
+
+
+class _ImportDedup:
+    """Picks the lingqs of an import that get a note: not the ones already in the deck,
+    and unless duplicateTerms is keep, not a second lingq of a term the deck or this
+    import already has
+    """
+
+    def __init__(self, termsInDeck: Dict[int, str], duplicateTerms: str):
+        self.duplicateTerms = duplicateTerms
+        self.existingPks = set(termsInDeck)
+        # The LingqPK of the note that holds each term
+        self.termIndex = {}
+        if duplicateTerms != "keep":
+            self.termIndex = {NormalizeTerm(term): pk for pk, term in termsInDeck.items()}
+        self.translationsToMerge: Dict[int, List[str]] = {}
+        self.alreadyInDeckCount = 0
+        self.duplicateCount = 0
+
+    def NewLingqs(self, lingqs: List[Lingq]) -> List[Lingq]:
+        newLingqs = []
+        for lingq in lingqs:
+            if lingq.primaryKey in self.existingPks:
+                self.alreadyInDeckCount += 1
+                continue
+            self.existingPks.add(lingq.primaryKey)
+            if self.duplicateTerms != "keep":
+                ownerPk = self.termIndex.setdefault(NormalizeTerm(lingq.word), lingq.primaryKey)
+                if ownerPk != lingq.primaryKey:
+                    self.duplicateCount += 1
+                    if self.duplicateTerms == "merge":
+                        self.translationsToMerge.setdefault(ownerPk, []).extend(
+                            lingq.translations
+                        )
+                    continue
+            newLingqs.append(lingq)
+        return newLingqs
+
+
+class _ImportProgress:
+    """One progress for an import whose lingqs are fetched, parsed and inserted on
+    different threads: the total comes from the fetch, the count from the lingqs
+    parsed out or inserted, so every thread reports the same "Importing" phase
+    """
+
+    def __init__(self, progressCallback):
+        self._progressCallback = progressCallback
+        # Also held while reporting, so the count never goes backwards
+        self._lock = threading.Lock()
+        self._total = 0
+        self._processed = 0
+
+    def Fetched(self, current, total, word="", rateLimitSeconds=None, phase=None):
+        """progressCallback of the fetch, only its total and rate limit waits are shown"""
+        with self._lock:
+            self._total = total or self._total
+            if rateLimitSeconds:
+                self._Report(self._processed, "", rateLimitSeconds)
+
+    def Inserting(self, current, total, word="", rateLimitSeconds=None, phase=None):
+        """progressCallback of a batch insert, current counts within the batch"""
+        with self._lock:
+            self._Report(self._processed + current, word)
+
+    def Skipped(self, count: int):
+        if not count:
+            return
+        with self._lock:
+            self._processed += count
+            self._Report(self._processed)
+
+    def Inserted(self, count: int):
+        """Count a batch insert done, Inserting already reported it"""
+        with self._lock:
+            self._processed += count
+
+    def Stage(self, phase: str):
+        """Report a step that follows the inserts"""
+        if self._progressCallback:
+            self._progressCallback(0, 0, phase=phase)
+
+    def _Report(self, processed: int, word: str = "", rateLimitSeconds=None):
+        if self._progressCallback:
+            # Cards the import filter left out of a page are never counted. A snapshot
+            # has no total
+            total = max(self._total, processed) if self._total else 0
+            self._progressCallback(processed, total, word, rateLimitSeconds, phase="Importing")
+
+
+def _HeldBack(pages: Iterator[List], beforeEachPage: Callable[[], None]) -> Iterator[List]:
+    """Call beforeEachPage before each page of a lazy page source is requested"""
+    pages = iter(pages)
+    while True:
+        beforeEachPage()
+        try:
+            page = next(pages)
+        except StopIteration:
+            return
+        yield page
+
+
+def _TimedChunks(report: RunReport, phase: str, chunks: Iterator[List]) -> Iterator[List]:
+    """Count the time spent producing each chunk of a stream towards a phase"""
+    while True:
+        with report.Phase(phase):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _ParsedPages(
+    report: RunReport, pages: Iterator[List[Dict]], progress: _ImportProgress
+) -> Iterator[List[Lingq]]:
+    """Convert each page of API cards to lingqs, leaving out the untranslated ones"""
+    for cards in pages:
+        with report.Phase("parse"):
+            lingqs = [lingq for lingq in map(ApiCardToLingq, cards) if lingq is not None]
+        progress.Skipped(len(cards) - len(lingqs))
+        yield lingqs
+
+
+def _Batched(chunks: Iterator[List], batchSize: int) -> Iterator[List]:
+    """Join small chunks into lists of at least batchSize, the last one excepted"""
+    batch = []
+    for chunk in chunks:
+        batch.extend(chunk)
+        if len(batch) >= batchSize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Ends the items a pipeline stage hands on, with the error that stopped it if any
+_stageDone = object()
+
+
+def _InBackground(
+    items: Iterable, maxPending: int, cancelEvent: Optional[threading.Event] = None
+) -> Iterator:
+    """Produce items on a thread of their own while the caller consumes them, as a
+    stage of a pipeline. At most maxPending items wait for the caller, after that the
+    producer waits too. An error while producing is raised to the caller.
+
+    The producer stops before its next item when the caller stops iterating, closes
+    the returned generator or sets cancelEvent
+    """
+    pending = queue.Queue(maxsize=maxPending)
+    stopped = threading.Event()
+
+    def IsStopped() -> bool:
+        return stopped.is_set() or (cancelEvent is not None and cancelEvent.is_set())
+
+    def Put(item) -> bool:
+        while not IsStopped():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def Produce():
+        source = iter(items)
+        error = None
+        try:
+            for item in source:
+                if not Put((item, None)):
+                    return
+        except BaseException as e:
+            error = e
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+        Put((_stageDone, error))
+
+    producer = threading.Thread(target=Produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            try:
+                item, error = pending.get(timeout=0.1)
+            except queue.Empty:
+                if IsStopped() and not producer.is_alive():
+                    return
+                continue
+            if item is _stageDone:
+                if error is not None:
+                    raise error
+                return
+            yield item
+            if cancelEvent is not None and cancelEvent.is_set():
+                return
+    finally:
+        stopped.set()
+        producer.join()
+
+
+def _PhaseOf(report: RunReport, phase: str, func: Callable) -> Callable:
+    def Timed():
+        with report.Phase(phase):
+            return func()
+
+    return Timed
+
+
+def _RunConcurrently(funcs: List[Callable]) -> List:
+    """Run network bound work, like fetching several languages, on a thread each
+
+    :returns the results in the order of funcs, raising the first failure
+    """
+    with ThreadPoolExecutor(max_workers=max(len(funcs), 1)) as executor:
+        futures = [executor.submit(func) for func in funcs]
+        return [future.result() for future in futures]
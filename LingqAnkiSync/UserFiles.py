@@ -0,0 +1,16 @@
+import os
+
+# Anki keeps this folder when the addon is updated
+_userFilesDir = os.path.join(os.path.dirname(__file__), "user_files")
+
+
+def GetPath(*parts: str) -> str:
+    """Path of a file in the addon's user_files folder, creating its folder if needed"""
+    path = os.path.join(_userFilesDir, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def AppendJsonLine(fileName: str, line: str):
+    with open(GetPath(fileName), "a", encoding="utf-8") as f:
+        f.write(line + "\n")
@@ -1,11 +1,77 @@
+# Only the menu entry is registered on anki startup. The window, and with it requests
+# and the sync machinery, is imported the first time the menu entry is clicked
+def _OpenWindow():
+    from .popUpWindow import UI
+
+    UI().Run()
+
+
+def InitializeAnkiMenu():
+    from aqt import mw
+    from aqt.qt import QAction
+
+    action = QAction("Import LingQs from LingQ.com", mw)
+    action.triggered.connect(_OpenWindow)
+    mw.form.menuTools.addAction(action)
+
+
+def InitializeAutoSync():
+    """Hook into reviews only when auto sync is on, reviews cost nothing otherwise"""
+    from aqt import gui_hooks, mw
+
+    if not mw.addonManager.getConfig(__name__).get("autoSync"):
+        return
+
+    autoSync = []
+
+    def OnCardAnswered(reviewer, card, ease):
+        if not autoSync:
+            from .AutoSync import CreateForAnki
+
+            autoSync.append(CreateForAnki())
+        autoSync[0].OnCardAnswered(card)
+
+    def OnProfileClose():
+        if autoSync:
+            autoSync[0].queue.Cancel()
+
+    gui_hooks.reviewer_did_answer_card.append(OnCardAnswered)
+    gui_hooks.profile_will_close.append(OnProfileClose)
+
+
+def InitializePrefetch():
+    """Keep the LingQ cards warm in the background while a profile is open, only when
+    prefetch is on
+    """
+    from aqt import gui_hooks, mw
+
+    if not mw.addonManager.getConfig(__name__).get("prefetch"):
+        return
+
+    prefetchers = []
+
+    def OnProfileOpen():
+        from .Prefetch import CreateForAnki
+
+        prefetchers.append(CreateForAnki())
+        prefetchers[-1].Start()
+
+    def OnProfileClose():
+        while prefetchers:
+            prefetchers.pop().Cancel()
+
+    gui_hooks.profile_did_open.append(OnProfileOpen)
+    gui_hooks.profile_will_close.append(OnProfileClose)
+
+
 # Only initialize UI if running in Anki, skip otherwise (e.g. when running tests)
 try:
     from aqt import mw
 
     if mw and hasattr(mw, "form") and hasattr(mw.form, "menuTools"):
-        from .popUpWindow import InitializeAnkiMenu
-
         InitializeAnkiMenu()
+        InitializeAutoSync()
+        InitializePrefetch()
 except (AttributeError, ImportError):
     # Not in Anki environment, skip initialization
     pass
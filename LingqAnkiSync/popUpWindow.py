@@ -1,30 +1,83 @@
+import threading
+from dataclasses import dataclass
+from anki.collection import OpChanges
 from aqt.qt import (
     QLineEdit,
     QComboBox,
     QPushButton,
-    QAction,
     QDialogButtonBox,
     QDialog,
     QVBoxLayout,
     QLabel,
     Qt,
     QCheckBox,
+    QSpinBox,
+    QTimer,
 )
 from aqt import mw
-from aqt.operations import QueryOp
+from aqt.errors import show_exception
+from aqt.operations import CollectionOp, QueryOp
 from aqt.utils import showInfo
 
+from .Prefetch import userActions
+from .ProgressReporter import ProgressReporter
 from .UIActionHandler import ActionHandler
 
+# How often the main thread samples progress from a background operation
+_progressPollMs = 100
+
+
+@dataclass
+class _ResultWithChanges:
+    """An operation's result along with the collection changes it made, so that anki
+    only refreshes what changed once the operation finishes
+    """
+
+    result: object
+    changes: OpChanges
+
+
+class _LazyDeckSelector(QComboBox):
+    """Only reads every deck name from the collection once the list is opened"""
+
+    def __init__(self, getDeckNames):
+        super().__init__()
+        self._getDeckNames = getDeckNames
+        self._loaded = False
+
+    def SetCurrentDeck(self, deckName: str):
+        if deckName:
+            self.addItem(deckName)
+        else:
+            self._Load()
+
+    def showPopup(self):
+        self._Load()
+        super().showPopup()
+
+    def _Load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        currentDeck = self.currentText()
+        self.clear()
+        self.addItems(self._getDeckNames())
+        if currentDeck:
+            self.setCurrentText(currentDeck)
+
 
 class UI:
     def __init__(self):
-        action = QAction("Import LingQs from LingQ.com", mw)
-        action.triggered.connect(lambda: UI().Run())
         self.apiKeyField = QLineEdit()
         self.languageCodeField = QLineEdit()
         self.importKnownsBox = QCheckBox("Also import known LingQs")
-        self.deckSelector = QComboBox()
+        self.actionHandler = ActionHandler(mw.addonManager)
+        self.deckSelector = _LazyDeckSelector(self.actionHandler.GetDeckNames)
+        self.dryRunBox = QCheckBox("Dry run (only show what Import or Sync to Lingq would do)")
+        self.allLanguagesBox = QCheckBox(
+            "Every language in the languageDecks addon config, each into its own deck"
+        )
 
         self.importButtonBox = QDialogButtonBox()
         self.importButtonBox.addButton(
@@ -35,11 +88,22 @@ class UI:
         )
 
         self.downgradeLingqsBox = QCheckBox("Allow Sync to downgrade LingQs")
+        self.timeBudgetField = QSpinBox()
+        self.timeBudgetField.setRange(0, 24 * 60)
+        self.timeBudgetField.setSuffix(" min")
+        self.timeBudgetField.setSpecialValueText("No time limit")
+        self.requestBudgetField = QSpinBox()
+        self.requestBudgetField.setRange(0, 1000000)
+        self.requestBudgetField.setSuffix(" requests")
+        self.requestBudgetField.setSpecialValueText("No request limit")
         self.syncButtonBox = QDialogButtonBox()
         self.syncButtonBox.addButton(
             QPushButton("Sync to Lingq"), QDialogButtonBox.ButtonRole.AcceptRole
         )
-        self.actionHandler = ActionHandler(mw.addonManager)
+        self.pullButtonBox = QDialogButtonBox()
+        self.pullButtonBox.addButton(
+            QPushButton("Sync from Lingq"), QDialogButtonBox.ButtonRole.AcceptRole
+        )
 
     def Run(self):
         self.dialog = QDialog(mw)
@@ -50,8 +114,10 @@ class UI:
         self.apiKeyField.setPlaceholderText("API Key")
         self.apiKeyField.setText(self.actionHandler.GetApiKey())
         self.languageCodeField.setText(self.actionHandler.GetLanguageCode())
+        self.timeBudgetField.setValue(self.actionHandler.GetSyncTimeBudgetMinutes())
+        self.requestBudgetField.setValue(self.actionHandler.GetSyncRequestBudget())
 
-        self.deckSelector.addItems(self.actionHandler.GetDeckNames())
+        self.deckSelector.SetCurrentDeck(self.actionHandler.GetDeckName())
 
         layout = QVBoxLayout()
         layout.addWidget(QLabel("Enter LingQ API Key:"))
@@ -60,14 +126,21 @@ class UI:
         layout.addWidget(self.importKnownsBox)
         layout.addWidget(QLabel("Select deck to import LingQs into:"))
         layout.addWidget(self.deckSelector)
+        layout.addWidget(self.dryRunBox)
+        layout.addWidget(self.allLanguagesBox)
         layout.addWidget(self.importButtonBox)
         layout.addWidget(self.downgradeLingqsBox)
+        layout.addWidget(QLabel("Stop Sync to Lingq after (the rest syncs next time):"))
+        layout.addWidget(self.timeBudgetField)
+        layout.addWidget(self.requestBudgetField)
         layout.addWidget(self.syncButtonBox)
+        layout.addWidget(self.pullButtonBox)
         self.dialog.setLayout(layout)
 
         self.importButtonBox.accepted.connect(self.ImportLingqs)
         self.importButtonBox.rejected.connect(self.dialog.reject)
         self.syncButtonBox.accepted.connect(self.SyncLingqsBackground)
+        self.pullButtonBox.accepted.connect(self.PullLingqsBackground)
 
         self.dialog.exec()
 
@@ -75,74 +148,207 @@ class UI:
         self.ConfigSet()
         deckName = self.deckSelector.currentText()
         importKnowns = self.importKnownsBox.isChecked()
-        op = QueryOp(
-            parent=mw,
-            op=lambda col: self.actionHandler.ImportLingqsToAnki(deckName, importKnowns),
-            success=self.SuccesfulImport,
+        dryRun = self.dryRunBox.isChecked()
+        if self._RefuseAllLanguagesDryRun():
+            return
+        if self.allLanguagesBox.isChecked():
+            self._RunInBackground(
+                "Importing",
+                lambda progress, cancelEvent: self.actionHandler.ImportAllLanguages(
+                    importKnowns, progressCallback=progress
+                ),
+                self.SuccesfulRuns,
+                "Lingq import in progress, please wait.",
+                "Import LingQs",
+            )
+            self.dialog.close()
+            return
+
+        self._RunInBackground(
+            "Importing",
+            lambda progress, cancelEvent: self.actionHandler.ImportLingqsToAnki(
+                deckName,
+                importKnowns,
+                progressCallback=progress,
+                dryRun=dryRun,
+                cancelEvent=cancelEvent,
+            ),
+            self.ShowPlan if dryRun else self.SuccesfulImport,
+            "Lingq import in progress, please wait.",
+            None if dryRun else "Import LingQs",
         )
-        op.with_progress("Lingq import in progress, please wait.").run_in_background()
         self.dialog.close()
 
-    def SuccesfulImport(self, importedLingqsCount):
-        mw.reset()
-        showInfo(f"Import complete on {importedLingqsCount} lingqs!")
+    def _RefuseAllLanguagesDryRun(self) -> bool:
+        """A dry run only plans the selected deck, so rather than silently planning
+        that one when every language is checked, ask to pick one of the two
+        """
+        if not (self.allLanguagesBox.isChecked() and self.dryRunBox.isChecked()):
+            return False
+        showInfo(
+            "A dry run only plans the selected deck. Uncheck \"Every language\" to plan "
+            "it, or uncheck \"Dry run\" to run every language."
+        )
+        return True
+
+    def _RunInBackground(self, phase, func, success, label, undoName=None):
+        """Run func(progressCallback, cancelEvent) in the background while polling its
+        progress from the main thread at a fixed rate. Closing the progress window
+        sets the cancel event.
+
+        With an undoName the run is a collection operation: its changes are merged into
+        one undo step and anki refreshes only what they touched
+        """
+        progress = ProgressReporter(phase)
+        cancelEvent = threading.Event()
+        timer = QTimer(mw)
+
+        def PollProgress():
+            if mw.progress.want_cancel():
+                cancelEvent.set()
+            current, total = progress.GetValues()
+            label = progress.GetLabel()
+            if cancelEvent.is_set():
+                label += "<br>Stopping..."
+            mw.progress.update(label=label, value=current, max=total)
+
+        def OnSuccess(result):
+            timer.stop()
+            success(result)
+
+        def OnFailure(exception):
+            timer.stop()
+            show_exception(parent=mw, exception=exception)
+
+        def Run():
+            # A background prefetch holds its requests back until this is done
+            with userActions.UserAction():
+                return func(progress, cancelEvent)
+
+        def CollectionWork(col):
+            undoEntry = col.add_custom_undo_entry(undoName)
+            try:
+                result = Run()
+            finally:
+                changes = col.merge_undo_entries(undoEntry)
+            return _ResultWithChanges(result, changes)
+
+        timer.timeout.connect(PollProgress)
+        timer.start(_progressPollMs)
+        if undoName is None:
+            op = QueryOp(parent=mw, op=lambda col: Run(), success=OnSuccess)
+            op.failure(OnFailure).with_progress(label).run_in_background()
+        else:
+            op = CollectionOp(parent=mw, op=CollectionWork)
+            op.success(lambda opResult: OnSuccess(opResult.result)).failure(OnFailure)
+            op.run_in_background()
+
+    def SuccesfulImport(self, report):
+        showInfo(f"Import complete on {report.counts['imported']} lingqs!\n\n{report.Summary()}")
 
     def ConfigSet(self):
         apiKey = self.apiKeyField.text()
         languageCode = self.languageCodeField.text()
         self.actionHandler.SetConfigs(apiKey, languageCode)
+        self.actionHandler.SetDeckName(self.deckSelector.currentText())
+        self.actionHandler.SetSyncBudget(
+            self.timeBudgetField.value(), self.requestBudgetField.value()
+        )
 
     def SyncLingqsBackground(self):
         self.ConfigSet()
         deckName = self.deckSelector.currentText()
         downgrade = self.downgradeLingqsBox.isChecked()
+        dryRun = self.dryRunBox.isChecked()
+        if self._RefuseAllLanguagesDryRun():
+            return
+        if self.allLanguagesBox.isChecked():
+            self._RunInBackground(
+                "Syncing",
+                lambda progress, cancelEvent: self.actionHandler.SyncAllLanguagesToLingq(
+                    downgrade, progressCallback=progress, cancelEvent=cancelEvent
+                ),
+                self.SuccesfulRuns,
+                "Sync to Lingq in progress, please wait.",
+                "Sync LingQs to LingQ",
+            )
+            self.dialog.close()
+            return
 
-        def ProgressCallback(current, total, word, rateLimitSeconds=None):
-            """
-            Progress callback that handles both normal progress and rate limit notifications
-
-            Args:
-                current: Current progress count
-                total: Total items to process
-                rateLimitSeconds: Integer seconds remaining if we're in a rate limit wait, None otherwise
-            """
-            if rateLimitSeconds:
-                mw.taskman.run_on_main(
-                    lambda: mw.progress.update(
-                        label=f'Syncing {current}/{total} - "{word}" <br><span style="font-weight: bold;">⚠️ LingQ API rate limit - waiting {rateLimitSeconds} seconds</span>',
-                        value=current,
-                        max=total,
-                    )
-                )
-            else:
-                mw.taskman.run_on_main(
-                    lambda: mw.progress.update(
-                        label=f'Syncing {current}/{total} - "{word}"',
-                        value=current,
-                        max=total,
-                    )
-                )
-
-        op = QueryOp(
-            parent=mw,
-            op=lambda col: self.actionHandler.SyncLingqStatusToLingq(
+        self._RunInBackground(
+            "Syncing",
+            lambda progress, cancelEvent: self.actionHandler.SyncLingqStatusToLingq(
                 deckName,
                 downgrade,
-                progressCallback=ProgressCallback,
+                progressCallback=progress,
+                cancelEvent=cancelEvent,
+                dryRun=dryRun,
             ),
-            success=self.SuccesfulSync,
+            self.ShowPlan if dryRun else self.SuccesfulSync,
+            "Sync to Lingq in progress, please wait.",
+            None if dryRun else "Sync LingQs to LingQ",
         )
-        op.with_progress("Sync to Lingq in progress, please wait.").run_in_background()
         self.dialog.close()
 
-    def SuccesfulSync(self, result):
-        mw.reset()
+    def SuccesfulSync(self, report):
+        counts = report.counts
+        message = f"Sync complete! {counts['increased']} lingqs increased and {counts['decreased']} decreased! {counts['ignored']} cards ignored due to missing LingqLevel field"
+        if counts["remaining"]:
+            message += f" Stopped early, {counts['remaining']} updates are left for the next sync."
+        showInfo(f"{message}\n\n{report.Summary()}")
+
+    def ShowPlan(self, plan):
+        minutes = round(plan.estimatedSeconds / 60)
         showInfo(
-            f"Sync complete! {result[0]} lingqs increased and {result[1]} decreased! {result[2]} cards ignored due to missing LingqLevel field"
+            "Dry run complete, nothing was changed.\n\n"
+            f"Notes to create: {plan.notesToCreate}\n"
+            f"Lingqs to increase: {plan.upgrades}\n"
+            f"Lingqs to decrease: {plan.downgrades}\n"
+            f"Cards ignored: {plan.ignored}\n"
+            f"GET requests: {plan.getRequests}\n"
+            f"PATCH requests: up to {plan.patchRequests}\n"
+            f"Estimated LingQ time: about {minutes} minutes"
         )
 
+    def PullLingqsBackground(self):
+        self.ConfigSet()
+        deckName = self.deckSelector.currentText()
+        downgrade = self.downgradeLingqsBox.isChecked()
+        if self.allLanguagesBox.isChecked():
+            self._RunInBackground(
+                "Syncing",
+                lambda progress, cancelEvent: self.actionHandler.SyncAllLanguagesFromLingq(
+                    downgrade
+                ),
+                self.SuccesfulRuns,
+                "Sync from Lingq in progress, please wait.",
+                "Sync LingQs from LingQ",
+            )
+            self.dialog.close()
+            return
+
+        self._RunInBackground(
+            "Syncing",
+            lambda progress, cancelEvent: self.actionHandler.SyncLingqStatusFromLingq(
+                deckName, downgrade
+            ),
+            self.SuccesfulPull,
+            "Sync from Lingq in progress, please wait.",
+            "Sync LingQs from LingQ",
+        )
+        self.dialog.close()
+
+    def SuccesfulPull(self, report):
+        message = f"Sync complete! {report.counts['increased']} cards increased and {report.counts['decreased']} decreased to match their LingQ level!"
+        if report.counts["orphaned"]:
+            message += f" {report.counts['orphaned']} notes whose lingq was deleted are left out of syncs."
+        showInfo(f"{message}\n\n{report.Summary()}")
 
-def InitializeAnkiMenu():
-    action = QAction("Import LingQs from LingQ.com", mw)
-    action.triggered.connect(lambda: UI().Run())
-    mw.form.menuTools.addAction(action)
+    def SuccesfulRuns(self, reports):
+        lines = [
+            f"{report.languageCode} ({report.deckName}): "
+            + ", ".join(f"{count} {name}" for name, count in report.counts.items())
+            for report in reports
+        ]
+        summaries = "\n\n".join(report.Summary() for report in reports)
+        showInfo("Complete!\n\n" + "\n".join(lines) + "\n\n" + summaries)
@@ -0,0 +1,248 @@
+"""Local stand-in for the LingQ /api/v3/<lang>/cards endpoints.
+
+Serves a deterministic synthetic vocabulary of any size, with configurable latency,
+page size limits, rate limiting (429 + Retry-After), server errors and hung
+connections, so that LingqApi throughput and rate limit handling can be measured
+offline and reproducibly. Point LingqApi at it with its baseUrl argument, or the
+"apiBaseUrl" config value.
+
+Run standalone with: python -m Tests.FakeLingqServer --cards 100000 --port 8000
+"""
+
+import argparse
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, abort, jsonify, request
+from waitress.server import create_server
+
+_levelsCycle = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 3)]
+
+
+class FakeLingqServer:
+    def __init__(
+        self,
+        cardCount: int = 1000,
+        apiKey: str = "test_api_key",
+        maxPageSize: int = 1000,
+        latencySeconds: float = 0.0,
+        rateLimitEvery: int = 0,
+        retryAfterSeconds: int = 1,
+        serverErrorRate: float = 0.0,
+        hangEvery: int = 0,
+        hangSeconds: float = 30.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            cardCount: Number of synthetic cards per language, pks run from 1 to cardCount
+            maxPageSize: Larger page_size values are capped to this, like the real API
+            latencySeconds: Added to every response
+            rateLimitEvery: Answer every nth request with a 429, 0 disables
+            retryAfterSeconds: Retry-After header sent with a 429
+            serverErrorRate: Fraction of requests answered with a 503
+            hangEvery: Hold every nth request open for hangSeconds before answering, 0 disables
+        """
+        self.cardCount = cardCount
+        self.apiKey = apiKey
+        self.maxPageSize = maxPageSize
+        self.latencySeconds = latencySeconds
+        self.rateLimitEvery = rateLimitEvery
+        self.retryAfterSeconds = retryAfterSeconds
+        self.serverErrorRate = serverErrorRate
+        self.hangEvery = hangEvery
+        self.hangSeconds = hangSeconds
+
+        self.requestCounts: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._requestNumber = 0
+        self._statusOverrides: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        self._filteredPks: Dict[Tuple[str, Tuple[int, ...]], List[int]] = {}
+        self._server = None
+        self._thread = None
+        self.app = self._CreateApp()
+
+    @property
+    def baseUrl(self) -> str:
+        return f"http://127.0.0.1:{self._server.effective_port}"
+
+    def Start(self, port: int = 0) -> "FakeLingqServer":
+        self._server = create_server(self.app, host="127.0.0.1", port=port, threads=8)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def Stop(self):
+        # Sockets have to be closed from the server's own loop, closing them from
+        # here races with its select() call
+        def CloseAll():
+            for dispatcher in list(self._server._map.values()):
+                dispatcher.close()
+
+        self._server.trigger.pull_trigger(CloseAll)
+        self._thread.join(timeout=5)
+        self._server.task_dispatcher.shutdown(timeout=1)
+
+    def ResetCounts(self):
+        with self._lock:
+            self.requestCounts = {}
+            self._requestNumber = 0
+
+    def GetCard(self, languageCode: str, pk: int) -> dict:
+        status, extendedStatus = self._statusOverrides.get(
+            (languageCode, pk), _levelsCycle[pk % len(_levelsCycle)]
+        )
+        return {
+            "pk": pk,
+            "url": f"/api/v3/{languageCode}/cards/{pk}/",
+            "term": f"{languageCode}_word_{pk}",
+            "fragment": f"A sentence with {languageCode}_word_{pk} in it.",
+            "importance": pk % 4,
+            "status": status,
+            "extended_status": extendedStatus,
+            "notes": "",
+            "audio": None,
+            "words": [f"{languageCode}_word_{pk}"],
+            "tags": [f"tag{pk % 3}"] if pk % 2 else [],
+            # Every tenth card has no hints, like lingqs saved without a translation
+            "hints": [
+                {
+                    "id": pk * 10 + i,
+                    "locale": "en",
+                    "text": f"translation {i + 1} of {pk}",
+                    "term": f"{languageCode}_word_{pk}",
+                    "popularity": (pk * 7 + i) % 50,
+                    "is_google_translate": False,
+                    "flagged": False,
+                }
+                for i in range(0 if pk % 10 == 0 else 1 + pk % 2)
+            ],
+        }
+
+    def _CreateApp(self) -> Flask:
+        app = Flask(__name__)
+
+        @app.before_request
+        def InjectFaults():
+            with self._lock:
+                self._requestNumber += 1
+                requestNumber = self._requestNumber
+                self.requestCounts[request.method] = self.requestCounts.get(request.method, 0) + 1
+                serverError = self._random.random() < self.serverErrorRate
+
+            if request.headers.get("Authorization") != f"Token {self.apiKey}":
+                return jsonify({"detail": "Invalid token."}), 401
+            if self.latencySeconds:
+                time.sleep(self.latencySeconds)
+            if self.hangEvery and requestNumber % self.hangEvery == 0:
+                time.sleep(self.hangSeconds)
+            if self.rateLimitEvery and requestNumber % self.rateLimitEvery == 0:
+                response = jsonify({"detail": "Request was throttled."})
+                response.status_code = 429
+                response.headers["Retry-After"] = str(self.retryAfterSeconds)
+                return response
+            if serverError:
+                return jsonify({"detail": "Service unavailable."}), 503
+            return None
+
+        @app.get("/api/v3/<languageCode>/cards")
+        @app.get("/api/v3/<languageCode>/cards/")
+        def ListCards(languageCode):
+            page = request.args.get("page", 1, type=int)
+            pageSize = min(request.args.get("page_size", 25, type=int), self.maxPageSize)
+            statuses = tuple(sorted(request.args.getlist("status", type=int)))
+
+            pks = self._GetMatchingPks(languageCode, statuses)
+            count = self.cardCount if pks is None else len(pks)
+            start = (page - 1) * pageSize
+            end = min(start + pageSize, count)
+            if pks is None:
+                pagePks = range(start + 1, end + 1)
+            else:
+                pagePks = pks[start:end]
+
+            return jsonify(
+                {
+                    "count": count,
+                    "next": self._PageUrl(page + 1) if end < count else None,
+                    "previous": self._PageUrl(page - 1) if page > 1 else None,
+                    "results": [self.GetCard(languageCode, pk) for pk in pagePks],
+                }
+            )
+
+        @app.get("/api/v3/<languageCode>/cards/<int:pk>/")
+        def GetCardByPk(languageCode, pk):
+            self._CheckPk(pk)
+            return jsonify(self.GetCard(languageCode, pk))
+
+        @app.patch("/api/v3/<languageCode>/cards/<int:pk>/")
+        def PatchCard(languageCode, pk):
+            self._CheckPk(pk)
+            card = self.GetCard(languageCode, pk)
+            status = request.form.get("status", card["status"], type=int)
+            extendedStatus = request.form.get("extended_status", card["extended_status"], type=int)
+            with self._lock:
+                self._statusOverrides[(languageCode, pk)] = (status, extendedStatus)
+                self._filteredPks = {}
+            return jsonify(self.GetCard(languageCode, pk))
+
+        return app
+
+    def _CheckPk(self, pk: int):
+        if not 1 <= pk <= self.cardCount:
+            abort(404)
+
+    def _PageUrl(self, page: int) -> str:
+        args = request.args.to_dict(flat=False)
+        args["page"] = [str(page)]
+        query = "&".join(f"{key}={value}" for key, values in args.items() for value in values)
+        return f"{request.base_url}?{query}"
+
+    def _GetMatchingPks(self, languageCode: str, statuses: Tuple[int, ...]) -> Optional[List[int]]:
+        if not statuses:
+            return None
+
+        key = (languageCode, statuses)
+        with self._lock:
+            if key not in self._filteredPks:
+                self._filteredPks[key] = [
+                    pk
+                    for pk in range(1, self.cardCount + 1)
+                    if self._statusOverrides.get(
+                        (languageCode, pk), _levelsCycle[pk % len(_levelsCycle)]
+                    )[0]
+                    in statuses
+                ]
+            return self._filteredPks[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cards", type=int, default=100000)
+    parser.add_argument("--api-key", default="test_api_key")
+    parser.add_argument("--max-page-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-every", type=int, default=0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    server = FakeLingqServer(
+        cardCount=args.cards,
+        apiKey=args.api_key,
+        maxPageSize=args.max_page_size,
+        latencySeconds=args.latency,
+        rateLimitEvery=args.rate_limit_every,
+        retryAfterSeconds=args.retry_after,
+        serverErrorRate=args.server_error_rate,
+        hangEvery=args.hang_every,
+        hangSeconds=args.hang_seconds,
+    ).Start(args.port)
+    print(f"Fake LingQ API listening on {server.baseUrl}")
+    server._thread.join()
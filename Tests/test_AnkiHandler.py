@@ -1,5 +1,7 @@
 import pytest
+from dataclasses import replace
 from unittest.mock import patch, MagicMock, ANY
+from anki.collection import Collection
 from LingqAnkiSync import AnkiHandler
 from LingqAnkiSync.Models.AnkiCard import AnkiCard
 
@@ -43,6 +45,15 @@ def mockInternalAnkiCard():
     return mock_card
 
 
+@pytest.fixture
+def collection(tmp_path):
+    col = Collection(str(tmp_path / "collection.anki2"))
+    AnkiHandler.UseCollection(col)
+    yield col
+    AnkiHandler.UseCollection(None)
+    col.close()
+
+
 class TestCreateNote:
     @patch("LingqAnkiSync.AnkiHandler.CreateNoteTypeIfNotExist")
     @patch("LingqAnkiSync.AnkiHandler.DoesDuplicateCardExistInDeck")
@@ -66,12 +77,14 @@ class TestCreateNote:
 
         deck_id = 123
         mock_model = MagicMock()
-        mock_mw.col.models.byName.return_value = mock_model
+        mock_mw.col.models.by_name.return_value = mock_model
         mock_mw.col.decks.id.return_value = deck_id
 
         note_id = 456
         mock_note = MagicMock()
         mock_note.id = note_id
+        card_id = 789
+        mock_note.card_ids.return_value = [card_id]
 
         with patch("LingqAnkiSync.AnkiHandler.Note", return_value=mock_note):
             result = AnkiHandler.CreateNote(sampleAnkiCardObject, "test_deck", "es")
@@ -79,10 +92,10 @@ class TestCreateNote:
         assert result
         mock_duplicate_check.assert_called_once_with(sampleAnkiCardObject.primaryKey, "test_deck")
         mock_create_note_type.assert_called_once_with("es")
-        mock_mw.col.models.byName.assert_called_once_with("lingqAnkiSync_es")
+        mock_mw.col.models.by_name.assert_called_once_with("lingqAnkiSync_es")
         mock_mw.col.add_note.assert_called_once_with(mock_note, deck_id)
         mock_mw.col.sched.set_due_date.assert_called_once_with(
-            [note_id], str(sampleAnkiCardObject.interval)
+            [card_id], str(sampleAnkiCardObject.interval)
         )
 
         mock_note.__setitem__.assert_any_call("LingqPK", ANY)
@@ -130,3 +143,246 @@ class TestUpdateCardLevel:
         mock_mw.col.get_card.assert_called_once_with(123)
         mock_note.__setitem__.assert_called_once_with("LingqLevel", "known")
         mock_mw.col.update_note.assert_called_once_with(mock_note)
+
+
+class TestUpdateLevelsAndReschedule:
+    def test_bulk_updates_notes_and_reschedules_per_level(
+        self, collection, sampleAnkiCardObject
+    ):
+        levelToInterval = {"new": 0, "recognized": 5, "familiar": 13, "learned": 34, "known": 85}
+        cards = [replace(sampleAnkiCardObject, primaryKey=pk) for pk in (100, 200, 300)]
+        AnkiHandler.CreateNotesFromCards(cards, "test_deck", "es")
+
+        with patch.object(collection, "update_notes", wraps=collection.update_notes) as updateNotes, patch.object(
+            collection.sched, "set_due_date", wraps=collection.sched.set_due_date
+        ) as setDueDate:
+            updated = AnkiHandler.UpdateLevelsAndReschedule(
+                "test_deck", {100: "known", 300: "known", 999: "new"}, levelToInterval
+            )
+
+        assert updated == 2
+        updateNotes.assert_called_once()
+        assert sorted(note["LingqPK"] for note in updateNotes.call_args[0][0]) == ["100", "300"]
+        setDueDate.assert_called_once_with(ANY, "85-170!")
+        assert len(setDueDate.call_args[0][0]) == 2
+        assert AnkiHandler.GetLingqLevelsInDeck("test_deck") == {
+            100: "known",
+            200: "recognized",
+            300: "known",
+        }
+
+
+class TestWithCollection:
+    def test_created_notes_read_back_from_deck(self, collection, sampleAnkiCardObject):
+        assert AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es") == 1
+        # Importing again skips the existing lingq
+        assert AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es") == 0
+
+        cards = AnkiHandler.GetAllCardsInDeck("test_deck")
+
+        assert len(cards) == 1
+        assert cards[0].primaryKey == sampleAnkiCardObject.primaryKey
+        assert cards[0].level == "recognized"
+        assert cards[0].interval == sampleAnkiCardObject.interval
+        assert AnkiHandler.GetLingqLevelsInDeck("test_deck") == {12345: "recognized"}
+
+    def test_batch_import_skips_repeated_lingqs(self, collection, sampleAnkiCardObject):
+        assert (
+            AnkiHandler.CreateNotesFromCards(
+                [sampleAnkiCardObject, sampleAnkiCardObject], "test_deck", "es"
+            )
+            == 1
+        )
+
+    def test_update_levels_keeps_schedule(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es")
+
+        updated = AnkiHandler.UpdateLevels("test_deck", {12345: "familiar", 999: "known"})
+
+        assert updated == 1
+        assert AnkiHandler.GetLingqLevelsInDeck("test_deck") == {12345: "familiar"}
+        assert AnkiHandler.GetAllCardsInDeck("test_deck")[0].interval == sampleAnkiCardObject.interval
+
+
+class TestReconcileOrphans:
+    def test_suspends_orphans_and_restores_them(self, collection, sampleAnkiCardObject):
+        cards = [replace(sampleAnkiCardObject, primaryKey=pk) for pk in (1, 2, 3)]
+        AnkiHandler.CreateNotesFromCards(cards, "test_deck", "es")
+
+        assert AnkiHandler.ReconcileOrphans("test_deck", "es", {1, 3}, "suspend") == (1, 0)
+        assert collection.find_cards("is:suspended LingqPK:2") != []
+        assert [card.primaryKey for card in AnkiHandler.GetCardsInDeck("test_deck", [1, 2])] == [1]
+
+        assert AnkiHandler.ReconcileOrphans("test_deck", "es", {1, 2, 3}, "suspend") == (0, 1)
+        assert collection.find_cards("is:suspended") == []
+        assert collection.find_notes(f"tag:{AnkiHandler.ORPHAN_TAG}") == []
+
+    def test_leaves_other_languages_in_the_deck_alone(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards(
+            [replace(sampleAnkiCardObject, primaryKey=1)], "test_deck", "es"
+        )
+        AnkiHandler.CreateNotesFromCards(
+            [replace(sampleAnkiCardObject, primaryKey=2)], "test_deck", "fr"
+        )
+
+        assert AnkiHandler.ReconcileOrphans("test_deck", "es", {1}, "delete") == (0, 0)
+        assert AnkiHandler.GetLingqLevelsInDeck("test_deck").keys() == {1, 2}
+
+    def test_restore_keeps_cards_the_user_suspended(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards(
+            [replace(sampleAnkiCardObject, primaryKey=1)], "test_deck", "es"
+        )
+        collection.sched.suspend_cards(collection.find_cards("LingqPK:1"))
+
+        AnkiHandler.ReconcileOrphans("test_deck", "es", {2}, "suspend")
+        assert AnkiHandler.ReconcileOrphans("test_deck", "es", {1, 2}, "suspend") == (0, 1)
+
+        assert collection.find_cards("is:suspended LingqPK:1") != []
+
+    def test_unknown_action(self, collection):
+        with pytest.raises(ValueError):
+            AnkiHandler.ReconcileOrphans("test_deck", "es", {1}, "archive")
+
+
+class TestRepositionNewCards:
+    def CreateNewCards(self, sampleAnkiCardObject):
+        cards = [
+            replace(sampleAnkiCardObject, primaryKey=pk, level="new", interval=0, importance=importance)
+            for pk, importance in ((1, 1), (2, 3), (3, 2), (4, 3))
+        ]
+        AnkiHandler.CreateNotesFromCards(cards, "test_deck", "es", keepNewCards=True)
+
+    def NewCardPks(self, collection):
+        return [
+            int(collection.get_card(cardId).note()["LingqPK"])
+            for cardId in collection.find_cards("is:new", order="c.due")
+        ]
+
+    def test_new_lingqs_can_stay_new_cards(self, collection, sampleAnkiCardObject):
+        self.CreateNewCards(sampleAnkiCardObject)
+
+        assert self.NewCardPks(collection) == [1, 2, 3, 4]
+
+    def test_by_importance(self, collection, sampleAnkiCardObject):
+        self.CreateNewCards(sampleAnkiCardObject)
+
+        repositioned = AnkiHandler.RepositionNewCards(
+            "test_deck", {1: 0, 2: 0, 3: 0, 4: 10}, "importance"
+        )
+
+        assert repositioned == 4
+        assert self.NewCardPks(collection) == [4, 2, 3, 1]
+
+    def test_by_frequency(self, collection, sampleAnkiCardObject):
+        self.CreateNewCards(sampleAnkiCardObject)
+
+        AnkiHandler.RepositionNewCards("test_deck", {1: 30, 2: 0, 3: 30, 4: 5}, "frequency")
+
+        assert self.NewCardPks(collection) == [3, 1, 4, 2]
+
+    def test_other_new_cards_keep_their_position(self, collection, sampleAnkiCardObject):
+        self.CreateNewCards(sampleAnkiCardObject)
+
+        # Only lingqs 2 and 4 were in this import, 4 is more popular
+        repositioned = AnkiHandler.RepositionNewCards("test_deck", {2: 1, 4: 10}, "frequency")
+
+        assert repositioned == 2
+        assert self.NewCardPks(collection) == [1, 4, 3, 2]
+
+    def test_unknown_order(self, collection):
+        with pytest.raises(ValueError):
+            AnkiHandler.RepositionNewCards("test_deck", {}, "alphabetical")
+
+
+class TestMergeTranslations:
+    def test_appends_only_missing_translations(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es")
+
+        merged = AnkiHandler.MergeTranslations(
+            "test_deck", {12345: ["Test_Translation1", "test_translation3"], 999: ["other"]}
+        )
+
+        assert merged == 1
+        assert AnkiHandler.GetAllCardsInDeck("test_deck")[0].translations == [
+            "1. test_translation1<br>2. test_translation2<br>3. test_translation3"
+        ]
+        assert AnkiHandler.MergeTranslations("test_deck", {12345: ["test_translation3"]}) == 0
+
+    def test_terms_in_deck(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es")
+
+        assert AnkiHandler.GetLingqTermsInDeck("test_deck") == {12345: "test_word"}
+
+
+class TestLingqGuids:
+    def test_imported_notes_get_lingq_guids(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es")
+
+        assert collection.db.list("select guid from notes") == ["lingq-es-12345"]
+        assert list(AnkiHandler.FindNotesByPrimaryKey("es", [12345, 1])) == [12345]
+        assert AnkiHandler.GetPrimaryKeysWithGuid("es") == {12345}
+
+    def test_lingq_in_another_deck_keeps_a_random_guid(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "deck_a", "es")
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "deck_b", "es")
+
+        guids = collection.db.list("select guid from notes order by id")
+        assert guids[0] == "lingq-es-12345"
+        assert guids[1] != guids[0]
+        cardsInDeckB = AnkiHandler.GetCardsInDeck("deck_b", [12345], "es")
+        assert [card.primaryKey for card in cardsInDeckB] == [12345]
+
+    def test_existing_notes_are_migrated_once(self, collection, sampleAnkiCardObject):
+        cards = [replace(sampleAnkiCardObject, primaryKey=pk) for pk in (1, 2)]
+        AnkiHandler.CreateNotesFromCards(cards, "test_deck", "es")
+        collection.db.execute("update notes set guid = 'old' || id")
+
+        assert AnkiHandler.EnsureLingqGuids("es") == 2
+        assert sorted(collection.db.list("select guid from notes")) == ["lingq-es-1", "lingq-es-2"]
+
+        collection.db.execute("update notes set guid = 'old' || id")
+        assert AnkiHandler.EnsureLingqGuids("es") == 0
+
+    def test_cards_in_deck_by_guid(self, collection, sampleAnkiCardObject):
+        cards = [replace(sampleAnkiCardObject, primaryKey=pk) for pk in (1, 2, 3)]
+        AnkiHandler.CreateNotesFromCards(cards, "test_deck", "es")
+
+        found = AnkiHandler.GetCardsInDeck("test_deck", [1, 3, 4], "es")
+
+        assert sorted(card.primaryKey for card in found) == [1, 3]
+
+
+class TestRefreshNotes:
+    def test_rewrites_only_changed_notes(self, collection, sampleAnkiCardObject):
+        cards = [replace(sampleAnkiCardObject, primaryKey=pk) for pk in (1, 2, 3)]
+        AnkiHandler.CreateNotesFromCards(cards, "test_deck", "es")
+        cards[1] = replace(cards[1], translations=["new translation"])
+
+        assert AnkiHandler.RefreshNotes("test_deck", "es", cards) == 1
+        assert AnkiHandler.GetCardsInDeck("test_deck", [2])[0].translations == [
+            "1. new translation"
+        ]
+        assert AnkiHandler.RefreshNotes("test_deck", "es", cards) == 0
+
+    def test_edits_in_anki_stay_until_the_lingq_changes(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es")
+        note = collection.get_note(collection.find_notes("")[0])
+        note["Sentence"] = "My own sentence"
+        collection.update_note(note)
+
+        assert AnkiHandler.RefreshNotes("test_deck", "es", [sampleAnkiCardObject]) == 0
+        changedCard = replace(sampleAnkiCardObject, word="new_word")
+        assert AnkiHandler.RefreshNotes("test_deck", "es", [changedCard]) == 1
+        assert collection.get_note(note.id)["Sentence"] == sampleAnkiCardObject.sentence
+
+    def test_note_type_without_hash_field(self, collection, sampleAnkiCardObject):
+        AnkiHandler.CreateNotesFromCards([sampleAnkiCardObject], "test_deck", "es")
+        model = collection.models.by_name("lingqAnkiSync_es")
+        collection.models.remove_field(model, model["flds"][-1])
+        collection.models.update_dict(model)
+
+        assert AnkiHandler.RefreshNotes("test_deck", "es", [sampleAnkiCardObject]) == 0
+        changedCard = replace(sampleAnkiCardObject, sentence="A new sentence.")
+        assert AnkiHandler.RefreshNotes("test_deck", "es", [changedCard]) == 1
+        note = collection.get_note(collection.find_notes("")[0])
+        assert note["LingqHash"] == AnkiHandler.ContentHash(changedCard)
@@ -0,0 +1,181 @@
+import pytest
+from unittest.mock import Mock, patch
+from anki.collection import Collection
+from LingqAnkiSync import AnkiHandler
+from LingqAnkiSync.AutoSync import AutoSync, AutoSyncQueue
+from LingqAnkiSync.UIActionHandler import ActionHandler
+from Tests.FakeLingqServer import FakeLingqServer
+
+
+class FakeTimer:
+    """Only fires when the test says so"""
+
+    created = []
+
+    def __init__(self, seconds, func):
+        self.seconds = seconds
+        self.func = func
+        self.cancelled = False
+        self.started = False
+        FakeTimer.created.append(self)
+
+    def start(self):
+        self.started = True
+
+    def cancel(self):
+        self.cancelled = True
+
+    @classmethod
+    def FireLatest(cls):
+        timer = cls.created[-1]
+        assert timer.started and not timer.cancelled
+        timer.func()
+
+
+@pytest.fixture(autouse=True)
+def resetTimers():
+    FakeTimer.created = []
+
+
+class TestAutoSyncQueue:
+    def test_add_debounces_into_one_batch(self):
+        flush = Mock()
+        queue = AutoSyncQueue(flush, 30, FakeTimer)
+
+        queue.Add("es", 1)
+        queue.Add("es", 2)
+        queue.Add("de", 1)
+
+        assert [timer.cancelled for timer in FakeTimer.created] == [True, True, False]
+        assert FakeTimer.created[-1].seconds == 30
+        FakeTimer.FireLatest()
+        flush.assert_called_once_with({"es": {1, 2}, "de": {1}})
+        assert queue.pendingCount == 0
+
+    def test_flushes_never_overlap(self):
+        batches = []
+        queue = None
+
+        def Flush(batch):
+            batches.append(batch)
+            if len(batches) == 1:
+                # Reviews during the flush, and its timer firing before the flush is done
+                queue.Add("es", 2)
+                FakeTimer.FireLatest()
+
+        queue = AutoSyncQueue(Flush, 30, FakeTimer)
+        queue.Add("es", 1)
+        FakeTimer.FireLatest()
+
+        assert batches == [{"es": {1}}]
+        # The flush rearmed the timer for what was added meanwhile
+        FakeTimer.FireLatest()
+        assert batches == [{"es": {1}}, {"es": {2}}]
+
+    def test_failed_batch_waits_for_the_next_review(self):
+        flush = Mock(side_effect=[ConnectionError(), None])
+        queue = AutoSyncQueue(flush, 30, FakeTimer)
+
+        queue.Add("es", 1)
+        FakeTimer.FireLatest()
+        timersAfterFailure = len(FakeTimer.created)
+
+        assert queue.pendingCount == 1
+        queue.Add("es", 2)
+        assert len(FakeTimer.created) == timersAfterFailure + 1
+        FakeTimer.FireLatest()
+        assert flush.call_args[0][0] == {"es": {1, 2}}
+
+    def test_cancel(self):
+        flush = Mock()
+        queue = AutoSyncQueue(flush, 30, FakeTimer)
+
+        queue.Add("es", 1)
+        queue.Cancel()
+
+        assert FakeTimer.created[-1].cancelled
+        assert queue.pendingCount == 0
+
+
+@pytest.fixture
+def fakeServer():
+    server = FakeLingqServer(cardCount=20).Start()
+    yield server
+    server.Stop()
+
+
+@pytest.fixture
+def collection(tmp_path):
+    col = Collection(str(tmp_path / "collection.anki2"))
+    AnkiHandler.UseCollection(col)
+    yield col
+    AnkiHandler.UseCollection(None)
+    col.close()
+
+
+@pytest.fixture
+def autoSync(fakeServer, collection):
+    addonManager = Mock()
+    addonManager.getConfig.return_value = {
+        "apiKey": fakeServer.apiKey,
+        "apiBaseUrl": fakeServer.baseUrl,
+        "languageCode": "es",
+        "deckName": "Spanish",
+        "autoSync": True,
+    }
+    actionHandler = ActionHandler(addonManager)
+    with patch("LingqAnkiSync.UIActionHandler.UserFiles"):
+        actionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        fakeServer.ResetCounts()
+        yield AutoSync(actionHandler, timerFactory=FakeTimer)
+
+
+def Review(collection, pk, days):
+    cardId = collection.find_cards(f'deck:"Spanish" LingqPK:{pk}')[0]
+    collection.sched.set_due_date([cardId], f"{days}!")
+    return collection.get_card(cardId)
+
+
+class TestAutoSync:
+    def test_pushes_cards_that_crossed_a_level(self, autoSync, collection, fakeServer):
+        # pk 1 is recognized, a long interval moves it up. pk 2 is familiar and stays
+        autoSync.OnCardAnswered(Review(collection, 1, 200))
+        autoSync.OnCardAnswered(Review(collection, 2, 14))
+
+        assert autoSync.queue.pendingCount == 1
+        assert fakeServer.requestCounts == {}
+
+        FakeTimer.FireLatest()
+
+        assert fakeServer.GetCard("es", 1)["status"] > 1
+        assert fakeServer.requestCounts == {"GET": 1, "PATCH": 1}
+        assert AnkiHandler.GetLingqLevelsInDeck("Spanish")[1] == "familiar"
+
+    def test_ignores_cards_of_other_decks(self, autoSync, collection):
+        AnkiHandler.CreateNotesFromCards(
+            AnkiHandler.GetCardsInDeck("Spanish", [1]), "Other deck", "es"
+        )
+        cardId = collection.find_cards('deck:"Other deck"')[0]
+        collection.sched.set_due_date([cardId], "200!")
+
+        autoSync.OnCardAnswered(collection.get_card(cardId))
+
+        assert autoSync.queue.pendingCount == 0
+
+    def test_lingq_is_not_asked_while_on_the_collection(self, autoSync, collection, fakeServer):
+        requestsDuringCollectionWork = []
+
+        def RunOnCollection(work):
+            before = dict(fakeServer.requestCounts)
+            result = work()
+            requestsDuringCollectionWork.append(fakeServer.requestCounts != before)
+            return result
+
+        autoSync = AutoSync(autoSync.actionHandler, RunOnCollection, FakeTimer)
+        autoSync.OnCardAnswered(Review(collection, 1, 200))
+        FakeTimer.FireLatest()
+
+        # Reading the cards and writing back their levels, with the push in between
+        assert requestsDuringCollectionWork == [False, False]
+        assert fakeServer.requestCounts == {"GET": 1, "PATCH": 1}
+        assert AnkiHandler.GetLingqLevelsInDeck("Spanish")[1] == "familiar"
@@ -0,0 +1,198 @@
+import json
+import pytest
+from anki.collection import Collection
+from LingqAnkiSync import Cli
+from LingqAnkiSync.Cli import CliJob
+from LingqAnkiSync.Config import JsonConfigStore
+from Tests.FakeLingqServer import FakeLingqServer
+
+
+@pytest.fixture
+def fakeServer():
+    server = FakeLingqServer(cardCount=50).Start()
+    yield server
+    server.Stop()
+
+
+@pytest.fixture(autouse=True)
+def userFiles(tmp_path, monkeypatch):
+    monkeypatch.setattr("LingqAnkiSync.UserFiles._userFilesDir", str(tmp_path / "user_files"))
+
+
+def WriteConfig(path, fakeServer, **values):
+    config = {"apiKey": fakeServer.apiKey, "apiBaseUrl": fakeServer.baseUrl, **values}
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def CountNotes(collectionPath, deckName):
+    collection = Collection(collectionPath)
+    try:
+        return len(collection.find_notes(f'deck:"{deckName}"'))
+    finally:
+        collection.close()
+
+
+class TestJsonConfigStore:
+    def test_falls_back_to_addon_defaults(self, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({"apiKey": "key"}))
+
+        config = JsonConfigStore(str(path)).getConfig(__name__)
+
+        assert config["apiKey"] == "key"
+        assert config["syncRequestBudget"] == 0
+
+    def test_overrides_are_not_written_back(self, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({"languageCode": "es"}))
+        store = JsonConfigStore(str(path), {"languageCode": "de", "deckName": "German"})
+
+        config = store.getConfig(__name__)
+        config["apiKey"] = "new key"
+        store.writeConfig(__name__, config)
+
+        assert config["languageCode"] == "de"
+        stored = json.loads(path.read_text())
+        assert stored["languageCode"] == "es"
+        assert stored["apiKey"] == "new key"
+        assert "deckName" not in stored
+
+    def test_defaults_are_not_written_back(self, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({"apiKey": "key"}))
+        store = JsonConfigStore(str(path), defaults={"sharedRateLimit": True, "prefetch": True})
+
+        config = store.getConfig(__name__)
+        config["prefetch"] = False
+        store.writeConfig(__name__, config)
+
+        assert config["sharedRateLimit"] is True
+        stored = json.loads(path.read_text())
+        assert "sharedRateLimit" not in stored
+        assert stored["prefetch"] is False
+
+    def test_failed_write_keeps_the_file_whole(self, tmp_path, monkeypatch):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({"apiKey": "key"}))
+        store = JsonConfigStore(str(path))
+
+        def FailingDump(value, f, **kwargs):
+            f.write('{"apiKey": ')
+            raise OSError("disk full")
+
+        monkeypatch.setattr("LingqAnkiSync.Config.json.dump", FailingDump)
+        with pytest.raises(OSError):
+            store.writeConfig(__name__, {"apiKey": "new key"})
+
+        assert json.loads(path.read_text()) == {"apiKey": "key"}
+        assert [p.name for p in tmp_path.iterdir()] == ["config.json"]
+
+
+class TestCli:
+    def test_run_jobs_imports_each_language_into_its_deck(self, tmp_path, fakeServer):
+        collectionPath = str(tmp_path / "collection.anki2")
+        job = CliJob(
+            collectionPath,
+            WriteConfig(tmp_path / "config.json", fakeServer),
+            ["import", "pull"],
+            decks={"es": "Spanish", "de": "German"},
+            importKnowns=True,
+        )
+
+        results = Cli.RunJobs([job])
+
+        assert [result["error"] for result in results] == [None, None]
+        assert [result["languageCode"] for result in results] == ["es", "de"]
+        assert [report["operation"] for report in results[0]["reports"]] == [
+            "import",
+            "syncFromLingq",
+        ]
+        assert results[0]["reports"][0]["counts"]["imported"] == 45
+        assert CountNotes(collectionPath, "Spanish") == 45
+        assert CountNotes(collectionPath, "German") == 45
+
+    def test_main_runs_collections_in_parallel_workers(self, tmp_path, fakeServer):
+        jobs = []
+        for learner in ("alice", "bob"):
+            jobs.append(
+                {
+                    "collection": str(tmp_path / f"{learner}.anki2"),
+                    "config": WriteConfig(
+                        tmp_path / f"{learner}.json",
+                        fakeServer,
+                        languageCode="es",
+                        deckName=f"{learner} Spanish",
+                    ),
+                    "operations": ["import"],
+                }
+            )
+        jobsPath = tmp_path / "jobs.json"
+        jobsPath.write_text(json.dumps(jobs))
+        outputPath = tmp_path / "results.json"
+
+        exitCode = Cli.main(
+            ["--jobs", str(jobsPath), "--workers", "2", "--output", str(outputPath)]
+        )
+
+        assert exitCode == 0
+        assert CountNotes(jobs[0]["collection"], "alice Spanish") == 45
+        assert CountNotes(jobs[1]["collection"], "bob Spanish") == 45
+        assert len(json.loads(outputPath.read_text())) == 2
+
+    def test_export_then_import_from_snapshot(self, tmp_path, fakeServer):
+        collectionPath = str(tmp_path / "collection.anki2")
+        configPath = WriteConfig(tmp_path / "config.json", fakeServer, languageCode="es")
+        snapshotDir = tmp_path / "snapshots"
+        snapshotDir.mkdir()
+
+        Cli.RunJobs([CliJob(collectionPath, configPath, ["export"], snapshotDir=str(snapshotDir))])
+        fakeServer.ResetCounts()
+        results = Cli.RunJobs(
+            [
+                CliJob(
+                    collectionPath,
+                    configPath,
+                    ["import"],
+                    decks={"es": "Spanish"},
+                    snapshotDir=str(snapshotDir),
+                )
+            ]
+        )
+
+        assert results[0]["error"] is None
+        assert (snapshotDir / "es.ndjson.gz").exists()
+        assert CountNotes(collectionPath, "Spanish") == 45
+        assert fakeServer.requestCounts == {}
+
+    def test_failed_job_is_reported(self, tmp_path, fakeServer, capsys):
+        configPath = WriteConfig(tmp_path / "config.json", fakeServer, languageCode="zz")
+
+        exitCode = Cli.main(
+            ["--collection", str(tmp_path / "collection.anki2"), "--config", configPath, "pull"]
+        )
+
+        assert exitCode == 1
+        assert 'Language code "zz" is not valid' in capsys.readouterr().err
+
+    def test_jobs_share_the_rate_limit(self, tmp_path, fakeServer):
+        collectionPath = str(tmp_path / "collection.anki2")
+        configPath = WriteConfig(tmp_path / "config.json", fakeServer, languageCode="es")
+
+        Cli.RunJobs([CliJob(collectionPath, configPath, ["import"], decks={"es": "Spanish"})])
+
+        assert (tmp_path / "user_files" / "rateLimit.sqlite").exists()
+
+    def test_job_without_languages_fails(self, tmp_path, fakeServer, capsys):
+        configPath = WriteConfig(tmp_path / "config.json", fakeServer)
+
+        exitCode = Cli.main(
+            ["--collection", str(tmp_path / "collection.anki2"), "--config", configPath, "pull"]
+        )
+
+        assert exitCode == 1
+        assert "No languages to run" in capsys.readouterr().err
+
+    def test_requires_a_job(self):
+        with pytest.raises(SystemExit):
+            Cli.main(["--collection", "collection.anki2"])
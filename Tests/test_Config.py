@@ -1,4 +1,7 @@
 from LingqAnkiSync.Config import Config
+from LingqAnkiSync.Models.ImportFilter import ImportFilter
+from LingqAnkiSync.Models.PageSizeModel import PageSizeModel
+from LingqAnkiSync.Models.RateLimitModel import RateLimitModel
 import pytest
 
 
@@ -29,10 +32,32 @@ class TestGets:
         result = Config(addonManager).GetLanguageCode()
         assert result == "testLanguageCode"
 
+    def test_should_get_empty_deck_name_when_never_set(self, addonManager):
+        result = Config(addonManager).GetDeckName()
+        assert result == ""
+
     def test_should_get_default_level_to_interval(self, addonManager):
         result = Config(addonManager).GetLevelToInterval()
         assert result == {"new": 0, "recognized": 5, "familiar": 13, "learned": 34, "known": 85}
 
+    def test_language_decks_default_to_single_language(self, addonManager):
+        addonManager.getConfig = lambda name: {"languageCode": "es", "deckName": "Spanish"}
+        assert Config(addonManager).GetLanguageDecks() == {"es": "Spanish"}
+
+    def test_should_get_language_decks(self, addonManager):
+        addonManager.getConfig = lambda name: {
+            "languageCode": "es",
+            "languageDecks": {"de": "German", "fr": "French"},
+        }
+        assert Config(addonManager).GetLanguageDecks() == {"de": "German", "fr": "French"}
+
+    def test_import_filter_defaults_to_everything(self, addonManager):
+        assert Config(addonManager).GetImportFilter().IsEmpty()
+
+    def test_should_get_import_filter(self, addonManager):
+        addonManager.getConfig = lambda name: {"importFilter": {"minImportance": 2, "levels": ["new"]}}
+        assert Config(addonManager).GetImportFilter() == ImportFilter(minImportance=2, levels=["new"])
+
 
 class TestSets:
     def test_should_set_api_key(self, addonManager):
@@ -42,3 +67,67 @@ class TestSets:
     def test_should_set_language_code(self, addonManager):
         Config(addonManager).SetLanguageCode("testSetLanguageCode")
         assert addonManager.itemSet["languageCode"] == "testSetLanguageCode"
+
+    def test_should_set_deck_name(self, addonManager):
+        Config(addonManager).SetDeckName("testDeck")
+        assert addonManager.itemSet["deckName"] == "testDeck"
+
+    def test_should_set_import_filter(self, addonManager):
+        Config(addonManager).SetImportFilter(ImportFilter(excludeTags=["names"]))
+        assert addonManager.itemSet["importFilter"]["excludeTags"] == ["names"]
+
+        Config(addonManager).SetImportFilter(ImportFilter())
+        assert addonManager.itemSet["importFilter"] is None
+
+    def test_should_set_rate_limit_model(self, addonManager):
+        Config(addonManager).SetRateLimitModel(RateLimitModel(1.5, 0.25, 10))
+        assert addonManager.itemSet["rateLimitModel"] == {
+            "secondsPerRequest": 1.5,
+            "throttleSecondsPerRequest": 0.25,
+            "observedRequests": 10,
+        }
+
+
+class TestRateLimitModel:
+    def test_should_default_when_nothing_persisted(self, addonManager):
+        assert Config(addonManager).GetRateLimitModel() == RateLimitModel()
+
+    def test_first_observation_replaces_defaults(self):
+        model = RateLimitModel()
+        model.Observe(requestCount=10, requestSeconds=5, throttleSeconds=20)
+        assert model.secondsPerRequest == 0.5
+        assert model.throttleSecondsPerRequest == 2.0
+        assert model.EstimateSeconds(100) == 250
+
+    def test_later_observations_are_blended(self):
+        model = RateLimitModel(secondsPerRequest=1.0, throttleSecondsPerRequest=0, observedRequests=10)
+        model.Observe(requestCount=10, requestSeconds=20, throttleSeconds=0)
+        assert model.secondsPerRequest == pytest.approx(1.3)
+        assert model.observedRequests == 20
+
+
+class TestPageSizeModel:
+    def test_is_kept_per_language(self, addonManager):
+        config = Config(addonManager)
+        config.SetPageSizeModel("es", PageSizeModel(400, 500))
+
+        assert config.GetPageSizeModel("es") == PageSizeModel(400, 500)
+        assert config.GetPageSizeModel("de") == PageSizeModel()
+        assert addonManager.itemSet["pageSizeModels"] == {
+            "es": {"pageSize": 400, "maxPageSize": 500}
+        }
+
+    def test_grows_only_where_pages_line_up(self):
+        model = PageSizeModel(pageSize=200, maxPageSize=500)
+        model.Grow(cardsRead=200)
+        assert model.pageSize == 200
+        model.Grow(cardsRead=400)
+        assert model.pageSize == 400
+        model.Grow(cardsRead=1200)
+        assert model.pageSize == 400
+
+    def test_shrinks_by_a_factor_of_the_page_size(self):
+        model = PageSizeModel(pageSize=75)
+        assert model.Shrink()
+        assert model.pageSize == 25
+        assert not model.Shrink()
@@ -65,6 +65,11 @@ class TestlevelToInterval:
         assert resultStatus >= 0
         assert resultStatus <= 100
 
+    def test_level_to_interval_range(self, levelToInterval):
+        assert Converter.LevelToIntervalRange("new", levelToInterval) == (0, 100)
+        assert Converter.LevelToIntervalRange("familiar", levelToInterval) == (300, 400)
+        assert Converter.LevelToIntervalRange("known", levelToInterval) == (500, 1000)
+
 
 class TestLingqStatusConversion:
     def test_convert_lingq_status_to_level(self):
@@ -193,3 +198,14 @@ class TestCardCanIncreaseStatus:
         modelCard.level = "known"
         result = Converter.CardCanIncreaseLevel(modelCard, levelToInterval)
         assert result
+
+
+class TestNormalizeTerm:
+    def test_case_and_unicode_form_are_ignored(self):
+        composed = "caf\u00e9"
+        decomposed = "cafe\u0301"
+        assert Converter.NormalizeTerm(" CAF\u00c9") == Converter.NormalizeTerm(decomposed)
+        assert Converter.NormalizeTerm(decomposed) == composed
+
+    def test_casefold_goes_beyond_lower(self):
+        assert Converter.NormalizeTerm("Straße") == Converter.NormalizeTerm("STRASSE")
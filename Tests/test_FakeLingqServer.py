@@ -0,0 +1,101 @@
+import pytest
+import requests
+from unittest.mock import call, patch
+from LingqAnkiSync.LingqApi import LingqApi
+from LingqAnkiSync.Models.Lingq import Lingq
+from LingqAnkiSync.Models.PageSizeModel import PageSizeModel
+from Tests.FakeLingqServer import FakeLingqServer
+
+
+@pytest.fixture
+def fakeServer():
+    server = FakeLingqServer(cardCount=450, maxPageSize=200).Start()
+    yield server
+    server.Stop()
+
+
+@pytest.fixture
+def lingqApi(fakeServer):
+    # As after an earlier run learned the server's page size limit
+    return LingqApi(
+        "test_api_key", "es", fakeServer.baseUrl, pageSizeModel=PageSizeModel(maxPageSize=200)
+    )
+
+
+class TestFakeLingqServer:
+    def test_get_lingqs_pages_through_whole_vocabulary(self, fakeServer, lingqApi):
+        lingqs = lingqApi.GetLingqs(includeKnowns=True)
+
+        # Every tenth synthetic card has no hints and is skipped on import
+        assert len(lingqs) == 405
+        assert fakeServer.requestCounts == {"GET": 3}
+        assert lingqs[0].word == "es_word_1"
+
+    def test_get_lingq_statuses(self, lingqApi):
+        statuses = lingqApi.GetLingqStatuses()
+
+        assert len(statuses) == 450
+        assert statuses[4] == (3, 3)
+
+    def test_sync_statuses_patches_changed_lingqs(self, fakeServer, lingqApi):
+        lingq = lingqApi.GetLingqs(includeKnowns=True)[0]
+        lingq.status, lingq.extendedStatus = 3, 3
+        fakeServer.ResetCounts()
+
+        assert lingqApi.SyncStatusesToLingq([lingq]) == 1
+        assert lingqApi._GetLevel(lingq.primaryKey) == Lingq.LEVEL_KNOWN
+        assert fakeServer.requestCounts == {"GET": 2, "PATCH": 1}
+
+    @patch("LingqAnkiSync.LingqApi.time.sleep")
+    def test_rate_limit_is_retried(self, timeSleepMock, fakeServer, lingqApi):
+        fakeServer.rateLimitEvery = 2
+        fakeServer.retryAfterSeconds = 7
+
+        statuses = lingqApi.GetLingqStatuses()
+
+        # Three pages, the second and third are throttled once each
+        assert len(statuses) == 450
+        assert fakeServer.requestCounts == {"GET": 5}
+        assert timeSleepMock.call_args_list == [call(10), call(10)]
+
+    def test_server_errors_are_raised(self, fakeServer, lingqApi):
+        fakeServer.serverErrorRate = 1.0
+
+        with pytest.raises(requests.HTTPError):
+            lingqApi.GetLingqStatuses()
+
+    def test_hung_connection_times_out(self, fakeServer, lingqApi):
+        fakeServer.hangEvery = 1
+        fakeServer.hangSeconds = 2
+        lingqApi.timeout = 0.2
+
+        with pytest.raises(requests.Timeout):
+            lingqApi.GetLingqStatuses()
+
+    def test_page_size_grows_after_quick_pages(self, fakeServer):
+        fakeServer.maxPageSize = 1000
+        fakeServer.cardCount = 1000
+        lingqApi = LingqApi("test_api_key", "es", fakeServer.baseUrl)
+
+        statuses = lingqApi.GetLingqStatuses()
+
+        # Pages of 200, 200, 400, then the last 200 in a page of 800
+        assert sorted(statuses) == list(range(1, 1001))
+        assert fakeServer.requestCounts == {"GET": 4}
+        assert lingqApi.pageSizeModel == PageSizeModel(pageSize=800)
+
+    def test_page_size_limit_is_learned_mid_scan(self, fakeServer):
+        fakeServer.maxPageSize = 300
+        fakeServer.cardCount = 1000
+        lingqApi = LingqApi("test_api_key", "es", fakeServer.baseUrl)
+
+        statuses = lingqApi.GetLingqStatuses()
+
+        # The page of 400 comes back cut to 300 and is asked for again in pages of 200
+        assert sorted(statuses) == list(range(1, 1001))
+        assert fakeServer.requestCounts == {"GET": 6}
+        assert lingqApi.pageSizeModel == PageSizeModel(pageSize=300, maxPageSize=300)
+
+    def test_rejects_bad_api_key(self, fakeServer):
+        with pytest.raises(requests.HTTPError, match="401"):
+            LingqApi("wrong_key", "es", fakeServer.baseUrl).GetLingqStatuses()
@@ -1,8 +1,9 @@
 import pytest
-from requests.exceptions import HTTPError
+from requests.exceptions import HTTPError, Timeout
 from unittest.mock import patch, MagicMock
 from LingqAnkiSync.LingqApi import LingqApi
 from LingqAnkiSync.Models.Lingq import Lingq
+from LingqAnkiSync.Models.PageSizeModel import PageSizeModel
 
 
 @pytest.fixture
@@ -143,6 +144,69 @@ class TestLingqApi:
 
         assert requestsGetMock.call_count == 2
 
+    @patch("requests.get")
+    def test_get_lingqs_reports_fetch_progress(
+        self, requestsGetMock, lingqApiGetCardsResponse, sampleLingqObjects
+    ):
+        requestsGetMock.side_effect = [
+            lingqApiGetCardsResponse(
+                lingqs=sampleLingqObjects[:2],
+                count=3,
+                next_url="https://www.lingq.com/api/v3/es/cards/?page=2&page_size=2",
+            ),
+            lingqApiGetCardsResponse(lingqs=sampleLingqObjects[2:], count=3),
+        ]
+        progressCallback = MagicMock()
+
+        LingqApi("test_api_key", "es").GetLingqs(True, progressCallback)
+
+        assert [c.args[:2] for c in progressCallback.call_args_list] == [(2, 3), (3, 3)]
+
+    @patch("requests.get")
+    def test_get_lingq_statuses(
+        self, requestsGetMock, lingqApiGetCardsResponse, sampleLingqObjects
+    ):
+        requestsGetMock.side_effect = [
+            lingqApiGetCardsResponse(
+                lingqs=sampleLingqObjects[:2],
+                count=3,
+                next_url="https://www.lingq.com/api/v3/es/cards/?page=2&page_size=2",
+            ),
+            lingqApiGetCardsResponse(lingqs=sampleLingqObjects[2:], count=3),
+        ]
+
+        statuses = LingqApi("test_api_key", "es").GetLingqStatuses()
+
+        assert statuses == {1: (1, 0), 2: (2, 0), 3: (3, 3)}
+        assert requestsGetMock.call_count == 2
+        # Statuses are needed for known words too
+        assert "status=" not in requestsGetMock.call_args_list[0].kwargs["url"]
+
+    @patch("requests.get")
+    def test_timed_out_page_is_asked_for_again_smaller(
+        self, requestsGetMock, lingqApiGetCardsResponse, sampleLingqObjects
+    ):
+        requestsGetMock.side_effect = [
+            lingqApiGetCardsResponse(
+                lingqs=sampleLingqObjects[:1] * 50,
+                count=75,
+                next_url="https://www.lingq.com/api/v3/es/cards/?page=2&page_size=50",
+            ),
+            Timeout(),
+            lingqApiGetCardsResponse(lingqs=sampleLingqObjects[1:2] * 25, count=75),
+        ]
+
+        api = LingqApi("test_api_key", "es", pageSizeModel=PageSizeModel(pageSize=50))
+        statuses = api.GetLingqStatuses()
+
+        assert statuses == {1: (1, 0), 2: (2, 0)}
+        assert [c.kwargs["url"].split("?")[1] for c in requestsGetMock.call_args_list] == [
+            "page=1&page_size=50",
+            "page=2&page_size=50",
+            "page=3&page_size=25",
+        ]
+        assert api.pageSizeModel.pageSize == 25
+
     @patch("time.sleep")
     @patch("requests.get")
     def test_with_retry(
@@ -188,6 +252,11 @@ class TestLingqApi:
         assert requestsGetMock.call_count == 3
         assert timeSleepMock.call_count == 1
         assert timeSleepMock.call_args[0][0] >= retryAfterDelaySeconds
+        assert api.requestCount == 3
+        assert api.httpStats.sleepSeconds == timeSleepMock.call_args[0][0]
+        assert api.httpStats.rateLimited == 1
+        assert api.httpStats.retries == 1
+        assert api.httpStats.requestsByVerb == {"GET": 3}
 
     @patch("requests.get")
     def test_get_level(self, requestsGetMock, lingqApiGetLevelResponse):
@@ -263,3 +332,30 @@ class TestLingqApi:
         assert requestsPatchMock.call_count == 1
         assert timeSleepMock.call_count > 0
         assert progressCallback.call_count > 0
+
+    @patch("time.sleep")
+    @patch("requests.patch")
+    @patch("requests.get")
+    def test_sync_statuses_stops_during_rate_limit_wait(
+        self,
+        requestsGetMock,
+        requestsPatchMock,
+        timeSleepMock,
+        lingqApiGetLevelResponse,
+        sampleLingqObjects,
+    ):
+        rateLimited = lingqApiGetLevelResponse(-1, -1)
+        rateLimited.status_code = 429
+        rateLimited.headers = {"Retry-After": "3600"}
+        rateLimited.raise_for_status.side_effect = HTTPError("429 Client Error: Too Many Requests")
+        requestsGetMock.side_effect = [lingqApiGetLevelResponse(1, 0), rateLimited]
+
+        stopAfterSleeps = lambda requestCount: timeSleepMock.call_count >= 5
+
+        api = LingqApi("test_api_key", "es")
+        assert api.SyncStatusesToLingq(sampleLingqObjects, shouldStop=stopAfterSleeps) == 0
+
+        assert timeSleepMock.call_count == 5
+        assert api.syncedLingqs == sampleLingqObjects[:1]
+        assert api.requestCount == 2
+        requestsPatchMock.assert_not_called()
@@ -1,4 +1,9 @@
+import json
+from unittest.mock import patch
 from LingqAnkiSync.Models.Lingq import Lingq
+from LingqAnkiSync.Models.HttpStats import HttpStats
+from LingqAnkiSync.Models.ImportFilter import ImportFilter
+from LingqAnkiSync.Models.RunReport import RunReport
 import pytest
 
 
@@ -103,3 +108,108 @@ def test_lingq_equality():
     assert lingq1 == lingq2
     assert lingq1 != lingq3
     assert lingq2 != lingq3
+
+
+class TestHttpStats:
+    def test_add_request_counts_by_verb(self):
+        stats = HttpStats()
+        stats.AddRequest("GET", 0.5, 100)
+        stats.AddRequest("GET", 0.25, 50)
+        stats.AddRequest("PATCH", 0.25, 10)
+
+        assert stats.requestCount == 3
+        assert stats.requestsByVerb == {"GET": 2, "PATCH": 1}
+        assert stats.requestSeconds == 1.0
+        assert stats.bytesReceived == 160
+
+    def test_latency_percentiles(self):
+        stats = HttpStats()
+        for i in range(1, 101):
+            stats.AddRequest("GET", i / 100, 0)
+
+        percentiles = stats.LatencyPercentiles()
+
+        assert percentiles["p50"] == 0.51
+        assert percentiles["p90"] == 0.91
+        assert percentiles["max"] == 1.0
+
+    def test_latency_percentiles_without_requests(self):
+        assert HttpStats().LatencyPercentiles() == {}
+
+
+class TestRunReport:
+    def test_phases_accumulate(self):
+        report = RunReport("import", "es", "Deck")
+        with patch("LingqAnkiSync.Models.RunReport.time.perf_counter", side_effect=[0, 2, 5, 6]):
+            with report.Phase("fetch"):
+                pass
+            with report.Phase("fetch"):
+                pass
+
+        assert report.phaseSeconds == {"fetch": 3}
+
+    def test_to_json_and_summary(self):
+        report = RunReport("syncToLingq", "es", "Deck", counts={"updated": 2})
+        report.phaseSeconds = {"push": 1.5}
+        report.http.AddRequest("PATCH", 0.2, 10)
+        report.http.rateLimited = 1
+        report.http.sleepSeconds = 13
+
+        logged = json.loads(report.ToJson())
+        summary = report.Summary()
+
+        assert logged["counts"] == {"updated": 2}
+        assert logged["http"]["requestsByVerb"] == {"PATCH": 1}
+        assert "push: 1.5s" in summary
+        assert "1 PATCH" in summary
+        assert "rate limited 1 times, waited 13s" in summary
+
+
+def ApiCard(pk=1, importance=2, tags=(), status=0, extendedStatus=0):
+    return {
+        "pk": pk,
+        "importance": importance,
+        "tags": list(tags),
+        "status": status,
+        "extended_status": extendedStatus,
+    }
+
+
+class TestImportFilter:
+    def test_empty_filter_matches_everything(self):
+        assert ImportFilter().IsEmpty()
+        assert ImportFilter().QueryParams() == []
+        assert ImportFilter().Matches(ApiCard(importance=0))
+
+    def test_min_importance(self):
+        importFilter = ImportFilter(minImportance=2)
+        assert importFilter.Matches(ApiCard(importance=3))
+        assert not importFilter.Matches(ApiCard(importance=1))
+
+    def test_primary_key_range(self):
+        importFilter = ImportFilter(minPrimaryKey=10, maxPrimaryKey=20)
+        assert [pk for pk in (9, 10, 20, 21) if importFilter.Matches(ApiCard(pk))] == [10, 20]
+
+    def test_tags(self):
+        importFilter = ImportFilter(includeTags=["food", "travel"], excludeTags=["names"])
+        assert importFilter.Matches(ApiCard(tags=["travel"]))
+        assert not importFilter.Matches(ApiCard(tags=["other"]))
+        assert not importFilter.Matches(ApiCard(tags=["food", "names"]))
+
+    def test_levels_go_to_the_query(self):
+        importFilter = ImportFilter(levels=["known", "new", "learned"])
+        assert importFilter.QueryParams() == [("status", "0"), ("status", "3")]
+
+    def test_levels_tell_learned_from_known(self):
+        importFilter = ImportFilter(levels=["learned"])
+        assert importFilter.Matches(ApiCard(status=3))
+        assert not importFilter.Matches(ApiCard(status=3, extendedStatus=3))
+
+    def test_without_knowns_drops_the_known_level(self):
+        assert ImportFilter(levels=["known", "new"]).WithoutKnowns() == ImportFilter(levels=["new"])
+        assert ImportFilter(levels=["known"]).WithoutKnowns() is None
+        assert ImportFilter(minImportance=2).WithoutKnowns() == ImportFilter(minImportance=2)
+
+    def test_unknown_level(self):
+        with pytest.raises(ValueError):
+            ImportFilter(levels=["fluent"])
@@ -0,0 +1,183 @@
+import threading
+import pytest
+from unittest.mock import Mock
+from anki.collection import Collection
+from LingqAnkiSync import AnkiHandler, Snapshot
+from LingqAnkiSync.Prefetch import IdleGate, PrefetchCancelled, Prefetcher
+from LingqAnkiSync.UIActionHandler import ActionHandler
+from Tests.FakeLingqServer import FakeLingqServer
+
+
+class FakeTimer:
+    """Only fires when the test says so"""
+
+    def __init__(self, seconds, func):
+        self.seconds = seconds
+        self.func = func
+        self.cancelled = False
+
+    def start(self):
+        pass
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TestIdleGate:
+    def test_waits_for_user_actions_to_finish(self):
+        idleGate = IdleGate()
+        waited = threading.Event()
+
+        with idleGate.UserAction():
+            thread = threading.Thread(
+                target=lambda: (idleGate.WaitForIdle(threading.Event()), waited.set())
+            )
+            thread.start()
+            assert not waited.wait(0.1)
+        thread.join(1)
+
+        assert waited.is_set()
+
+    def test_stop_ends_the_wait(self):
+        idleGate = IdleGate()
+        stopEvent = threading.Event()
+        stopEvent.set()
+
+        with idleGate.UserAction():
+            idleGate.WaitForIdle(stopEvent)
+
+
+class TestPrefetcher:
+    def CreatePrefetcher(self, languageDecks):
+        actionHandler = Mock()
+        actionHandler.config.GetLanguageDecks.return_value = languageDecks
+        timers = []
+
+        def TimerFactory(seconds, func):
+            timers.append(FakeTimer(seconds, func))
+            return timers[-1]
+
+        prefetcher = Prefetcher(actionHandler, 900, IdleGate(), TimerFactory, startDelaySeconds=60)
+        return prefetcher, actionHandler, timers
+
+    def test_prefetches_every_language_then_again_later(self):
+        prefetcher, actionHandler, timers = self.CreatePrefetcher({"es": "Spanish", "de": "German"})
+        actionHandler.PrefetchLingqs.side_effect = [ConnectionError(), None]
+
+        prefetcher.Start()
+        timers[-1].func()
+
+        # A failing language doesn't keep the others from being prefetched
+        assert [c.args[0] for c in actionHandler.PrefetchLingqs.call_args_list] == ["es", "de"]
+        assert [timer.seconds for timer in timers] == [60, 900]
+
+    def test_cancel_stops_before_the_next_request(self):
+        prefetcher, actionHandler, timers = self.CreatePrefetcher({"es": "Spanish", "de": "German"})
+
+        def PrefetchLingqs(languageCode, beforeEachPage):
+            prefetcher.Cancel()
+            beforeEachPage()
+
+        actionHandler.PrefetchLingqs.side_effect = PrefetchLingqs
+        prefetcher.Start()
+        timers[-1].func()
+
+        assert actionHandler.PrefetchLingqs.call_count == 1
+        assert len(timers) == 1
+
+
+@pytest.fixture
+def fakeServer():
+    server = FakeLingqServer(cardCount=60).Start()
+    yield server
+    server.Stop()
+
+
+@pytest.fixture
+def collection(tmp_path):
+    col = Collection(str(tmp_path / "collection.anki2"))
+    AnkiHandler.UseCollection(col)
+    yield col
+    AnkiHandler.UseCollection(None)
+    col.close()
+
+
+@pytest.fixture
+def actionHandler(fakeServer, collection, tmp_path, monkeypatch):
+    monkeypatch.setattr("LingqAnkiSync.UserFiles._userFilesDir", str(tmp_path / "user_files"))
+    addonManager = Mock()
+    addonManager.getConfig.return_value = {
+        "apiKey": fakeServer.apiKey,
+        "apiBaseUrl": fakeServer.baseUrl,
+        "languageCode": "es",
+        "prefetch": True,
+    }
+    return ActionHandler(addonManager)
+
+
+class TestPrefetchLingqs:
+    def test_import_and_pull_read_the_prefetched_cards(self, actionHandler, fakeServer):
+        assert actionHandler.PrefetchLingqs("es").counts == {"prefetched": 60}
+        fakeServer.ResetCounts()
+
+        report = actionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        actionHandler.SyncLingqStatusFromLingq("Spanish")
+
+        assert report.counts["imported"] == 54
+        assert fakeServer.requestCounts == {}
+
+    def test_old_prefetch_is_not_used(self, actionHandler, monkeypatch):
+        actionHandler.PrefetchLingqs("es")
+        path = actionHandler._PrefetchPath("es")
+        createdAt = Snapshot.ReadHeader(path)["createdAt"]
+
+        monkeypatch.setattr("LingqAnkiSync.UIActionHandler.time.time", lambda: createdAt + 60)
+        assert actionHandler._WarmSnapshotPath("es") == path
+        monkeypatch.setattr("LingqAnkiSync.UIActionHandler.time.time", lambda: createdAt + 31 * 60)
+        assert actionHandler._WarmSnapshotPath("es") is None
+
+    def test_sync_to_lingq_discards_the_prefetch(self, actionHandler, collection):
+        actionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        actionHandler.PrefetchLingqs("es")
+        cardIds = collection.find_cards('deck:"Spanish" LingqPK:1')
+        collection.sched.set_due_date(cardIds, "200!")
+
+        actionHandler.SyncLingqStatusToLingq("Spanish")
+
+        assert actionHandler._WarmSnapshotPath("es") is None
+
+    def test_prefetch_running_during_a_sync_to_lingq_is_not_used(self, actionHandler):
+        def SyncToLingqMeanwhile():
+            actionHandler._DiscardWarmSnapshot("es")
+
+        actionHandler.PrefetchLingqs("es", SyncToLingqMeanwhile)
+
+        assert actionHandler._WarmSnapshotPath("es") is None
+        actionHandler.PrefetchLingqs("es")
+        assert actionHandler._WarmSnapshotPath("es") == actionHandler._PrefetchPath("es")
+
+    def test_pull_from_prefetch_leaves_orphans_alone(self, actionHandler, collection, fakeServer):
+        fakeServer.cardCount = 50
+        actionHandler.PrefetchLingqs("es")
+        fakeServer.cardCount = 60
+        actionHandler.config.config["prefetch"] = False
+        actionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        actionHandler.config.config["prefetch"] = True
+
+        report = actionHandler.SyncLingqStatusFromLingq("Spanish")
+
+        # Lingqs created since the prefetch aren't in it, they aren't deleted ones
+        assert (report.counts["orphaned"], report.counts["restored"]) == (0, 0)
+        assert collection.find_notes(f"tag:{AnkiHandler.ORPHAN_TAG}") == []
+
+    def test_cancelled_prefetch_keeps_the_previous_copy(self, actionHandler):
+        actionHandler.PrefetchLingqs("es")
+        createdAt = Snapshot.ReadHeader(actionHandler._PrefetchPath("es"))["createdAt"]
+
+        def Cancel():
+            raise PrefetchCancelled()
+
+        with pytest.raises(PrefetchCancelled):
+            actionHandler.PrefetchLingqs("es", Cancel)
+
+        assert Snapshot.ReadHeader(actionHandler._PrefetchPath("es"))["createdAt"] == createdAt
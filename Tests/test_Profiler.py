@@ -0,0 +1,101 @@
+import os
+import threading
+import tracemalloc
+import pytest
+from unittest.mock import Mock, patch
+from LingqAnkiSync import Profiler, UserFiles
+
+
+class Handler:
+    def __init__(self, profiling: bool):
+        self.config = Mock()
+        self.config.GetProfiling.return_value = profiling
+
+    @Profiler.Profiled
+    def ImportLingqsToAnki(self, count):
+        return [str(i) for i in range(count)]
+
+
+@pytest.fixture
+def userFilesDir(tmp_path, monkeypatch):
+    monkeypatch.setattr(UserFiles, "_userFilesDir", str(tmp_path))
+    monkeypatch.delenv(Profiler.PROFILING_ENV_VAR, raising=False)
+    return tmp_path
+
+
+class TestProfiled:
+    def test_does_nothing_when_disabled(self, userFilesDir):
+        with patch.object(Profiler, "RunProfiler") as mockRunProfiler:
+            result = Handler(profiling=False).ImportLingqsToAnki(3)
+
+        assert result == ["0", "1", "2"]
+        mockRunProfiler.assert_not_called()
+        assert not os.path.exists(userFilesDir / "profiles")
+
+    def test_writes_profile_and_allocations_when_enabled(self, userFilesDir):
+        result = Handler(profiling=True).ImportLingqsToAnki(1000)
+
+        assert len(result) == 1000
+        files = sorted(os.listdir(userFilesDir / "profiles"))
+        assert len(files) == 2
+        assert files[0].endswith("_ImportLingqsToAnki.prof")
+        assert files[1].endswith("_ImportLingqsToAnki_allocations.txt")
+        allocations = (userFilesDir / "profiles" / files[1]).read_text()
+        assert allocations.startswith("Peak traced memory:")
+
+    def test_env_var_enables_profiling(self, userFilesDir, monkeypatch):
+        monkeypatch.setenv(Profiler.PROFILING_ENV_VAR, "1")
+
+        Handler(profiling=False).ImportLingqsToAnki(3)
+
+        assert len(os.listdir(userFilesDir / "profiles")) == 2
+
+    def test_profile_is_written_when_the_run_fails(self, userFilesDir):
+        handler = Handler(profiling=True)
+
+        with pytest.raises(TypeError):
+            handler.ImportLingqsToAnki("not a count")
+
+        assert len(os.listdir(userFilesDir / "profiles")) == 2
+
+    def test_overlapping_runs_each_write_their_profile(self, userFilesDir):
+        first, second = Profiler.RunProfiler("First"), Profiler.RunProfiler("Second")
+
+        def Run(profiler, started, finish):
+            with profiler:
+                started.set()
+                finish.wait(5)
+
+        firstStarted, secondStarted = threading.Event(), threading.Event()
+        firstFinish, secondFinish = threading.Event(), threading.Event()
+        threads = [
+            threading.Thread(target=Run, args=(first, firstStarted, firstFinish)),
+            threading.Thread(target=Run, args=(second, secondStarted, secondFinish)),
+        ]
+        threads[0].start()
+        firstStarted.wait(5)
+        threads[1].start()
+        secondStarted.wait(5)
+        # The run that started tracing finishes first, the other one still needs it
+        firstFinish.set()
+        threads[0].join()
+        secondFinish.set()
+        threads[1].join()
+
+        files = os.listdir(userFilesDir / "profiles")
+        assert len([name for name in files if name.endswith("_allocations.txt")]) == 2
+        assert not tracemalloc.is_tracing()
+
+    def test_runs_in_the_same_second_keep_their_files(self, userFilesDir):
+        handler = Handler(profiling=True)
+
+        handler.ImportLingqsToAnki(3)
+        handler.ImportLingqsToAnki(3)
+
+        assert len(os.listdir(userFilesDir / "profiles")) == 4
+
+    def test_failing_profile_does_not_fail_the_run(self, userFilesDir):
+        with patch.object(Profiler.UserFiles, "GetPath", side_effect=OSError("disk full")):
+            result = Handler(profiling=True).ImportLingqsToAnki(3)
+
+        assert result == ["0", "1", "2"]
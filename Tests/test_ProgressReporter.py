@@ -0,0 +1,53 @@
+from LingqAnkiSync.ProgressReporter import ProgressReporter
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class TestProgressReporter:
+    def test_keeps_only_latest_state(self, clock):
+        reporter = ProgressReporter("Syncing", clock=clock)
+        for i in range(1, 51):
+            reporter(i, 100, f"word_{i}")
+
+        assert reporter.GetValues() == (50, 100)
+        assert reporter.GetLabel().startswith('Syncing 50/100 - "word_50"')
+
+    def test_label_shows_throughput_and_eta(self, clock):
+        reporter = ProgressReporter("Syncing", clock=clock)
+        clock.now += 10
+        reporter(20, 100, "word")
+
+        label = reporter.GetLabel()
+        assert "2.0/s" in label
+        assert "40s remaining" in label
+
+    def test_rate_limit_counts_down_from_clock(self, clock):
+        reporter = ProgressReporter("Syncing", clock=clock)
+        reporter(5, 10, "word", rateLimitSeconds=30)
+        clock.now += 10
+
+        assert "waiting 20 seconds" in reporter.GetLabel()
+
+        reporter(6, 10, "word")
+        assert "rate limit" not in reporter.GetLabel()
+
+    def test_phase_change_restarts_throughput(self, clock):
+        reporter = ProgressReporter("Fetching", clock=clock)
+        clock.now += 100
+        reporter(10, 10, phase="Importing")
+
+        label = reporter.GetLabel()
+        assert label.startswith("Importing 10/10")
+        assert "/s" not in label
@@ -0,0 +1,111 @@
+import pytest
+import threading
+from LingqAnkiSync.RateLimiter import RateLimiter, SharedRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def Sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter:
+    def test_unlimited_by_default(self):
+        clock = FakeClock()
+        rateLimiter = RateLimiter(clock=clock, sleep=clock.Sleep)
+
+        assert [rateLimiter.Acquire() for _ in range(3)] == [0, 0, 0]
+        assert clock.sleeps == []
+
+    def test_spaces_requests(self):
+        clock = FakeClock()
+        rateLimiter = RateLimiter(minIntervalSeconds=0.5, clock=clock, sleep=clock.Sleep)
+
+        rateLimiter.Acquire()
+        rateLimiter.Acquire()
+        clock.now += 2
+        rateLimiter.Acquire()
+
+        assert clock.sleeps == [0.5]
+
+    def test_back_off_holds_every_request(self):
+        clock = FakeClock()
+        rateLimiter = RateLimiter(clock=clock, sleep=clock.Sleep)
+
+        rateLimiter.BackOff(10)
+        clock.now += 4
+
+        assert rateLimiter.Acquire() == 6
+        assert rateLimiter.Acquire() == 0
+
+    def test_shared_between_threads(self):
+        rateLimiter = RateLimiter(minIntervalSeconds=0.01)
+        waits = []
+
+        def Request():
+            waits.append(rateLimiter.Acquire())
+
+        threads = [threading.Thread(target=Request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Each thread got its own slot
+        assert sorted(waits)[-1] >= 0.03
+
+
+class TestSharedRateLimiter:
+    def test_processes_share_the_spacing(self, tmp_path):
+        clock = FakeClock()
+        path = str(tmp_path / "rateLimit.sqlite")
+        first, second = (
+            SharedRateLimiter(path, "key", 0.5, clock=clock, sleep=clock.Sleep) for _ in range(2)
+        )
+
+        assert first.Acquire() == 0
+        assert second.Acquire() == 0.5
+
+    def test_back_off_holds_every_process_and_slows_them_down(self, tmp_path):
+        clock = FakeClock()
+        path = str(tmp_path / "rateLimit.sqlite")
+        first, second = (
+            SharedRateLimiter(path, "key", clock=clock, sleep=clock.Sleep) for _ in range(2)
+        )
+
+        first.BackOff(10)
+        clock.now += 4
+        assert second.Acquire() == 6
+        # The learned spacing now keeps requests apart, and wears off with each request
+        assert second.Acquire() == pytest.approx(SharedRateLimiter.MIN_LEARNED_INTERVAL)
+        assert 0 < first.Acquire() < SharedRateLimiter.MIN_LEARNED_INTERVAL
+
+    def test_accounts_are_paced_separately(self, tmp_path):
+        clock = FakeClock()
+        path = str(tmp_path / "rateLimit.sqlite")
+        first = SharedRateLimiter(path, "key", clock=clock, sleep=clock.Sleep)
+        other = SharedRateLimiter(path, "other key", clock=clock, sleep=clock.Sleep)
+
+        first.BackOff(10)
+
+        assert other.Acquire() == 0
+
+    def test_falls_back_to_pacing_in_process_when_the_file_fails(self, tmp_path):
+        clock = FakeClock()
+        rateLimiter = SharedRateLimiter(
+            str(tmp_path / "rateLimit.sqlite"), "key", 0.5, clock=clock, sleep=clock.Sleep
+        )
+        rateLimiter.Close()
+
+        rateLimiter.BackOff(10)
+        clock.now += 4
+
+        assert rateLimiter.Acquire() == 6
+        assert rateLimiter.Acquire() == 0.5
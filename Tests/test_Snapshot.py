@@ -0,0 +1,104 @@
+import gzip
+import json
+import pytest
+from LingqAnkiSync import Snapshot
+from LingqAnkiSync.Models.ImportFilter import ImportFilter
+
+
+def ApiCard(pk, status=0, extendedStatus=0, hints=("hola",)):
+    return {
+        "pk": pk,
+        "url": f"https://www.lingq.com/api/v3/es/cards/{pk}/",
+        "term": f"term{pk}",
+        "fragment": f"fragment {pk}",
+        "importance": pk % 4,
+        "status": status,
+        "extended_status": extendedStatus,
+        "tags": ["tag"],
+        "hints": [{"id": 1, "locale": "en", "text": text, "popularity": 7} for text in hints],
+        "srs_due_date": "2024-01-01T00:00:00Z",
+    }
+
+
+@pytest.fixture
+def snapshotPath(tmp_path):
+    return str(tmp_path / "es.ndjson.gz")
+
+
+class TestSnapshot:
+    def test_write_and_read_cards(self, snapshotPath):
+        pages = [[ApiCard(1), ApiCard(2)], [ApiCard(3)]]
+
+        count = Snapshot.WriteSnapshot(snapshotPath, "es", iter(pages))
+
+        assert count == 3
+        assert Snapshot.ReadHeader(snapshotPath)["languageCode"] == "es"
+        cards = list(Snapshot.ReadCards(snapshotPath))
+        assert [card["pk"] for card in cards] == [1, 2, 3]
+        assert "url" not in cards[0]
+        assert "srs_due_date" not in cards[0]
+        assert cards[0]["hints"] == [{"text": "hola", "popularity": 7}]
+
+    def test_file_is_gzipped_json_lines(self, snapshotPath):
+        Snapshot.WriteSnapshot(snapshotPath, "es", [[ApiCard(1)]])
+
+        with gzip.open(snapshotPath, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+
+        assert lines[0]["version"] == Snapshot.SNAPSHOT_VERSION
+        assert lines[1]["term"] == "term1"
+
+    def test_failed_write_keeps_previous_snapshot(self, snapshotPath, tmp_path):
+        Snapshot.WriteSnapshot(snapshotPath, "es", [[ApiCard(1)]])
+
+        def FailingPages():
+            yield [ApiCard(2)]
+            raise ConnectionError("offline")
+
+        with pytest.raises(ConnectionError):
+            Snapshot.WriteSnapshot(snapshotPath, "es", FailingPages())
+
+        assert [card["pk"] for card in Snapshot.ReadCards(snapshotPath)] == [1]
+        assert [path.name for path in tmp_path.iterdir()] == ["es.ndjson.gz"]
+
+    def test_lingq_chunks_skip_cards_without_translations(self, snapshotPath):
+        Snapshot.WriteSnapshot(snapshotPath, "es", [[ApiCard(1), ApiCard(2, hints=()), ApiCard(3)]])
+
+        chunks = list(Snapshot.ReadLingqChunks(snapshotPath, True))
+
+        assert [lingq.primaryKey for lingq in chunks[0]] == [1, 3]
+
+    def test_lingq_chunks_filter_statuses_like_the_api(self, snapshotPath):
+        # The API's status=0..3 filter keeps knowns too, they are status 3 with extended status 3
+        Snapshot.WriteSnapshot(snapshotPath, "es", [[ApiCard(1), ApiCard(2, 3, 3)]])
+
+        chunks = list(Snapshot.ReadLingqChunks(snapshotPath, False))
+
+        assert [lingq.primaryKey for lingq in chunks[0]] == [1, 2]
+
+    def test_lingq_chunks_leave_knowns_out_of_level_filters(self, snapshotPath):
+        Snapshot.WriteSnapshot(snapshotPath, "es", [[ApiCard(1), ApiCard(2, 3, 3)]])
+
+        chunks = list(
+            Snapshot.ReadLingqChunks(
+                snapshotPath, False, importFilter=ImportFilter(levels=["new", "known"])
+            )
+        )
+
+        assert [lingq.primaryKey for chunk in chunks for lingq in chunk] == [1]
+
+    def test_lingq_chunks_are_limited_in_size(self, snapshotPath):
+        Snapshot.WriteSnapshot(snapshotPath, "es", [[ApiCard(pk) for pk in range(1, 8)]])
+
+        chunks = list(Snapshot.ReadLingqChunks(snapshotPath, True, chunkSize=3))
+
+        assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+        assert chunks[0][0].popularity == 7
+
+    def test_not_a_snapshot(self, tmp_path):
+        path = tmp_path / "other.gz"
+        with gzip.open(path, "wt") as f:
+            f.write('{"pk": 1}\n')
+
+        with pytest.raises(ValueError):
+            Snapshot.ReadHeader(str(path))
@@ -0,0 +1,72 @@
+import threading
+from LingqAnkiSync.SyncPlanner import SyncPlanner
+from LingqAnkiSync.Models.AnkiCard import AnkiCard
+
+
+def _Card(primaryKey, importance, popularity=0):
+    return AnkiCard(
+        primaryKey=primaryKey,
+        word=f"word_{primaryKey}",
+        translations=[],
+        interval=0,
+        level="new",
+        tags=[],
+        sentence="",
+        importance=importance,
+        popularity=popularity,
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSyncPlanner:
+    def test_prioritize_upgrades_first_then_importance_and_popularity(self):
+        increases = [_Card(1, "1"), _Card(2, "3", 1), _Card(3, "3", 9)]
+        decreases = [_Card(4, "5"), _Card(5, "")]
+
+        ordered = SyncPlanner.Prioritize(increases, decreases)
+
+        assert [card.primaryKey for card in ordered] == [3, 2, 1, 4, 5]
+
+    def test_unlimited_by_default(self):
+        planner = SyncPlanner()
+        planner.Start()
+        assert not planner.ShouldStop(10**6)
+
+    def test_stops_when_cancelled(self):
+        cancelEvent = threading.Event()
+        planner = SyncPlanner(cancelEvent=cancelEvent)
+        planner.Start()
+        assert not planner.ShouldStop(0)
+
+        cancelEvent.set()
+        assert planner.ShouldStop(0)
+
+    def test_stops_when_time_budget_runs_out(self):
+        clock = FakeClock()
+        planner = SyncPlanner(timeBudgetSeconds=60, clock=clock)
+        planner.Start()
+        clock.now = 59
+        assert not planner.ShouldStop(0)
+
+        clock.now = 60
+        assert planner.ShouldStop(0)
+
+    def test_stops_before_an_update_would_exceed_request_budget(self):
+        planner = SyncPlanner(requestBudget=10)
+        planner.Start()
+        assert not planner.ShouldStop(8)
+        assert planner.ShouldStop(9)
+
+    def test_updates_without_a_level_check_take_one_request(self):
+        planner = SyncPlanner(requestBudget=10)
+        planner.Start()
+
+        assert planner.ShouldStop(9)
+        assert not planner.ShouldStop(9, requestsPerUpdate=1)
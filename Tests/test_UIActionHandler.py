@@ -1,9 +1,20 @@
+import threading
 import pytest
-from unittest.mock import Mock, patch
-from LingqAnkiSync.UIActionHandler import ActionHandler
+import requests
+from dataclasses import replace
+from unittest.mock import ANY, Mock, patch
+from anki.collection import Collection
+from LingqAnkiSync import AnkiHandler
+from LingqAnkiSync.UIActionHandler import ActionHandler, _InBackground
 from LingqAnkiSync.Models.AnkiCard import AnkiCard
+from LingqAnkiSync.Models.ImportFilter import ImportFilter
 from LingqAnkiSync.Models.Lingq import Lingq
-from LingqAnkiSync.LingqApi import LingqApi
+from LingqAnkiSync.LingqApi import LingqApi, SyncInterrupted
+from LingqAnkiSync.Models.RateLimitModel import RateLimitModel
+from LingqAnkiSync.Models.RunPlan import RunPlan
+from LingqAnkiSync.Models.RunReport import RunReport
+from LingqAnkiSync.RateLimiter import SharedRateLimiter
+from Tests.FakeLingqServer import FakeLingqServer
 
 
 @pytest.fixture
@@ -23,7 +34,9 @@ def sampleLevelToInterval():
 @pytest.fixture
 def actionHandler(mockAddonManager, sampleLevelToInterval):
     handler = ActionHandler(mockAddonManager)
-    with patch.object(handler.config, "GetLevelToInterval", return_value=sampleLevelToInterval):
+    with patch.object(
+        handler.config, "GetLevelToInterval", return_value=sampleLevelToInterval
+    ), patch("LingqAnkiSync.UIActionHandler.UserFiles"):
         yield handler
 
 
@@ -77,6 +90,33 @@ def sampleAnkiCards():
     ]
 
 
+@pytest.fixture
+def remoteStatuses():
+    """What a sync to LingQ finds on LingQ while it reads the deck"""
+    with patch.object(LingqApi, "GetCardCount", return_value=2), patch.object(
+        LingqApi, "GetLingqStatuses", return_value={}
+    ) as mockGetStatuses:
+        yield mockGetStatuses
+
+
+def ApiPages(lingqs, pageSize=2):
+    """The cards of lingqs as LingqApi.GetCardPages yields them"""
+    cards = [
+        {
+            "pk": lingq.primaryKey,
+            "term": lingq.word,
+            "hints": [{"text": text, "popularity": lingq.popularity} for text in lingq.translations],
+            "status": lingq.status,
+            "extended_status": lingq.extendedStatus,
+            "tags": lingq.tags,
+            "fragment": lingq.fragment,
+            "importance": lingq.importance,
+        }
+        for lingq in lingqs
+    ]
+    return [cards[i : i + pageSize] for i in range(0, len(cards), pageSize)]
+
+
 @pytest.fixture
 def sampleLingqs():
     return [
@@ -107,31 +147,69 @@ def sampleLingqs():
 
 class TestUIActionHandler:
     @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
-    @patch.object(LingqApi, "GetLingqs")
+    @patch.object(LingqApi, "GetCardPages")
     @patch("LingqAnkiSync.UIActionHandler.LingqsToAnkiCards")
     def test_import_lingqs_to_anki(
-        self, mockConverter, mockGetLingqs, mockAnkiHandler, actionHandler, sampleLingqs
+        self, mockConverter, mockGetCardPages, mockAnkiHandler, actionHandler, sampleLingqs
     ):
-        mockGetLingqs.return_value = sampleLingqs
+        mockGetCardPages.return_value = iter(ApiPages(sampleLingqs))
 
         mockCards = [Mock(), Mock()]
         mockConverter.return_value = mockCards
 
         mockAnkiHandler.CreateNotesFromCards.return_value = 2
+        mockAnkiHandler.GetLingqTermsInDeck.return_value = {}
+        mockAnkiHandler.DUPLICATE_TERM_ACTIONS = AnkiHandler.DUPLICATE_TERM_ACTIONS
 
-        result = actionHandler.ImportLingqsToAnki("TestDeck", importKnowns=True)
+        report = actionHandler.ImportLingqsToAnki("TestDeck", importKnowns=True)
 
-        assert result == 2
-        mockGetLingqs.assert_called_once_with(True)
+        assert report.counts == {"imported": 2, "alreadyInDeck": 0, "duplicateTerms": 0}
+        assert set(report.phaseSeconds) == {"fetch", "parse", "dedup", "convert", "insert"}
+        mockGetCardPages.assert_called_once_with(True, ANY, ImportFilter())
         mockConverter.assert_called_once_with(
             sampleLingqs, actionHandler.config.GetLevelToInterval()
         )
-        mockAnkiHandler.CreateNotesFromCards.assert_called_once_with(mockCards, "TestDeck", "es")
+        mockAnkiHandler.CreateNotesFromCards.assert_called_once_with(
+            mockCards,
+            "TestDeck",
+            "es",
+            ANY,
+            checkForDuplicates=False,
+            keepNewCards=False,
+            guidPks=mockAnkiHandler.GetPrimaryKeysWithGuid.return_value,
+        )
+
+    @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
+    @patch.object(LingqApi, "GetCardPages")
+    @patch("LingqAnkiSync.UIActionHandler.LingqsToAnkiCards")
+    def test_import_skips_lingqs_already_in_deck(
+        self, mockConverter, mockGetCardPages, mockAnkiHandler, actionHandler, sampleLingqs
+    ):
+        mockGetCardPages.return_value = iter(ApiPages(sampleLingqs))
+        mockAnkiHandler.GetLingqTermsInDeck.return_value = {1: "other_word"}
+        mockAnkiHandler.DUPLICATE_TERM_ACTIONS = AnkiHandler.DUPLICATE_TERM_ACTIONS
+        mockAnkiHandler.CreateNotesFromCards.return_value = 1
+
+        report = actionHandler.ImportLingqsToAnki("TestDeck", importKnowns=True)
+
+        assert report.counts == {"imported": 1, "alreadyInDeck": 1, "duplicateTerms": 0}
+        assert mockConverter.call_args[0][0] == sampleLingqs[1:]
+
+    @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
+    @patch.object(LingqApi, "GetLingqStatuses")
+    def test_run_report_is_logged(self, mockGetStatuses, mockAnkiHandler, actionHandler):
+        mockAnkiHandler.GetLingqLevelsInDeck.return_value = {}
+        mockGetStatuses.return_value = {}
+
+        with patch("LingqAnkiSync.UIActionHandler.UserFiles") as mockUserFiles:
+            report = actionHandler.SyncLingqStatusFromLingq("TestDeck")
+
+        mockUserFiles.AppendJsonLine.assert_called_once_with("runs.jsonl", report.ToJson())
 
     @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
     @patch.object(LingqApi, "SyncStatusesToLingq")
     def test_sync_lingq_status_with_progress_callback(
-        self, mockSyncStatuses, mockAnkiHandler, actionHandler, sampleAnkiCards
+        self, mockSyncStatuses, mockAnkiHandler, actionHandler, sampleAnkiCards, remoteStatuses
     ):
         mockSyncStatuses.return_value = 5
         mockAnkiHandler.GetAllCardsInDeck.return_value = sampleAnkiCards
@@ -143,8 +221,23 @@ class TestUIActionHandler:
         args = mockSyncStatuses.call_args[0]
         assert args[1] == progressCallback
 
+    def test_sync_lingq_status_cancelled_before_start(
+        self, actionHandler, sampleAnkiCards
+    ):
+        cancelEvent = Mock()
+        cancelEvent.is_set.return_value = True
+        with patch("LingqAnkiSync.UIActionHandler.AnkiHandler") as mockAnkiHandler, patch(
+            "requests.get"
+        ) as requestsGetMock:
+            mockAnkiHandler.GetAllCardsInDeck.return_value = sampleAnkiCards
+            report = actionHandler.SyncLingqStatusToLingq("TestDeck", cancelEvent=cancelEvent)
+
+        assert (report.counts["updated"], report.counts["remaining"]) == (0, 2)
+        requestsGetMock.assert_not_called()
+        mockAnkiHandler.UpdateLevels.assert_called_once_with("TestDeck", {})
+
     @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
-    @patch.object(LingqApi, "SyncStatusesToLingq")
+    @patch.object(LingqApi, "SyncStatusesToLingq", autospec=True)
     @patch("LingqAnkiSync.UIActionHandler.AnkiCardsToLingqs")
     def test_sync_lingq_status_to_lingq(
         self,
@@ -153,26 +246,107 @@ class TestUIActionHandler:
         mockAnkiHandler,
         actionHandler,
         sampleAnkiCards,
+        remoteStatuses,
     ):
-        mockSyncStatuses.return_value = 3
+        def SyncAll(api, lingqs, progressCallback, shouldStop, remoteStatuses):
+            api.syncedLingqs = list(lingqs)
+            return 3
+
+        mockSyncStatuses.side_effect = SyncAll
         mockAnkiHandler.GetAllCardsInDeck.return_value = sampleAnkiCards
 
-        mockLingqs = [Mock(), Mock()]
+        mockLingqs = [Mock(primaryKey=card.primaryKey) for card in sampleAnkiCards]
         mockConverter.return_value = mockLingqs
-        increased, decreased, ignored, apiUpdates = actionHandler.SyncLingqStatusToLingq(
-            "TestDeck", downgrade=True
-        )
-
-        assert increased == 2
-        assert decreased == 1
-        assert apiUpdates == 3
-
-        mockAnkiHandler.GetAllCardsInDeck.assert_called_once_with("TestDeck")
+        report = actionHandler.SyncLingqStatusToLingq("TestDeck", downgrade=True)
+
+        assert report.counts == {
+            "increased": 2,
+            "decreased": 1,
+            "ignored": 0,
+            "updated": 3,
+            "remaining": 0,
+        }
+        assert set(report.phaseSeconds) == {
+            "read deck",
+            "plan",
+            "fetch statuses",
+            "push",
+            "write back",
+        }
+
+        mockAnkiHandler.GetAllCardsInDeck.assert_called_once()
+        assert mockAnkiHandler.GetAllCardsInDeck.call_args[0][0] == "TestDeck"
         mockConverter.assert_called_once()
         converted_cards = mockConverter.call_args[0][0]
         assert len(converted_cards) == 3
-        mockSyncStatuses.assert_called_once_with(mockLingqs, None)
-        assert mockAnkiHandler.UpdateCardLevel.call_count == 3
+        mockSyncStatuses.assert_called_once()
+        assert mockSyncStatuses.call_args[0][1] == mockLingqs
+        assert mockSyncStatuses.call_args[0][2] is None
+        assert mockSyncStatuses.call_args[0][4] == remoteStatuses.return_value
+        # Written back to anki in one batch
+        mockAnkiHandler.UpdateLevels.assert_called_once_with(
+            "TestDeck", {12345: "recognized", 11111: "learned", 67890: "new"}
+        )
+
+    @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
+    @patch.object(LingqApi, "SyncStatusesToLingq", autospec=True)
+    def test_sync_lingq_status_leaves_unsynced_cards_for_next_run(
+        self, mockSyncStatuses, mockAnkiHandler, actionHandler, sampleAnkiCards, remoteStatuses
+    ):
+        def SyncFirstOnly(api, lingqs, progressCallback, shouldStop, remoteStatuses):
+            api.syncedLingqs = lingqs[:1]
+            return 1
+
+        mockSyncStatuses.side_effect = SyncFirstOnly
+        mockAnkiHandler.GetAllCardsInDeck.return_value = sampleAnkiCards
+
+        report = actionHandler.SyncLingqStatusToLingq("TestDeck", downgrade=True)
+
+        assert (report.counts["updated"], report.counts["remaining"]) == (1, 2)
+        # The most important upgrade goes first
+        mockAnkiHandler.UpdateLevels.assert_called_once_with("TestDeck", {11111: "learned"})
+
+    @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
+    @patch.object(LingqApi, "SyncStatusesToLingq")
+    def test_sync_dry_run_plans_without_writing(
+        self, mockSyncStatuses, mockAnkiHandler, actionHandler, sampleAnkiCards
+    ):
+        mockAnkiHandler.GetAllCardsInDeck.return_value = sampleAnkiCards
+        with patch.object(
+            actionHandler.config,
+            "GetRateLimitModel",
+            return_value=RateLimitModel(secondsPerRequest=1.0, throttleSecondsPerRequest=0.5),
+        ):
+            plan = actionHandler.SyncLingqStatusToLingq("TestDeck", downgrade=True, dryRun=True)
+
+        assert plan == RunPlan(
+            upgrades=2,
+            downgrades=1,
+            # The access probe and a page of statuses
+            getRequests=2,
+            patchRequests=3,
+            estimatedSeconds=7.5,
+        )
+        mockSyncStatuses.assert_not_called()
+        mockAnkiHandler.UpdateLevels.assert_not_called()
+
+    @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
+    @patch.object(LingqApi, "GetLingqs")
+    def test_import_dry_run_counts_new_notes(
+        self, mockGetLingqs, mockAnkiHandler, actionHandler, sampleLingqs
+    ):
+        # A second lingq of a term the deck has is skipped, as by the import
+        mockGetLingqs.return_value = sampleLingqs + [
+            replace(sampleLingqs[1], primaryKey=3, word="Test_Lingq_1 ")
+        ]
+        mockAnkiHandler.GetLingqTermsInDeck.return_value = {1: "test_lingq_1"}
+        mockAnkiHandler.DUPLICATE_TERM_ACTIONS = AnkiHandler.DUPLICATE_TERM_ACTIONS
+
+        plan = actionHandler.ImportLingqsToAnki("TestDeck", importKnowns=True, dryRun=True)
+
+        assert plan.notesToCreate == 1
+        mockAnkiHandler.CreateNotesFromCards.assert_not_called()
+        mockAnkiHandler.EnsureLingqGuids.assert_not_called()
 
     def test_prep_cards_for_update_only_increase(
         self, actionHandler, sampleAnkiCards, sampleLevelToInterval
@@ -208,6 +382,61 @@ class TestUIActionHandler:
 
         assert "learned" in [card.level for card in cardsToIncrease if card.word == "test_word_3"]
 
+    @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
+    @patch.object(LingqApi, "GetLingqStatuses")
+    def test_sync_lingq_status_from_lingq(
+        self, mockGetStatuses, mockAnkiHandler, actionHandler, sampleLevelToInterval
+    ):
+        mockAnkiHandler.GetLingqLevelsInDeck.return_value = {
+            1: "new",  # known on lingq, should increase
+            2: "learned",  # recognized on lingq, should decrease
+            3: "familiar",  # unchanged
+            4: "new",  # deleted from lingq
+        }
+        mockGetStatuses.return_value = {1: (3, 3), 2: (1, 0), 3: (2, 0)}
+        mockAnkiHandler.ReconcileOrphans.return_value = (1, 0)
+
+        report = actionHandler.SyncLingqStatusFromLingq("TestDeck", downgrade=True)
+
+        assert report.counts == {"increased": 1, "decreased": 1, "orphaned": 1, "restored": 0}
+        mockGetStatuses.assert_called_once_with()
+        mockAnkiHandler.UpdateLevelsAndReschedule.assert_called_once_with(
+            "TestDeck", {1: "known", 2: "recognized"}, sampleLevelToInterval
+        )
+        mockAnkiHandler.ReconcileOrphans.assert_called_once_with(
+            "TestDeck", report.languageCode, {1: (3, 3), 2: (1, 0), 3: (2, 0)}.keys(), "tag"
+        )
+
+    def test_prep_levels_from_lingq_only_increase(self, actionHandler):
+        levelsToIncrease, levelsToDecrease = actionHandler._PrepLevelsFromLingq(
+            {1: "new", 2: "learned"}, {1: (2, 0), 2: (0, 0)}, downgrade=False
+        )
+
+        assert levelsToIncrease == {1: "familiar"}
+        assert levelsToDecrease == {}
+
+    def test_lingq_apis_share_the_account_rate_limiter(
+        self, mockAddonManager, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr("LingqAnkiSync.UserFiles._userFilesDir", str(tmp_path))
+        mockAddonManager.getConfig.return_value["sharedRateLimit"] = True
+
+        lingqApi = ActionHandler(mockAddonManager)._CreateLingqApi(RunReport("import", "es", "Deck"))
+
+        assert isinstance(lingqApi.rateLimiter, SharedRateLimiter)
+        assert (tmp_path / "rateLimit.sqlite").exists()
+
+    def test_runs_reuse_the_shared_rate_limiter(self, mockAddonManager, tmp_path, monkeypatch):
+        monkeypatch.setattr("LingqAnkiSync.UserFiles._userFilesDir", str(tmp_path))
+        mockAddonManager.getConfig.return_value["sharedRateLimit"] = True
+        handler = ActionHandler(mockAddonManager)
+
+        rateLimiter = handler._CreateRateLimiter()
+        assert handler._CreateRateLimiter() is rateLimiter
+
+        handler.Close()
+        assert handler._CreateRateLimiter() is not rateLimiter
+
     def test_check_language_code_valid(self, actionHandler):
         actionHandler._CheckLanguageCode("es")
         actionHandler._CheckLanguageCode("en")
@@ -218,3 +447,529 @@ class TestUIActionHandler:
             actionHandler._CheckLanguageCode("zz")
 
         assert 'Language code "zz" is not valid' in str(excinfo.value)
+
+
+@pytest.fixture
+def fakeServer():
+    server = FakeLingqServer(cardCount=60).Start()
+    yield server
+    server.Stop()
+
+
+@pytest.fixture
+def collection(tmp_path):
+    col = Collection(str(tmp_path / "collection.anki2"))
+    AnkiHandler.UseCollection(col)
+    yield col
+    AnkiHandler.UseCollection(None)
+    col.close()
+
+
+@pytest.fixture
+def allLanguagesHandler(fakeServer, collection):
+    addonManager = Mock()
+    addonManager.getConfig.return_value = {
+        "apiKey": fakeServer.apiKey,
+        "apiBaseUrl": fakeServer.baseUrl,
+        "languageDecks": {"es": "Spanish", "de": "German", "fr": "French"},
+    }
+    handler = ActionHandler(addonManager)
+    with patch("LingqAnkiSync.UIActionHandler.UserFiles"):
+        yield handler
+
+
+class TestAllLanguages:
+    def test_import_all_languages(self, allLanguagesHandler, collection, fakeServer):
+        reports = allLanguagesHandler.ImportAllLanguages(importKnowns=True)
+
+        assert [(report.languageCode, report.deckName) for report in reports] == [
+            ("es", "Spanish"),
+            ("de", "German"),
+            ("fr", "French"),
+        ]
+        assert [report.counts["imported"] for report in reports] == [54, 54, 54]
+        assert len(collection.find_notes('deck:"German"')) == 54
+        assert fakeServer.requestCounts == {"GET": 3}
+
+    def test_sync_all_languages_from_lingq(self, allLanguagesHandler, collection, fakeServer):
+        allLanguagesHandler.ImportAllLanguages(importKnowns=True)
+        fakeServer._statusOverrides[("de", 1)] = (3, 3)
+
+        reports = allLanguagesHandler.SyncAllLanguagesFromLingq()
+
+        assert [report.counts["increased"] for report in reports] == [0, 1, 0]
+        assert AnkiHandler.GetLingqLevelsInDeck("German")[1] == "known"
+
+    def test_sync_all_languages_to_lingq(self, allLanguagesHandler, collection, fakeServer):
+        allLanguagesHandler.ImportAllLanguages(importKnowns=True)
+        cardIds = collection.find_cards('deck:"French" LingqPK:1')
+        collection.sched.set_due_date(cardIds, "200!")
+
+        reports = allLanguagesHandler.SyncAllLanguagesToLingq()
+
+        assert [report.counts["updated"] for report in reports] == [0, 0, 1]
+        assert fakeServer.GetCard("fr", 1)["status"] > 1
+        assert AnkiHandler.GetLingqLevelsInDeck("French")[1] == "familiar"
+
+    def test_invalid_language_fails_before_any_request(self, allLanguagesHandler, fakeServer):
+        allLanguagesHandler.config.config["languageDecks"] = {"es": "Spanish", "zz": "Nope"}
+
+        with pytest.raises(ValueError):
+            allLanguagesHandler.ImportAllLanguages(importKnowns=True)
+
+        assert fakeServer.requestCounts == {}
+
+
+@pytest.fixture
+def snapshotHandler(fakeServer, collection):
+    addonManager = Mock()
+    addonManager.getConfig.return_value = {
+        "apiKey": fakeServer.apiKey,
+        "apiBaseUrl": fakeServer.baseUrl,
+        "languageCode": "es",
+    }
+    handler = ActionHandler(addonManager)
+    with patch("LingqAnkiSync.UIActionHandler.UserFiles"):
+        yield handler
+
+
+class TestSnapshots:
+    def test_import_from_snapshot_matches_import_from_lingq(
+        self, snapshotHandler, collection, fakeServer, tmp_path
+    ):
+        snapshotPath = str(tmp_path / "es.ndjson.gz")
+        exportReport = snapshotHandler.ExportSnapshot(snapshotPath)
+        fakeServer.ResetCounts()
+
+        replayed = snapshotHandler.ImportLingqsToAnki(
+            "Replayed", importKnowns=False, snapshotPath=snapshotPath
+        )
+        fetched = snapshotHandler.ImportLingqsToAnki("Fetched", importKnowns=False)
+
+        assert exportReport.counts == {"exported": 60}
+        assert replayed.counts == fetched.counts
+        assert AnkiHandler.GetLingqLevelsInDeck("Replayed") == AnkiHandler.GetLingqLevelsInDeck(
+            "Fetched"
+        )
+        assert fakeServer.requestCounts == {"GET": 1}
+
+    def test_snapshot_import_skips_notes_in_deck(self, snapshotHandler, tmp_path):
+        snapshotPath = str(tmp_path / "es.ndjson.gz")
+        snapshotHandler.ExportSnapshot(snapshotPath)
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True, snapshotPath=snapshotPath)
+
+        report = snapshotHandler.ImportLingqsToAnki(
+            "Spanish", importKnowns=True, snapshotPath=snapshotPath
+        )
+
+        assert report.counts == {"imported": 0, "alreadyInDeck": 54, "duplicateTerms": 0}
+        assert "read" in report.phaseSeconds
+
+    def test_snapshot_dry_run(self, snapshotHandler, collection, tmp_path):
+        snapshotPath = str(tmp_path / "es.ndjson.gz")
+        snapshotHandler.ExportSnapshot(snapshotPath)
+
+        plan = snapshotHandler.ImportLingqsToAnki(
+            "Spanish", importKnowns=True, dryRun=True, snapshotPath=snapshotPath
+        )
+
+        assert plan.notesToCreate == 54
+        assert plan.getRequests == 0
+        assert collection.find_notes('deck:"Spanish"') == []
+
+    def test_snapshot_import_with_filter(self, snapshotHandler, collection, tmp_path):
+        snapshotPath = str(tmp_path / "es.ndjson.gz")
+        snapshotHandler.ExportSnapshot(snapshotPath)
+
+        report = snapshotHandler.ImportLingqsToAnki(
+            "Spanish",
+            importKnowns=True,
+            snapshotPath=snapshotPath,
+            importFilter=ImportFilter(excludeTags=["tag1"]),
+        )
+
+        assert report.counts["imported"] == 44
+        assert collection.find_notes("tag:tag1") == []
+
+    def test_snapshot_of_another_language(self, snapshotHandler, tmp_path):
+        snapshotPath = str(tmp_path / "es.ndjson.gz")
+        snapshotHandler.ExportSnapshot(snapshotPath)
+        snapshotHandler.config.config["languageCode"] = "de"
+
+        with pytest.raises(ValueError):
+            snapshotHandler.ImportLingqsToAnki("German", importKnowns=True, snapshotPath=snapshotPath)
+
+
+class TestImportFilters:
+    def test_levels_are_filtered_by_lingq(self, snapshotHandler, collection, fakeServer):
+        report = snapshotHandler.ImportLingqsToAnki(
+            "Spanish", importKnowns=True, importFilter=ImportFilter(levels=["new", "recognized"])
+        )
+
+        assert report.counts["imported"] == 18
+        assert set(AnkiHandler.GetLingqLevelsInDeck("Spanish").values()) == {"new", "recognized"}
+
+    @pytest.mark.parametrize(
+        "levels, expectedLevels", [(["known", "new"], {"new"}), (["known"], set())]
+    )
+    def test_known_levels_need_import_knowns(
+        self, snapshotHandler, collection, fakeServer, levels, expectedLevels
+    ):
+        report = snapshotHandler.ImportLingqsToAnki(
+            "Spanish", importKnowns=False, importFilter=ImportFilter(levels=levels)
+        )
+
+        assert set(AnkiHandler.GetLingqLevelsInDeck("Spanish").values()) == expectedLevels
+        assert report.counts["imported"] == len(AnkiHandler.GetLingqLevelsInDeck("Spanish"))
+
+    def test_configured_filter_applies_while_streaming(self, snapshotHandler, collection):
+        snapshotHandler.config.config["importFilter"] = {"minImportance": 3, "levels": ["learned"]}
+
+        report = snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+
+        assert report.counts["imported"] == 3
+        levels = AnkiHandler.GetLingqLevelsInDeck("Spanish")
+        assert set(levels.values()) == {"learned"}
+        assert all(pk % 4 == 3 for pk in levels)
+
+
+class TestOrphans:
+    def test_sync_from_lingq_tags_deleted_lingqs(self, snapshotHandler, collection, fakeServer):
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        fakeServer.cardCount = 50
+
+        report = snapshotHandler.SyncLingqStatusFromLingq("Spanish")
+
+        assert report.counts["orphaned"] == 9
+        orphanPks = {
+            int(collection.get_note(noteId)["LingqPK"])
+            for noteId in collection.find_notes(f"tag:{AnkiHandler.ORPHAN_TAG}")
+        }
+        assert orphanPks == {51, 52, 53, 54, 55, 56, 57, 58, 59}
+        assert {card.primaryKey for card in AnkiHandler.GetAllCardsInDeck("Spanish")}.isdisjoint(
+            orphanPks
+        )
+
+    def test_reconcile_deletes_orphans(self, snapshotHandler, collection, fakeServer):
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        fakeServer.cardCount = 50
+
+        report = snapshotHandler.ReconcileOrphans("Spanish", "delete")
+
+        assert report.counts == {"orphaned": 9, "restored": 0}
+        assert len(collection.find_notes('deck:"Spanish"')) == 45
+
+
+class TestRefresh:
+    def test_refresh_rewrites_notes_whose_lingq_changed(
+        self, snapshotHandler, collection, fakeServer
+    ):
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        getCard = fakeServer.GetCard
+
+        def GetEditedCard(languageCode, pk):
+            card = getCard(languageCode, pk)
+            if pk == 7:
+                card["hints"][0]["text"] = "a better translation"
+            return card
+
+        with patch.object(fakeServer, "GetCard", GetEditedCard):
+            report = snapshotHandler.RefreshLingqsInAnki("Spanish")
+
+        assert report.counts == {"refreshed": 1, "unchanged": 53}
+        assert AnkiHandler.GetCardsInDeck("Spanish", [7])[0].translations == [
+            "1. a better translation<br>2. translation 2 of 7"
+        ]
+
+    def test_refresh_from_snapshot(self, snapshotHandler, collection, tmp_path):
+        snapshotPath = str(tmp_path / "es.ndjson.gz")
+        snapshotHandler.ExportSnapshot(snapshotPath)
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True, snapshotPath=snapshotPath)
+
+        report = snapshotHandler.RefreshLingqsInAnki("Spanish", snapshotPath=snapshotPath)
+
+        assert report.counts == {"refreshed": 0, "unchanged": 54}
+
+
+class TestNewCardOrder:
+    def test_import_orders_new_cards_by_frequency(self, snapshotHandler, collection, fakeServer):
+        snapshotHandler.config.config["newCardOrder"] = "frequency"
+
+        report = snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+
+        newCardIds = collection.find_cards('deck:"Spanish" is:new', order="c.due")
+        popularities = [
+            max(
+                hint["popularity"]
+                for hint in fakeServer.GetCard(
+                    "es", int(collection.get_card(cardId).note()["LingqPK"])
+                )["hints"]
+            )
+            for cardId in newCardIds
+        ]
+        assert report.counts["reordered"] == len(newCardIds) == 6
+        assert popularities == sorted(popularities, reverse=True)
+
+
+class TestSyncToLingq:
+    def test_bad_api_key_fails_before_pushing(self, snapshotHandler, collection, fakeServer):
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        collection.sched.set_due_date(collection.find_cards('deck:"Spanish"'), "200!")
+        snapshotHandler.config.config["apiKey"] = "wrong"
+        fakeServer.ResetCounts()
+
+        with pytest.raises(requests.HTTPError):
+            snapshotHandler.SyncLingqStatusToLingq("Spanish")
+
+        assert "PATCH" not in fakeServer.requestCounts
+
+    def test_bad_api_key_stops_the_deck_read(self, snapshotHandler, collection, monkeypatch):
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        snapshotHandler.config.config["apiKey"] = "wrong"
+        monkeypatch.setattr(AnkiHandler, "_checkpointEvery", 1)
+        readCards = []
+        createAnkiCard = AnkiHandler._CreateAnkiCardObject
+
+        def SlowRead(card, cardId):
+            readCards.append(cardId)
+            threading.Event().wait(0.02)
+            return createAnkiCard(card, cardId)
+
+        monkeypatch.setattr(AnkiHandler, "_CreateAnkiCardObject", SlowRead)
+
+        with pytest.raises(requests.HTTPError):
+            snapshotHandler.SyncLingqStatusToLingq("Spanish")
+
+        assert len(readCards) < len(collection.find_cards('deck:"Spanish"'))
+
+    def test_status_scan_replaces_checking_each_card(
+        self, snapshotHandler, collection, fakeServer
+    ):
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        cardIds = collection.find_cards('deck:"Spanish" LingqPK:1 or LingqPK:2 or LingqPK:3')
+        collection.sched.set_due_date(cardIds, "200!")
+        fakeServer.ResetCounts()
+
+        report = snapshotHandler.SyncLingqStatusToLingq("Spanish")
+
+        assert report.counts["updated"] == report.counts["increased"] == 3
+        # The single card probe and one page of statuses, instead of a GET per card
+        assert fakeServer.requestCounts == {"GET": 2, "PATCH": 3}
+
+    @pytest.mark.parametrize("requestBudget", [5, 4])
+    def test_request_budget_covers_the_scan(
+        self, snapshotHandler, collection, fakeServer, requestBudget
+    ):
+        snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        cardIds = collection.find_cards('deck:"Spanish" LingqPK:1 or LingqPK:2 or LingqPK:3')
+        collection.sched.set_due_date(cardIds, "200!")
+        snapshotHandler.config.config["syncRequestBudget"] = requestBudget
+        snapshotHandler.config.config["pageSizeModels"] = {
+            "es": {"pageSize": 25, "maxPageSize": 25}
+        }
+        fakeServer.ResetCounts()
+
+        report = snapshotHandler.SyncLingqStatusToLingq("Spanish")
+
+        # The probe and three pages of statuses, then the budget has room for one update
+        # when it fits the scan, otherwise each card's level is asked for instead
+        assert sum(fakeServer.requestCounts.values()) <= requestBudget
+        assert report.counts["updated"] + report.counts["remaining"] == 3
+        if requestBudget == 5:
+            assert fakeServer.requestCounts == {"GET": 4, "PATCH": 1}
+
+    @patch("LingqAnkiSync.UIActionHandler.AnkiHandler")
+    @patch.object(LingqApi, "SyncStatusesToLingq")
+    @patch.object(LingqApi, "GetCardCount", return_value=100000)
+    @patch.object(LingqApi, "GetLingqStatuses")
+    def test_status_scan_stops_when_checking_each_card_is_cheaper(
+        self,
+        mockGetStatuses,
+        mockGetCardCount,
+        mockSyncStatuses,
+        mockAnkiHandler,
+        actionHandler,
+        sampleAnkiCards,
+    ):
+        def ScanUntilStopped(shouldStop):
+            while not shouldStop():
+                threading.Event().wait(0.01)
+            raise SyncInterrupted()
+
+        mockGetStatuses.side_effect = ScanUntilStopped
+        mockSyncStatuses.return_value = 0
+        mockAnkiHandler.GetAllCardsInDeck.return_value = sampleAnkiCards
+
+        actionHandler.SyncLingqStatusToLingq("TestDeck", downgrade=True)
+
+        assert mockSyncStatuses.call_args[0][3] is None
+
+
+class TestImportPipeline:
+    def test_stage_waits_for_the_consumer(self):
+        produced = []
+
+        def Items():
+            for i in range(10):
+                produced.append(i)
+                yield i
+
+        stage = _InBackground(Items(), maxPending=2)
+        assert next(stage) == 0
+        threading.Event().wait(0.3)
+
+        # One handed over, two waiting and one ready to go once there's room
+        assert len(produced) == 4
+        assert list(stage) == list(range(1, 10))
+
+    def test_stage_raises_the_producers_error(self):
+        def Items():
+            yield 1
+            raise ValueError("page failed")
+
+        stage = _InBackground(Items(), maxPending=2)
+        assert next(stage) == 1
+        with pytest.raises(ValueError, match="page failed"):
+            next(stage)
+
+    def test_closing_the_stage_stops_the_producer(self):
+        closed = threading.Event()
+
+        def Items():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.set()
+
+        stage = _InBackground(Items(), maxPending=2)
+        next(stage)
+        stage.close()
+
+        assert closed.is_set()
+
+    def test_cancelled_import_stops_fetching(self, snapshotHandler, collection, fakeServer):
+        cancelEvent = threading.Event()
+        cancelEvent.set()
+
+        report = snapshotHandler.ImportLingqsToAnki(
+            "Spanish", importKnowns=True, cancelEvent=cancelEvent
+        )
+
+        assert report.counts["imported"] == 0
+        assert collection.find_notes('deck:"Spanish"') == []
+        assert fakeServer.requestCounts.get("GET", 0) <= 1
+
+    def test_cancel_cuts_short_a_rate_limit_wait(self, snapshotHandler, collection, fakeServer):
+        fakeServer.rateLimitEvery = 1
+        fakeServer.retryAfterSeconds = 60
+        cancelEvent = threading.Event()
+        reports = []
+        importThread = threading.Thread(
+            target=lambda: reports.append(
+                snapshotHandler.ImportLingqsToAnki(
+                    "Spanish", importKnowns=True, cancelEvent=cancelEvent
+                )
+            )
+        )
+        importThread.start()
+        threading.Event().wait(0.3)
+
+        cancelEvent.set()
+        importThread.join(timeout=5)
+
+        assert not importThread.is_alive()
+        assert reports[0].counts["imported"] == 0
+
+    def test_import_reports_one_progress_over_all_lingqs(
+        self, snapshotHandler, collection, fakeServer
+    ):
+        snapshotHandler.config.config["pageSizeModels"] = {
+            "es": {"pageSize": 25, "maxPageSize": 25}
+        }
+        progressCallback = Mock()
+
+        snapshotHandler.ImportLingqsToAnki(
+            "Spanish", importKnowns=True, progressCallback=progressCallback
+        )
+
+        calls = progressCallback.call_args_list
+        assert {call.kwargs["phase"] for call in calls} == {"Importing"}
+        processed = [call.args[0] for call in calls]
+        # One step per inserted note, skipped duplicate terms are counted in one go
+        assert processed == sorted(set(processed))
+        assert len(processed) > 50 and processed[-1] == 60
+        # The total is known once the first page is in, whichever thread gets there first
+        assert {call.args[1] for call in calls} == {60}
+
+    def test_import_inserts_in_batches(self, snapshotHandler, collection, monkeypatch):
+        monkeypatch.setattr("LingqAnkiSync.UIActionHandler._insertBatchSize", 40)
+        snapshotHandler.config.config["pageSizeModels"] = {
+            "es": {"pageSize": 25, "maxPageSize": 25}
+        }
+        with patch.object(
+            AnkiHandler, "CreateNotesFromCards", wraps=AnkiHandler.CreateNotesFromCards
+        ) as mockCreate:
+            report = snapshotHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+
+        # Pages of 25, 25 and 10 cards, inserted as the first two and the last one
+        assert report.counts["imported"] == len(collection.find_notes('deck:"Spanish"'))
+        assert mockCreate.call_count == 2
+
+
+@pytest.fixture
+def collectionHandler(collection):
+    addonManager = Mock()
+    addonManager.getConfig.return_value = {"apiKey": "test_api_key", "languageCode": "es"}
+    handler = ActionHandler(addonManager)
+    with patch("LingqAnkiSync.UIActionHandler.UserFiles"):
+        yield handler
+
+
+def DuplicateLingqs():
+    return [
+        Lingq(1, "Café", ["coffee"], 0, 0, [], "", 1),
+        Lingq(2, "café", ["café", "Coffee"], 0, 0, [], "", 1),
+        Lingq(3, "CAFE\u0301 ", ["coffee shop"], 0, 0, [], "", 1),
+        Lingq(4, "té", ["tea"], 0, 0, [], "", 1),
+    ]
+
+
+class TestDuplicateTerms:
+    @patch.object(LingqApi, "GetCardPages")
+    def test_duplicate_terms_are_skipped(self, mockGetCardPages, collectionHandler, collection):
+        mockGetCardPages.return_value = iter(ApiPages(DuplicateLingqs()))
+
+        report = collectionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+
+        assert report.counts == {"imported": 2, "alreadyInDeck": 0, "duplicateTerms": 2}
+        assert AnkiHandler.GetLingqTermsInDeck("Spanish") == {1: "Café", 4: "té"}
+
+    @patch.object(LingqApi, "GetCardPages")
+    def test_duplicate_terms_merge_into_existing_notes(
+        self, mockGetCardPages, collectionHandler, collection
+    ):
+        collectionHandler.config.config["duplicateTerms"] = "merge"
+        mockGetCardPages.return_value = iter(ApiPages(DuplicateLingqs()[:1]))
+        collectionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+        mockGetCardPages.return_value = iter(ApiPages(DuplicateLingqs()))
+
+        report = collectionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+
+        assert report.counts == {
+            "imported": 1,
+            "alreadyInDeck": 1,
+            "duplicateTerms": 2,
+            "merged": 1,
+        }
+        back = collection.get_note(collection.find_notes("LingqPK:1")[0])["Back"]
+        assert back == "1. coffee<br>2. café<br>3. coffee shop"
+
+    @patch.object(LingqApi, "GetCardPages")
+    def test_duplicate_terms_can_be_kept(self, mockGetCardPages, collectionHandler, collection):
+        collectionHandler.config.config["duplicateTerms"] = "keep"
+        mockGetCardPages.return_value = iter(ApiPages(DuplicateLingqs()))
+
+        report = collectionHandler.ImportLingqsToAnki("Spanish", importKnowns=True)
+
+        assert report.counts == {"imported": 4, "alreadyInDeck": 0}
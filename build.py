@@ -5,7 +5,8 @@ from zipfile import ZipFile
 def project_files(path):
     result = []
     for root, dir, files in os.walk(f"{path}/LingqAnkiSync"):
-        if "test" not in root:
+        # user_files holds what the addon wrote at runtime, like its run log
+        if "test" not in root and "user_files" not in root:
             result += [os.path.join(root, f) for f in files if ".pyc" not in f]
     return result
 